@@ -0,0 +1,120 @@
+"""Benchmark de llamadas por consulta del sistema RAG con LLM y embeddings simulados.
+
+Compara el flujo anterior (cadena RAG + segunda llamada al retriever para mostrar
+las fuentes) con la cadena de una sola pasada de `build_rag_chain`.
+
+Ejecutar desde esta carpeta:
+    python benchmark_rag.py
+"""
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.vectorstores import InMemoryVectorStore
+from langchain_classic.retrievers.multi_query import MultiQueryRetriever
+from langchain_classic.retrievers import EnsembleRetriever
+
+from config import *
+from prompts import *
+from rag_system import build_rag_chain, format_docs
+
+PREGUNTAS = [
+    "¿Dónde se encuentra el local del contrato en el que participa María Jiménez Campos?",
+    "¿Cuál es la renta mensual de la plaza de garaje?",
+    "¿Qué duración tiene el contrato de vivienda?",
+]
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Embeddings deterministas que cuentan cuántos textos se embeben."""
+
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+class CountingChatModel(FakeListChatModel):
+    """Modelo de chat simulado que cuenta sus invocaciones."""
+
+    calls: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.calls += 1
+        return super()._call(*args, **kwargs)
+
+
+def build_stub_system():
+    embeddings = CountingEmbeddings(size=64)
+    vector_store = InMemoryVectorStore(embedding=embeddings)
+    vector_store.add_documents([
+        Document(page_content=f"Cláusula {i} del contrato de arrendamiento", metadata={"source": f"contrato_{i % 5}.pdf", "page": i})
+        for i in range(40)
+    ])
+    embeddings.calls = 0
+
+    llm_queries = CountingChatModel(responses=["variante uno\nvariante dos\nvariante tres"])
+    llm_generation = CountingChatModel(responses=["Respuesta simulada"])
+
+    base_retriever = vector_store.as_retriever(
+        search_type=SEARCH_TYPE,
+        search_kwargs={"k": SEARCH_K, "lambda_mult": MMR_DIVERSITY_LAMBDA, "fetch_k": MMR_FETCH_K}
+    )
+    similarity_retriever = vector_store.as_retriever(search_type="similarity", search_kwargs={"k": SEARCH_K})
+    mmr_multi_retriever = MultiQueryRetriever.from_llm(
+        retriever=base_retriever,
+        llm=llm_queries,
+        prompt=PromptTemplate.from_template(MULTI_QUERY_PROMPT)
+    )
+    final_retriever = EnsembleRetriever(
+        retrievers=[mmr_multi_retriever, similarity_retriever],
+        weights=[0.7, 0.3]
+    )
+    return final_retriever, mmr_multi_retriever, llm_queries, llm_generation, embeddings
+
+
+def run_legacy(question):
+    """Flujo anterior: la cadena recupera y luego se vuelve a recuperar para las fuentes."""
+    retriever, mmr_multi_retriever, llm_queries, llm_generation, embeddings = build_stub_system()
+    chain = (
+        {"context": retriever | format_docs, "question": RunnablePassthrough()}
+        | PromptTemplate.from_template(RAG_TEMPLATE)
+        | llm_generation
+        | StrOutputParser()
+    )
+    chain.invoke(question)
+    mmr_multi_retriever.invoke(question)
+    return llm_queries.calls, embeddings.calls
+
+
+def run_single_pass(question):
+    """Flujo actual: una única recuperación devuelve respuesta y documentos."""
+    retriever, _, llm_queries, llm_generation, embeddings = build_stub_system()
+    result = build_rag_chain(retriever, llm_generation).invoke(question)
+    assert result["answer"] and result["docs"]
+    return llm_queries.calls, embeddings.calls
+
+
+def main():
+    print("📊 Llamadas por consulta (LLM de reformulación / consultas embebidas)")
+    print("=" * 60)
+    for question in PREGUNTAS:
+        legacy = run_legacy(question)
+        single = run_single_pass(question)
+        print(f"\n❓ {question[:55]}...")
+        print(f"   Antes:   LLM={legacy[0]}  embeddings={legacy[1]}")
+        print(f"   Ahora:   LLM={single[0]}  embeddings={single[1]}")
+        assert single[0] * 2 == legacy[0], "Las llamadas de reformulación no se han reducido a la mitad"
+        assert single[1] < legacy[1], "Se siguen repitiendo las búsquedas vectoriales"
+    print("\n✅ Una sola pasada de recuperación por consulta")
+
+
+if __name__ == "__main__":
+    main()
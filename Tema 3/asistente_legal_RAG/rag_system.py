@@ -1,7 +1,7 @@
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnablePassthrough, RunnableParallel, RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
 from langchain_classic.retrievers.multi_query import MultiQueryRetriever
 from langchain_classic.retrievers import EnsembleRetriever 
@@ -9,12 +9,14 @@ import  streamlit as st
 from config import *
 from prompts import *
 
+from embedding_cache import get_cached_embeddings
+
 @st.cache_resource
 def initialize_rag_system():
     
     # Vector Store
     vector_store = Chroma(
-        embedding_function=OpenAIEmbeddings(model=EMBEDING_MODEL),
+        embedding_function=get_cached_embeddings(EMBEDING_MODEL),
         persist_directory=CHROMA_DB_PATH
     )
     
@@ -62,46 +64,60 @@ def initialize_rag_system():
         final_retriever = mmr_multi_retriever
     
     
+    rag_chain = build_rag_chain(final_retriever, llm_generation)
+    return rag_chain, final_retriever
+
+
+# Función para formatear y preprocesar los documentos recuperados
+def format_docs(docs):
+    formatted  = []
+    
+    for i, doc in enumerate(docs,1):
+        header = f"[Fragmento {i}]"
+        if doc.metadata:
+            if 'source' in doc.metadata:
+                source = doc.metadata['source'].split("\\")[-1] if '\\' in doc.metadata['source'] else doc.metadata['source']
+                header += f" - Fuente: {source}"
+            if 'page' in doc.metadata:
+                header += f" - Página: {doc.metadata['page']}"
+        content = doc.page_content.strip()
+        formatted.append(f"{header}\n{content}")
+    
+    return "\n\n".join(formatted)
+
+
+def build_rag_chain(retriever, llm_generation):
+    """Construye la cadena RAG con una única pasada de recuperación.
+
+    La rama paralela recupera los documentos una sola vez y los arrastra junto
+    a la pregunta; la respuesta se genera a partir de esos mismos documentos,
+    de modo que la salida es {"question", "docs", "answer"}.
+    """
     prompt = PromptTemplate.from_template(RAG_TEMPLATE)
     
-    # Función para formatear y preprocesar los documentos recuperados
-    def format_docs(docs):
-        formatted  = []
-        
-        for i, doc in enumerate(docs,1):
-            header = f"[Fragmento {i}]"
-            if doc.metadata:
-                if 'source' in doc.metadata:
-                    source = doc.metadata['source'].split("\\")[-1] if '\\' in doc.metadata['source'] else doc.metadata['source']
-                    header += f" - Fuente: {source}"
-                if 'page' in doc.metadata:
-                    header += f" - Página: {doc.metadata['page']}"
-            content = doc.page_content.strip()
-            formatted.append(f"{header}\n{content}")
-        
-        return "\n\n".join(formatted)
-    
-    rag_chain=(
-        {
-            "context": final_retriever | format_docs,
-            "question": RunnablePassthrough()
-        } 
-        | prompt 
-        | llm_generation 
+    answer_chain = (
+        RunnableLambda(lambda x: {"context": format_docs(x["docs"]), "question": x["question"]})
+        | prompt
+        | llm_generation
         | StrOutputParser()
     )
-    return rag_chain, mmr_multi_retriever
+    
+    rag_chain = RunnableParallel(
+        docs=retriever,
+        question=RunnablePassthrough()
+    ).assign(answer=answer_chain)
+    
+    return rag_chain
 
 
 def query_rag(question):
     try:
-        rag_chain, retriever  = initialize_rag_system()
-        
-        # Obtener respuesta
-        response = rag_chain.invoke(question)
+        rag_chain, _ = initialize_rag_system()
         
-        # Obtener documentos para mostrarlos
-        docs = retriever.invoke(question)
+        # Obtener respuesta y documentos usados en una sola recuperación
+        result = rag_chain.invoke(question)
+        response = result["answer"]
+        docs = result["docs"]
         
         # Formatear los documentos para mostrar
         docs_info = []
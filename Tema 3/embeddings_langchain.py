@@ -1,7 +1,8 @@
-from langchain_openai import OpenAIEmbeddings
 import numpy as np
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+from embedding_cache import get_cached_embeddings
+
+embeddings = get_cached_embeddings("text-embedding-3-large")
 
 texto1 = "La capital de Francia es París."
 texto2 = "París es la ciudad capital de Francia."
@@ -0,0 +1,204 @@
+"""
+Ingesta de PDFs en streaming: páginas en paralelo, embeddings por lotes y
+escrituras continuas en Chroma.
+
+    PDFs ──(pool de procesos, por rangos de páginas)──► split por página ──► cola acotada ──► hilo: embed + upsert por lotes
+
+- Las páginas se extraen con pypdf en un ProcessPoolExecutor por rangos de
+  `pages_per_task` páginas (cada PDF se parsea una vez por rango), con como
+  mucho `max_pending_pages` páginas en vuelo: la memoria no crece con el corpus.
+- Cada página se trocea en cuanto llega y sus chunks pasan por una cola
+  acotada (`queue_size`); si el hilo de embeddings va por detrás, el parseo espera.
+- El hilo consumidor embebe lotes fijos de `batch_size` chunks y los escribe
+  en Chroma con IDs deterministas (fichero:página:chunk), así relanzar la
+  ingesta actualiza en vez de duplicar. Al terminar se borran los IDs de cada
+  fichero que no se han reescrito (páginas o chunks que ya no existen).
+
+Uso:
+    stats = ingest_pdf_directory("contratos", vectorstore)
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator, List, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+PARSE_WORKERS = os.cpu_count() or 2
+PAGES_PER_TASK = 16      # páginas que extrae cada tarea (el PDF se parsea una vez por tarea)
+MAX_PENDING_PAGES = 64   # páginas enviadas al pool sin recoger todavía
+QUEUE_SIZE = 256         # chunks esperando a ser embebidos
+BATCH_SIZE = 64          # chunks por llamada a la API de embeddings
+
+
+# ============= ETAPA 1: PARSEO DE PÁGINAS (PROCESOS) =============
+
+def _extract_pages(path: str, start: int, count: int) -> Tuple[str, int, int, List[Tuple[int, str]]]:
+    """Se ejecuta en un proceso del pool: texto de un rango de páginas.
+
+    El PDF se parsea una vez por rango (no por página). Devuelve también el
+    número total de páginas, así el padre no tiene que abrir los ficheros.
+    """
+    reader = PdfReader(path)
+    total = len(reader.pages)
+    pages = [(number, reader.pages[number].extract_text() or "") for number in range(start, min(start + count, total))]
+    return path, total, start, pages
+
+
+def iter_pdf_pages(pdf_paths: List[str], workers: int = PARSE_WORKERS,
+                   max_pending_pages: int = MAX_PENDING_PAGES,
+                   pages_per_task: int = PAGES_PER_TASK) -> Iterator[Document]:
+    """Genera las páginas (como Document, igual que PyPDFLoader) según se van extrayendo.
+
+    Cada fichero se envía primero con su rango inicial; al conocer su número de
+    páginas se encolan el resto de rangos.
+    """
+    max_pending_tasks = max(1, max_pending_pages // pages_per_task)
+    files = iter(pdf_paths)
+    ranges = deque()   # (path, primera página) pendientes de enviar
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        while True:
+            while len(pending) < max_pending_tasks:
+                if ranges:
+                    path, start = ranges.popleft()
+                else:
+                    path, start = next(files, None), 0
+                    if path is None:
+                        break
+                pending.add(pool.submit(_extract_pages, path, start, pages_per_task))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, total, start, pages = future.result()
+                if start == 0:
+                    ranges.extend((path, first) for first in range(pages_per_task, total, pages_per_task))
+                for number, text in pages:
+                    yield _page_document(path, number, text)
+
+
+def _page_document(path: str, page_number: int, text: str) -> Document:
+    return Document(page_content=text, metadata={"source": path, "page": page_number})
+
+
+# ============= ETAPA 2: SPLIT POR PÁGINA =============
+
+def iter_chunks(pages: Iterator[Document], splitter: RecursiveCharacterTextSplitter) -> Iterator[Tuple[str, Document]]:
+    """Trocea cada página en cuanto llega. Genera (id, chunk)."""
+    for page in pages:
+        for index, chunk in enumerate(splitter.split_documents([page])):
+            chunk_id = f"{os.path.basename(page.metadata['source'])}:{page.metadata['page']}:{index}"
+            yield chunk_id, chunk
+
+
+# ============= ETAPA 3: EMBEDDINGS + UPSERT (HILO) =============
+
+_DONE = object()
+
+
+def _embed_and_upsert(chunks: "queue.Queue", vectorstore, batch_size: int, stats: dict, errors: list,
+                      written: set):
+    batch = []
+
+    def flush():
+        if batch:
+            ids, docs = zip(*batch)
+            # add_texts embebe el lote en una llamada y hace upsert por ID
+            vectorstore.add_texts([d.page_content for d in docs], metadatas=[d.metadata for d in docs], ids=list(ids))
+            stats["chunks"] += len(batch)
+            stats["batches"] += 1
+            written.update(ids)
+            batch.clear()
+
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                break
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+    except Exception as e:
+        errors.append(e)
+        # Vaciar la cola para que el productor no se quede bloqueado
+        while chunks.get() is not _DONE:
+            pass
+
+
+# ============= PIPELINE =============
+
+def ingest_pdfs(pdf_paths: List[str], vectorstore, chunk_size: int = 5000, chunk_overlap: int = 1000,
+                workers: int = PARSE_WORKERS, batch_size: int = BATCH_SIZE, queue_size: int = QUEUE_SIZE,
+                max_pending_pages: int = MAX_PENDING_PAGES, pages_per_task: int = PAGES_PER_TASK) -> dict:
+    """Ingesta los PDFs en `vectorstore` y devuelve las estadísticas de rendimiento."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    stats = {"files": len(pdf_paths), "pages": 0, "chunks": 0, "batches": 0, "max_queue": 0, "stale_deleted": 0}
+    errors = []
+    written = set()
+
+    consumer = threading.Thread(target=_embed_and_upsert,
+                                args=(chunks, vectorstore, batch_size, stats, errors, written), daemon=True)
+    start = time.perf_counter()
+    consumer.start()
+    try:
+        pages = iter_pdf_pages(pdf_paths, workers, max_pending_pages, pages_per_task)
+        for item in iter_chunks(_count(pages, stats), splitter):
+            chunks.put(item)
+            stats["max_queue"] = max(stats["max_queue"], chunks.qsize())
+            if errors:
+                break
+    finally:
+        chunks.put(_DONE)
+        consumer.join()
+
+    if errors:
+        raise errors[0]
+
+    stats["stale_deleted"] = _delete_stale_chunks(vectorstore, pdf_paths, written)
+    stats["seconds"] = time.perf_counter() - start
+    stats["pages_per_second"] = stats["pages"] / stats["seconds"] if stats["seconds"] else 0.0
+    stats["chunks_per_second"] = stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def _delete_stale_chunks(vectorstore, pdf_paths: List[str], written: set) -> int:
+    """Borra los chunks de estos ficheros que no se han reescrito en esta ingesta."""
+    deleted = 0
+    for path in pdf_paths:
+        stale = [chunk_id for chunk_id in vectorstore.get(where={"source": path}, include=[])["ids"]
+                 if chunk_id not in written]
+        if stale:
+            vectorstore.delete(ids=stale)
+            deleted += len(stale)
+    return deleted
+
+
+def _count(pages: Iterator[Document], stats: dict) -> Iterator[Document]:
+    for page in pages:
+        stats["pages"] += 1
+        yield page
+
+
+def ingest_pdf_directory(directory: str, vectorstore, **kwargs) -> dict:
+    """Ingesta todos los PDFs de un directorio (sustituto en streaming de PyPDFDirectoryLoader)."""
+    pdf_paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith(".pdf")
+    )
+    return ingest_pdfs(pdf_paths, vectorstore, **kwargs)
+
+
+def print_ingestion_report(stats: dict):
+    print(f"📥 Ingesta: {stats['files']} PDFs, {stats['pages']} páginas, {stats['chunks']} chunks "
+          f"en {stats['batches']} lotes ({stats['seconds']:.1f} s)")
+    print(f"   {stats['pages_per_second']:.1f} páginas/s · {stats['chunks_per_second']:.1f} chunks/s · "
+          f"cola máxima {stats['max_queue']} chunks")
+    if stats["stale_deleted"]:
+        print(f"   🗑️ {stats['stale_deleted']} chunks obsoletos borrados")
@@ -0,0 +1,182 @@
+"""
+Motor de resúmenes map-reduce reutilizable.
+
+- Map: resume cada trozo con llm.batch_as_completed / abatch_as_completed y
+  un límite de peticiones simultáneas (max_concurrency).
+- Reduce en árbol: agrupa los resúmenes en bloques que caben en
+  `reduce_max_chars`, los resume y repite hasta que todo cabe en un único
+  prompt final, así el prompt nunca desborda el contexto. Un resumen que
+  ocupa más de medio bloque se vuelve a resumir (y, si aun así no cabe, se
+  recorta) antes de agrupar, para que cualquier par quepa en un bloque.
+- Checkpoint: cada respuesta se añade a un fichero JSONL indexada por el hash
+  de su prompt. Si la ejecución se interrumpe, al relanzarla solo se piden
+  al modelo los prompts que faltan.
+
+Uso:
+    engine = SummarizationEngine(llm, max_concurrency=8, checkpoint_path="resumen.checkpoint.jsonl")
+    resumen = engine.summarize([chunk.page_content for chunk in chunks])
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+MAP_PROMPT = "Haz un resumen de los puntos mas importantes del siguiente texto: {text}"
+REDUCE_PROMPT = "Combina y sintetiza estos resumenes en un resumen coherente y completo:\n\n{text}"
+SHRINK_PROMPT = "Resume el siguiente texto en como mucho {max_chars} caracteres, sin perder los puntos clave:\n\n{text}"
+SEPARATOR = "\n\n"
+
+
+class SummarizationEngine:
+    """Resume textos largos con map concurrente, reduce en árbol y reanudación."""
+
+    def __init__(self, llm, max_concurrency: int = 8, reduce_max_chars: int = 12000,
+                 checkpoint_path: Optional[str] = None,
+                 map_prompt: str = MAP_PROMPT, reduce_prompt: str = REDUCE_PROMPT):
+        self.llm = llm
+        self.max_concurrency = max_concurrency
+        self.reduce_max_chars = reduce_max_chars
+        self.checkpoint_path = checkpoint_path
+        self.map_prompt = map_prompt
+        self.reduce_prompt = reduce_prompt
+        self._lock = threading.Lock()
+        self._done: Dict[str, str] = self._load_checkpoint()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.stats = {"llm_calls": 0, "resumed": 0, "levels": 0, "shrunk": 0, "truncated": 0}
+
+    # ============= CHECKPOINT =============
+
+    def _load_checkpoint(self) -> Dict[str, str]:
+        done = {}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        done[record["key"]] = record["summary"]
+                    except (json.JSONDecodeError, KeyError):
+                        continue  # última línea a medio escribir tras una interrupción
+            print(f"♻️ Checkpoint cargado: {len(done)} resúmenes ya calculados")
+        return done
+
+    def _save(self, key: str, summary: str):
+        with self._lock:
+            self._done[key] = summary
+            if self.checkpoint_path:
+                with open(self.checkpoint_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "summary": summary}, ensure_ascii=False) + "\n")
+
+    @staticmethod
+    def _key(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    # ============= REDUCE EN ÁRBOL =============
+
+    def _max_summary_chars(self) -> int:
+        """Tamaño máximo de un resumen para que dos quepan siempre en un bloque."""
+        return (self.reduce_max_chars - len(SEPARATOR)) // 2
+
+    def _oversized(self, summaries: List[str]) -> List[int]:
+        return [i for i, summary in enumerate(summaries) if len(summary) > self._max_summary_chars()]
+
+    def _truncate(self, summaries: List[str]) -> List[str]:
+        """Último recurso si un resumen sigue sin caber tras re-resumirlo."""
+        limit = self._max_summary_chars()
+        self.stats["truncated"] += sum(1 for summary in summaries if len(summary) > limit)
+        return [summary[:limit] for summary in summaries]
+
+    def _shrink_template(self) -> str:
+        return SHRINK_PROMPT.format(max_chars=self._max_summary_chars(), text="{text}")
+
+    def _group(self, summaries: List[str]) -> List[str]:
+        """Agrupa resúmenes consecutivos en bloques de como mucho reduce_max_chars.
+
+        Cada bloque lleva al menos dos resúmenes para que cada nivel reduzca su
+        número; como ninguno ocupa más de medio bloque, siempre caben.
+        """
+        groups, current, size = [], [], 0
+        for summary in summaries:
+            if len(current) >= 2 and size + len(summary) > self.reduce_max_chars:
+                groups.append(SEPARATOR.join(current))
+                current, size = [], 0
+            current.append(summary)
+            size += len(summary) + len(SEPARATOR)
+        groups.append(SEPARATOR.join(current))
+        return groups
+
+    def _pending(self, template: str, texts: List[str]):
+        prompts = [template.format(text=text) for text in texts]
+        keys = [self._key(prompt) for prompt in prompts]
+        pending = [i for i, key in enumerate(keys) if key not in self._done]
+        self.stats["resumed"] += len(prompts) - len(pending)
+        return prompts, keys, pending
+
+    def _print_level(self, level: str, total: int, pending: int):
+        print(f"   {level}: {total} prompts ({total - pending} del checkpoint, {pending} al modelo)")
+
+    # ============= SÍNCRONO =============
+
+    def _run(self, template: str, texts: List[str], level: str) -> List[str]:
+        prompts, keys, pending = self._pending(template, texts)
+        self._print_level(level, len(prompts), len(pending))
+        if pending:
+            config = {"max_concurrency": self.max_concurrency}
+            for position, response in self.llm.batch_as_completed([prompts[i] for i in pending], config=config):
+                self._save(keys[pending[position]], response.content)
+                self.stats["llm_calls"] += 1
+        return [self._done[key] for key in keys]
+
+    def _fit(self, summaries: List[str], level: str) -> List[str]:
+        oversized = self._oversized(summaries)
+        if oversized:
+            self.stats["shrunk"] += len(oversized)
+            shrunk = self._run(self._shrink_template(), [summaries[i] for i in oversized], level)
+            summaries = list(summaries)
+            for i, summary in zip(oversized, shrunk):
+                summaries[i] = summary
+        return self._truncate(summaries)
+
+    def summarize(self, texts: List[str]) -> str:
+        self._reset_stats()
+        summaries = self._run(self.map_prompt, texts, "🗺️ Map")
+        while len(summaries) > 1:
+            self.stats["levels"] += 1
+            summaries = self._fit(summaries, f"✂️ Recorte nivel {self.stats['levels']}")
+            groups = self._group(summaries)
+            summaries = self._run(self.reduce_prompt, groups, f"🌳 Reduce nivel {self.stats['levels']}")
+        return summaries[0] if summaries else ""
+
+    # ============= ASÍNCRONO =============
+
+    async def _arun(self, template: str, texts: List[str], level: str) -> List[str]:
+        prompts, keys, pending = self._pending(template, texts)
+        self._print_level(level, len(prompts), len(pending))
+        if pending:
+            config = {"max_concurrency": self.max_concurrency}
+            async for position, response in self.llm.abatch_as_completed([prompts[i] for i in pending], config=config):
+                self._save(keys[pending[position]], response.content)
+                self.stats["llm_calls"] += 1
+        return [self._done[key] for key in keys]
+
+    async def _afit(self, summaries: List[str], level: str) -> List[str]:
+        oversized = self._oversized(summaries)
+        if oversized:
+            self.stats["shrunk"] += len(oversized)
+            shrunk = await self._arun(self._shrink_template(), [summaries[i] for i in oversized], level)
+            summaries = list(summaries)
+            for i, summary in zip(oversized, shrunk):
+                summaries[i] = summary
+        return self._truncate(summaries)
+
+    async def asummarize(self, texts: List[str]) -> str:
+        self._reset_stats()
+        summaries = await self._arun(self.map_prompt, texts, "🗺️ Map")
+        while len(summaries) > 1:
+            self.stats["levels"] += 1
+            summaries = await self._afit(summaries, f"✂️ Recorte nivel {self.stats['levels']}")
+            groups = self._group(summaries)
+            summaries = await self._arun(self.reduce_prompt, groups, f"🌳 Reduce nivel {self.stats['levels']}")
+        return summaries[0] if summaries else ""
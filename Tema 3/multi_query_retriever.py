@@ -1,12 +1,13 @@
 #from langchain_community.vectorstores import Chroma
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 from langchain_openai import ChatOpenAI
 from langchain_classic.retrievers.multi_query import MultiQueryRetriever
 
+from embedding_cache import get_cached_embeddings
+
 
 vectorstore = Chroma(
-    embedding_function=OpenAIEmbeddings(model="text-embedding-3-large"),
+    embedding_function=get_cached_embeddings("text-embedding-3-large"),
     persist_directory="Tema 3\\chroma_db"
 )
 
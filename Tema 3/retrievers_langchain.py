@@ -1,10 +1,11 @@
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+
+from embedding_cache import get_cached_embeddings
 
 
 
 vectorstore = Chroma(
-    embedding_function=OpenAIEmbeddings(model="text-embedding-3-large"),
+    embedding_function=get_cached_embeddings("text-embedding-3-large"),
     persist_directory="Tema 3\\chroma_db"
 )
 
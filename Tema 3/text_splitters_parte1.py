@@ -1,32 +1,38 @@
+from pathlib import Path
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_openai import ChatOpenAI
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from motor_resumenes import SummarizationEngine
+
+BASE_DIR = Path(__file__).resolve().parent
 
 # 1. Cargar el documento PDF
-loader = PyPDFLoader("Tema 3\\quijote.pdf")
+loader = PyPDFLoader(str(BASE_DIR / "quijote.pdf"))
 pages = loader.load()
 
 
-# Dividir el texto en chunks más pequeños
+# 2. Dividir el texto en chunks más pequeños
 texto_splitter = RecursiveCharacterTextSplitter(
     chunk_size=10000,
     chunk_overlap=200
 )
 
 chunks = texto_splitter.split_documents(pages)
+print(f"📄 {len(pages)} páginas → {len(chunks)} chunks")
 
-# 3. Pasar el texto al LLM
+# 3. Resumir el libro completo: map concurrente + reduce en árbol.
+# Si se interrumpe, al relanzar el script continúa desde el checkpoint
 llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
-summaries = []
-i = 0
-for chunk in chunks:
-    if i > 10:
-        break
-    response = llm.invoke(f"Haz un resumen de los puntos mas importantes del siguiente texto: {chunk.page_content}")
-    summaries.append(response.content)
-    i += 1
-    
-print(summaries)
-final_summary = llm.invoke(f"Combina y sintetiza estos resumenes en un resumen coherente y completo {" ".join(summaries)}")
+engine = SummarizationEngine(
+    llm,
+    max_concurrency=8,
+    reduce_max_chars=12000,
+    checkpoint_path=str(BASE_DIR / "quijote_resumen.checkpoint.jsonl")
+)
+
+final_summary = engine.summarize([chunk.page_content for chunk in chunks])
+
 # 4. Imprimir el resumen final
-print(final_summary.content)
\ No newline at end of file
+print(f"📊 {engine.stats['llm_calls']} llamadas al modelo, {engine.stats['resumed']} recuperadas del checkpoint, "
+      f"{engine.stats['levels']} niveles de reduce")
+print(final_summary)
@@ -1,34 +1,31 @@
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from pathlib import Path
+from embedding_cache import get_cached_embeddings, embedding_cache_stats
+from ingesta_pdf import ingest_pdf_directory, print_ingestion_report
 
-loader = PyPDFDirectoryLoader("Tema 3\\contratos")
-documentos = loader.load()
+BASE_DIR = Path(__file__).resolve().parent
 
-print(f"Se cargaron {len(documentos)} documentos desde el directorio.")
 
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=5000,
-    chunk_overlap=1000
-)
+if __name__ == "__main__":
+    vectorstore = Chroma(
+        embedding_function=get_cached_embeddings("text-embedding-3-large"),
+        persist_directory=str(BASE_DIR / "chroma_db")
+    )
 
-docs_split = text_splitter.split_documents(documentos)
+    # Ingesta en streaming: páginas en paralelo, chunks de 5000 caracteres con
+    # solape de 1000 y escrituras en Chroma por lotes según se van generando
+    stats = ingest_pdf_directory(str(BASE_DIR / "contratos"), vectorstore, chunk_size=5000, chunk_overlap=1000)
+    print_ingestion_report(stats)
 
-print(f"Se crearon {len(docs_split)} chunks de texto.")
+    print(f"Caché de embeddings: {embedding_cache_stats()}")
 
-vectorstore = Chroma.from_documents(
-    docs_split,
-    embedding=OpenAIEmbeddings(model="text-embedding-3-large"),
-    persist_directory="Tema 3\\chroma_db"
-)
-consulta = "¿Dónde se encuentra el local del contrato en el que participa María Jiménez Campos?"
+    consulta = "¿Dónde se encuentra el local del contrato en el que participa María Jiménez Campos?"
 
-resultados = vectorstore.similarity_search(consulta, k=2)
+    resultados = vectorstore.similarity_search(consulta, k=2)
 
-print("Top 2 documentos mas similares a la consulta: \n")
+    print("Top 2 documentos mas similares a la consulta: \n")
 
-for i, doc in enumerate(resultados, start=1):
-    print(f"Contenido: {doc.page_content}")
-    print(f"Metadatos: {doc.metadata}")
\ No newline at end of file
+    for i, doc in enumerate(resultados, start=1):
+        print(f"Contenido: {doc.page_content}")
+        print(f"Metadatos: {doc.metadata}")
@@ -1,14 +1,21 @@
 from langgraph.graph import StateGraph, START, END
 from langchain_openai import ChatOpenAI
-from typing import TypedDict, List, Annotated
+from typing import TypedDict, List, Dict, Annotated
 import os
 from tkinter import Tk, filedialog
 import openai
+import time
+from functools import wraps
 from operator import add
 
 # Configuración
 llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
 
+# Las tres extracciones se ejecutan en paralelo y cada una añade su tiempo:
+# el reductor combina los diccionarios en lugar de sobrescribirlos
+def merge_timings(left: Dict[str, float], right: Dict[str, float]) -> Dict[str, float]:
+    return {**left, **right}
+
 # Definición del Estado
 class State(TypedDict):
     notes: str
@@ -18,9 +25,22 @@ class State(TypedDict):
     minutes: str
     summary: str
     logs: Annotated[list[str], add]
+    node_timings: Annotated[Dict[str, float], merge_timings]
 
 # ============= NODOS DEL WORKFLOW =============
 
+def timed_node(func):
+    """Registra en el estado cuántos segundos tarda el nodo."""
+    @wraps(func)
+    def wrapper(state: State) -> State:
+        start = time.perf_counter()
+        update = func(state)
+        update['node_timings'] = {func.__name__: time.perf_counter() - start}
+        return update
+    return wrapper
+
+
+@timed_node
 def extract_participants(state: State) -> State:
     """Extrae los participantes de la reunión."""
     prompt = f"""
@@ -42,6 +62,7 @@ def extract_participants(state: State) -> State:
         'logs': ["Paso 1 completado"]
     }
 
+@timed_node
 def identify_topics(state: State) -> State:
     """Identifica los temas principales discutidos."""
     prompt = f"""
@@ -63,6 +84,7 @@ def identify_topics(state: State) -> State:
         'logs': ["Paso 2 completado"]
     }
 
+@timed_node
 def extract_actions(state: State) -> State:
     """Extrae las acciones acordadas y sus responsables."""
     prompt = f"""
@@ -90,6 +112,7 @@ def extract_actions(state: State) -> State:
         'logs': ["Paso 3 completado"]
     }
 
+@timed_node
 def generate_minutes(state: State) -> State:
     """Genera una minuta formal de la reunión."""
     participants_str = ", ".join(state['participants'])
@@ -127,6 +150,7 @@ def generate_minutes(state: State) -> State:
         'logs': ["Paso 4 completado"]
     }
 
+@timed_node
 def create_summary(state: State) -> State:
     """Crea un resumen ejecutivo ultra-breve."""
     prompt = f"""
@@ -161,11 +185,13 @@ def create_workflow():
     workflow.add_node("generate_minutes", generate_minutes)
     workflow.add_node("create_summary", create_summary)
     
-    # Configurar flujo secuencial
-    workflow.add_edge(START, "extract_participants")
-    workflow.add_edge("extract_participants", "identify_topics")
-    workflow.add_edge("identify_topics", "extract_actions")
-    workflow.add_edge("extract_actions", "generate_minutes")
+    # Las tres extracciones solo leen las notas: se lanzan en paralelo desde START
+    extraction_nodes = ["extract_participants", "identify_topics", "extract_actions"]
+    for node in extraction_nodes:
+        workflow.add_edge(START, node)
+    
+    # generate_minutes espera a que terminen las tres ramas
+    workflow.add_edge(extraction_nodes, "generate_minutes")
     workflow.add_edge("generate_minutes", "create_summary")
     workflow.add_edge("create_summary", END)
     
@@ -205,6 +231,7 @@ def process_meeting_notes(notes: str, app):
         'action_items': [],
         'minutes': '',
         'summary': '',
+        'node_timings': {},
         'logs': []
     }
     
@@ -212,9 +239,21 @@ def process_meeting_notes(notes: str, app):
     print("🔄 Procesando nota de reunión...")
     print("="*60)
     
+    start = time.perf_counter()
     result = app.invoke(initial_state)
+    display_timings(result['node_timings'], time.perf_counter() - start)
     return result
 
+def display_timings(node_timings: Dict[str, float], wall_clock: float):
+    """Muestra el tiempo de cada nodo frente al tiempo total real."""
+    print(f"\n⏱️ TIEMPOS POR NODO:")
+    for node, seconds in node_timings.items():
+        print(f"   • {node:<22} {seconds:6.2f} s")
+    
+    serial = sum(node_timings.values())
+    print(f"   Suma de nodos (secuencial): {serial:.2f} s")
+    print(f"   Tiempo real (en paralelo):  {wall_clock:.2f} s")
+
 def display_results(result: State, meeting_num: int):
     """Muestra los resultados de forma estructurada."""
     print(f"\n📋 RESULTADOS - REUNIÓN #{meeting_num}")
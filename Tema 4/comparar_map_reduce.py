@@ -0,0 +1,44 @@
+"""
+Compara tokens y tiempo del procesador de reuniones con y sin map-reduce.
+
+Procesa la misma transcripción con el flujo original (las notas completas en
+cada prompt) y con el modo map-reduce (trozos en paralelo + digest), y muestra
+una tabla con los tokens de entrada/salida y el tiempo de cada modo.
+
+Uso:
+    python comparar_map_reduce.py transcripcion.txt
+"""
+import argparse
+import time
+
+from procesador_reuniones_langgraph import create_workflow, process_meeting_notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens del procesador de reuniones con y sin map-reduce")
+    parser.add_argument("notes_file", help="Fichero de texto con la transcripción o las notas")
+    args = parser.parse_args()
+
+    with open(args.notes_file, "r", encoding="utf-8", errors="ignore") as f:
+        notes = f.read()
+
+    rows = []
+    for name, map_reduce in [("original", False), ("map-reduce", True)]:
+        start = time.perf_counter()
+        result = process_meeting_notes(notes, create_workflow(map_reduce=map_reduce))
+        rows.append((name, result['token_usage'], time.perf_counter() - start))
+
+    print(f"\n📊 {len(notes)} caracteres de notas")
+    print("=" * 64)
+    print(f"{'Modo':<14}{'Entrada':>12}{'Salida':>10}{'Total':>12}{'Tiempo (s)':>14}")
+    for name, usage, seconds in rows:
+        print(f"{name:<14}{usage['input_tokens']:>12}{usage['output_tokens']:>10}"
+              f"{usage['total_tokens']:>12}{seconds:>14.1f}")
+
+    before, after = rows[0][1]['total_tokens'], rows[1][1]['total_tokens']
+    if before:
+        print(f"\nAhorro: {100 * (before - after) / before:.0f}% de tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,10 +23,10 @@ def verificar_rag_setup():
     return processor.chroma_path.exists()
 
 def configurar_rag():
-    """Configura el sistema RAG."""
+    """Configura el sistema RAG (sincroniza solo los cambios si ya existe)."""
     with st.spinner("🔧 Configurando sistema RAG..."):
         processor = DocumentProcessor()
-        vectorstore = processor.setup_rag_system(force_rebuild=True)
+        vectorstore = processor.setup_rag_system(incremental=True)
         return vectorstore is not None
 
 def crear_ticket_id():
@@ -1,3 +1,9 @@
 CHROMADB_PATH = "Tema 4\\helpdesk_system\\chroma_db"
 DOCS_PATH = "Tema 4\\helpdesk_system\\docs"
-EMBEDDINGS_MODEL = "text-embedding-3-large"
\ No newline at end of file
+EMBEDDINGS_MODEL = "text-embedding-3-large"
+
+# Configuración de la búsqueda multi-query
+RAG_NUM_VARIANTS = 3        # Variantes de la consulta generadas por el LLM
+RAG_SEARCH_K = 4            # Documentos por variante
+RAG_MAX_WORKERS = 4         # Búsquedas concurrentes en ChromaDB
+RAG_RRF_K = 60              # Constante de Reciprocal Rank Fusion
\ No newline at end of file
@@ -33,15 +33,19 @@ class HelpdeskGraph:
         """Busca el contexto de la consulta utilizando el sistema RAG."""
         consulta = state['consulta']
         resultado = self.rag.buscar(consulta)
+        latencias = ", ".join(
+            f"{etapa}={datos['media_ms']}ms" for etapa, datos in self.rag.get_latency_report().items()
+        )
         return {
             "respuesta_rag": resultado["respuesta"],
             "confianza": resultado["confianza"],
             "fuentes": resultado["fuentes"],
             "contexto_rag": resultado["respuesta"],
             "historial": [
-                f"RAG ejecutado con MultiQueryRetriever",
+                f"RAG ejecutado con multi-query paralelo + RRF",
                 f"Confianza: {resultado['confianza']}",
-                f"Fuentes consultadas: {len(resultado['fuentes'])}"
+                f"Fuentes consultadas: {len(resultado['fuentes'])}",
+                f"Latencia media por etapa: {latencias}"
             ]
         }
     
@@ -1,31 +1,91 @@
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
-from langchain_classic.retrievers.multi_query import MultiQueryRetriever
 from pathlib import Path
-import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import re
+import threading
+import time
+import weakref
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.documents import Document
 from typing import List, Dict, Any
 
 from config import *
 
+from embedding_cache import get_cached_embeddings
+
+
+# Límites superiores (ms) de los buckets del histograma de latencias
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class LatencyHistogram:
+    """Histograma de latencias por etapa del pipeline RAG (seguro entre hilos)."""
+    
+    def __init__(self, buckets_ms: List[int] = LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts: Dict[str, List[int]] = {}
+        self.totals_ms: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, stage: str, elapsed_ms: float):
+        """Registra una medida en el bucket correspondiente."""
+        with self._lock:
+            counts = self.counts.setdefault(stage, [0] * (len(self.buckets_ms) + 1))
+            for i, limit in enumerate(self.buckets_ms):
+                if elapsed_ms <= limit:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self.totals_ms[stage] = self.totals_ms.get(stage, 0.0) + elapsed_ms
+    
+    @contextmanager
+    def measure(self, stage: str):
+        """Mide la duración del bloque y la registra en la etapa indicada."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - start) * 1000)
+    
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Devuelve por etapa el número de medidas, la media y los buckets."""
+        labels = [f"<={limit}ms" for limit in self.buckets_ms] + [f">{self.buckets_ms[-1]}ms"]
+        report = {}
+        with self._lock:
+            for stage, counts in self.counts.items():
+                total = sum(counts)
+                report[stage] = {
+                    "n": total,
+                    "media_ms": round(self.totals_ms[stage] / total, 1) if total else 0.0,
+                    "buckets": dict(zip(labels, counts))
+                }
+        return report
+
 
 class VectorRAGSystem:
-    """Sistema RAG avanzado con ChromaDB y MultiQueryRetriever."""
+    """Sistema RAG avanzado con ChromaDB y búsqueda multi-query paralela."""
     
     def __init__(self, chroma_path: str = "chroma_db"):
         self.chroma_path = Path(chroma_path)
-        self.embeddings = OpenAIEmbeddings(model=EMBEDDINGS_MODEL)
+        self.embeddings = get_cached_embeddings(EMBEDDINGS_MODEL)
         self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
         self.vectorstore = None
         self.retriever = None
-        
-        # Configurar logging para MultiQueryRetriever
-        logging.basicConfig()
-        logging.getLogger("langchain.retrievers.multi_query").setLevel(logging.INFO)
+        self.latencias = LatencyHistogram()
+        self._executor = ThreadPoolExecutor(max_workers=RAG_MAX_WORKERS, thread_name_prefix="rag")
+        # Apaga el pool con close() o, si nadie la llama, al liberar la instancia o al salir
+        self._finalizer = weakref.finalize(self, self._executor.shutdown, wait=False)
         
         self._load_vectorstore()
     
+    def close(self):
+        """Libera los hilos de búsqueda."""
+        self._finalizer()
+    
     def _load_vectorstore(self):
         """Carga el vectorstore de ChromaDB."""
         try:
@@ -39,15 +99,9 @@ class VectorRAGSystem:
                 collection_name="helpdesk_knowledge"
             )
             
-            # Crear MultiQueryRetriever
-            self.retriever = MultiQueryRetriever.from_llm(
-                retriever=self.vectorstore.as_retriever(
-                    search_type="similarity",
-                    search_kwargs={"k": 4}  # Más documentos para mejor contexto
-                ),
-                llm=self.llm,
-                prompt=self._get_multi_query_prompt()
-            )
+            # Cadena que genera las variantes de la consulta
+            self.query_chain = self._get_multi_query_prompt() | self.llm | StrOutputParser()
+            self.retriever = self._recuperar_documentos
             
             print("✅ VectorRAGSystem inicializado correctamente")
             
@@ -73,8 +127,69 @@ Consulta original: {question}
 Versiones alternativas:"""
         )
     
+    def _generar_variantes(self, consulta: str) -> List[str]:
+        """Genera variantes de la consulta con el LLM (una por línea)."""
+        try:
+            salida = self.query_chain.invoke({"question": consulta})
+        except Exception as e:
+            print(f"⚠️ Error generando variantes: {str(e)}")
+            return []
+        
+        variantes = []
+        for linea in salida.split("\n"):
+            # Quitar numeración o viñetas ("1.", "-", "*")
+            linea = re.sub(r"^\s*(\d+[.)]|[-*•])\s*", "", linea).strip()
+            if linea and linea.lower() != consulta.lower() and linea not in variantes:
+                variantes.append(linea)
+        return variantes[:RAG_NUM_VARIANTS]
+    
+    @staticmethod
+    def _clave_documento(doc: Document) -> str:
+        """Clave de deduplicación de un chunk (doc_id/chunk_id o contenido)."""
+        chunk_id = doc.metadata.get("chunk_id")
+        doc_id = doc.metadata.get("doc_id")
+        if chunk_id is not None:
+            return f"{doc_id}:{chunk_id}"
+        return f"{doc_id}:{hash(doc.page_content)}"
+    
+    def _fusionar_rrf(self, rankings: List[List[Document]]) -> List[Document]:
+        """Fusiona los rankings de cada variante con Reciprocal Rank Fusion."""
+        puntuaciones: Dict[str, float] = {}
+        documentos: Dict[str, Document] = {}
+        
+        for ranking in rankings:
+            for posicion, doc in enumerate(ranking):
+                clave = self._clave_documento(doc)
+                documentos.setdefault(clave, doc)
+                puntuaciones[clave] = puntuaciones.get(clave, 0.0) + 1.0 / (RAG_RRF_K + posicion + 1)
+        
+        orden = sorted(puntuaciones, key=puntuaciones.get, reverse=True)
+        return [documentos[clave] for clave in orden]
+    
+    def _recuperar_documentos(self, consulta: str) -> List[Document]:
+        """Multi-query paralelo: variantes, embeddings en lote, búsquedas concurrentes y RRF."""
+        with self.latencias.measure("variantes"):
+            consultas = [consulta] + self._generar_variantes(consulta)
+        
+        # Embeddings de consulta (embed_query, con su caché) de todas las variantes a la vez
+        with self.latencias.measure("embeddings"):
+            vectores = list(self._executor.map(self.embeddings.embed_query, consultas))
+        
+        with self.latencias.measure("busqueda"):
+            rankings = list(self._executor.map(
+                lambda vector: self.vectorstore.similarity_search_by_vector(vector, k=RAG_SEARCH_K),
+                vectores
+            ))
+        
+        with self.latencias.measure("fusion"):
+            return self._fusionar_rrf(rankings)
+    
+    def get_latency_report(self) -> Dict[str, Dict[str, Any]]:
+        """Histograma de latencias por etapa de las búsquedas realizadas."""
+        return self.latencias.report()
+    
     def buscar(self, consulta: str) -> Dict[str, Any]:
-        """Busca respuestas usando MultiQueryRetriever."""
+        """Busca respuestas con multi-query paralelo y fusión RRF."""
         if not self.retriever:
             return {
                 "respuesta": "Sistema RAG no disponible. Verifique la configuración.",
@@ -83,8 +198,8 @@ Versiones alternativas:"""
             }
         
         try:
-            # Buscar documentos relevantes con MultiQueryRetriever
-            documentos = self.retriever.invoke(consulta)
+            # Buscar documentos relevantes (deduplicados y ordenados por RRF)
+            documentos = self.retriever(consulta)
             
             if not documentos:
                 return {
@@ -116,7 +231,8 @@ Versiones alternativas:"""
             
             # Generar respuesta usando el contexto encontrado
             contexto = "\n\n".join(contexto_partes)
-            respuesta = self._generar_respuesta(consulta, contexto)
+            with self.latencias.measure("generacion"):
+                respuesta = self._generar_respuesta(consulta, contexto)
             
             # Calcular confianza basada en la relevancia
             confianza = self._calcular_confianza(consulta, documentos)
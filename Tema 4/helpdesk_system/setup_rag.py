@@ -3,13 +3,15 @@ from typing import List
 from pathlib import Path
 from langchain_community.document_loaders import DirectoryLoader, TextLoader
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
 from langchain_classic.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 import os 
 
 from config import * 
 
+import sys
+from embedding_cache import get_cached_embeddings, embedding_cache_stats
+
 class DocumentProcessor:
     """Procesador de documentos para el sistema RAG."""
     
@@ -26,7 +28,7 @@ class DocumentProcessor:
         print(f"📍 Buscando documentos en: {self.docs_path}")
         
         # 4. Configuración normal de LangChain
-        self.embeddings = OpenAIEmbeddings(model=EMBEDDINGS_MODEL)
+        self.embeddings = get_cached_embeddings(EMBEDDINGS_MODEL)
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
@@ -79,18 +81,31 @@ class DocumentProcessor:
         """Divide documentos en chunks más pequeños."""
         print("✂️  Dividiendo documentos en chunks...")
         
-        chunks = self.text_splitter.split_documents(documents)
-        
-        # Agregar metadatos de chunk
-        for i, chunk in enumerate(chunks):
-            chunk.metadata.update({
-                "chunk_id": i,
-                "chunk_size": len(chunk.page_content)
-            })
+        chunks = []
+        for document in documents:
+            doc_chunks = self.text_splitter.split_documents([document])
+            seen = {}
+            
+            # Agregar metadatos de chunk con un ID estable basado en su contenido
+            for i, chunk in enumerate(doc_chunks):
+                chunk_hash = self._generate_chunk_hash(chunk.page_content)
+                occurrence = seen.get(chunk_hash, 0)
+                seen[chunk_hash] = occurrence + 1
+                chunk.metadata.update({
+                    "chunk_id": f"{chunk.metadata['filename']}:{chunk_hash}:{occurrence}",
+                    "chunk_index": i,
+                    "chunk_hash": chunk_hash,
+                    "chunk_size": len(chunk.page_content)
+                })
+            chunks.extend(doc_chunks)
         
         print(f"✅ Creados {len(chunks)} chunks")
         return chunks
     
+    def _generate_chunk_hash(self, content: str) -> str:
+        """Genera el hash de contenido de un chunk."""
+        return hashlib.md5(content.encode()).hexdigest()
+    
     def create_vectorstore(self, documents: List[Document]) -> Chroma:
         """Crea el vectorstore con ChromaDB."""
         print("🔄 Creando vectorstore con ChromaDB...")
@@ -109,6 +124,7 @@ class DocumentProcessor:
         # Al no borrar la carpeta (si falló el rmtree), Chroma intentará añadir los docs
         vectorstore = Chroma.from_documents(
             documents=documents,
+            ids=[doc.metadata["chunk_id"] for doc in documents],
             embedding=self.embeddings,
             persist_directory=str(self.chroma_path),
             collection_name="helpdesk_knowledge"
@@ -122,6 +138,9 @@ class DocumentProcessor:
         print(f"✅ Vectorstore listo en {self.chroma_path}")
         print(f"📊 Total de vectores procesados: {len(documents)}")
         
+        stats = embedding_cache_stats()
+        print(f"💾 Caché de embeddings: {stats['hits']} aciertos / {stats['misses']} fallos")
+        
         return vectorstore
     
     def load_existing_vectorstore(self) -> Chroma:
@@ -137,26 +156,89 @@ class DocumentProcessor:
         
         return vectorstore
     
-    def setup_rag_system(self, force_rebuild: bool = False):
-        """Configura el sistema RAG completo."""
+    def sync_vectorstore(self, chunks: List[Document]) -> Chroma:
+        """Sincroniza el vectorstore existente comparando hashes de chunks.
+        
+        Solo se embeben los chunks nuevos o modificados y se eliminan los que ya
+        no existen (incluidos los de ficheros borrados); el resto no se toca.
+        """
+        print("🔄 Sincronizando vectorstore de forma incremental...")
+        vectorstore = self.load_existing_vectorstore()
+        
+        # Estado actual de la colección: chunk_id -> metadatos
+        existing = vectorstore.get(include=["metadatas"])
+        existing_meta = {chunk_id: meta or {} for chunk_id, meta in zip(existing["ids"], existing["metadatas"])}
+        existing_files = {meta.get("filename") for meta in existing_meta.values()}
+        
+        new_chunks = {chunk.metadata["chunk_id"]: chunk for chunk in chunks}
+        new_files = {chunk.metadata["filename"] for chunk in chunks}
+        
+        to_add = [chunk_id for chunk_id in new_chunks if chunk_id not in existing_meta]
+        to_delete = [chunk_id for chunk_id in existing_meta if chunk_id not in new_chunks]
+        # Chunks conservados cuyo doc_id/chunk_index ha cambiado al editar su fichero
+        to_update = [
+            chunk_id for chunk_id, chunk in new_chunks.items()
+            if chunk_id in existing_meta and existing_meta[chunk_id] != chunk.metadata
+        ]
+        
+        if to_delete:
+            vectorstore.delete(ids=to_delete)
+        if to_add:
+            vectorstore.add_documents(
+                documents=[new_chunks[chunk_id] for chunk_id in to_add],
+                ids=to_add
+            )
+        if to_update:
+            # El contenido no cambia: sus embeddings salen de la caché, no de la API
+            vectorstore.update_documents(
+                ids=to_update,
+                documents=[new_chunks[chunk_id] for chunk_id in to_update]
+            )
+        
+        # Un fichero se ha actualizado si ganó o perdió algún chunk
+        changed_files = {new_chunks[chunk_id].metadata["filename"] for chunk_id in to_add}
+        changed_files |= {existing_meta[chunk_id].get("filename") for chunk_id in to_delete}
+        files_added = new_files - existing_files
+        files_deleted = existing_files - new_files
+        files_updated = changed_files & existing_files & new_files
+        
+        print("📊 Resumen de sincronización:")
+        print(f"   ➕ Añadidos:     {len(files_added)} documentos")
+        print(f"   ✏️  Actualizados: {len(files_updated)} documentos")
+        print(f"   🗑️  Eliminados:   {len(files_deleted)} documentos")
+        print(f"   🧩 Chunks: {len(to_add)} embebidos, {len(to_delete)} borrados, "
+              f"{len(new_chunks) - len(to_add)} sin cambios ({len(to_update)} con metadatos actualizados)")
+        
+        return vectorstore
+    
+    def setup_rag_system(self, force_rebuild: bool = False, incremental: bool = False):
+        """Configura el sistema RAG completo.
+        
+        Con `incremental=True` y un vectorstore existente, solo se re-embeben los
+        chunks que han cambiado en lugar de reconstruir toda la colección.
+        """
         print("🚀 Configurando sistema RAG...")
         
         # Verificar si ya existe y no forzar rebuild
-        if self.chroma_path.exists() and not force_rebuild:
+        if self.chroma_path.exists() and not force_rebuild and not incremental:
             print("📦 Vectorstore existente encontrado")
             return self.load_existing_vectorstore()
         
         # Cargar y procesar documentos
         documents = self.load_documents()
-        if not documents:
+        sync = incremental and self.chroma_path.exists() and not force_rebuild
+        if not documents and not sync:
             print("⚠️  No se encontraron documentos para procesar")
             return None
         
         # Dividir documentos
-        chunks = self.split_documents(documents)
+        chunks = self.split_documents(documents) if documents else []
         
-        # Crear vectorstore
-        vectorstore = self.create_vectorstore(chunks)
+        # Sincronizar (sin documentos, se borran todos los chunks indexados) o crear vectorstore
+        if sync:
+            vectorstore = self.sync_vectorstore(chunks)
+        else:
+            vectorstore = self.create_vectorstore(chunks)
         
         print("✅ Sistema RAG configurado exitosamente")
         return vectorstore
@@ -184,8 +266,9 @@ def main():
     # Configurar procesador
     processor = DocumentProcessor(docs_path=DOCS_PATH, chroma_path=CHROMADB_PATH)
     
-    # Configurar sistema RAG
-    vectorstore = processor.setup_rag_system(force_rebuild=True)
+    # Configurar sistema RAG (sincronización incremental salvo con --rebuild)
+    force_rebuild = "--rebuild" in sys.argv
+    vectorstore = processor.setup_rag_system(force_rebuild=force_rebuild, incremental=not force_rebuild)
     
     if vectorstore:
         # Probar búsquedas
@@ -1,13 +1,34 @@
 from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
 from langchain_openai import ChatOpenAI
-from typing import TypedDict, List
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pydantic import BaseModel, Field
+from typing import TypedDict, List, Dict, Annotated
+from operator import add
 import os
 from tkinter import Tk, filedialog
-import openai
+import time
+from functools import wraps
+from transcripcion_segmentada import transcribe_media_chunked
 
 # Configuración
 llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
 
+# Modo map-reduce para notas largas: se trocean una vez, se extrae todo de cada
+# trozo en paralelo y minuta y resumen solo ven el resumen condensado (digest)
+CHUNK_SIZE = 8000       # caracteres por trozo; notas más cortas van por el flujo normal
+CHUNK_OVERLAP = 300
+MAX_TOPICS = 5
+
+# Las extracciones se ejecutan en paralelo y cada una añade su tiempo: el
+# reductor suma los diccionarios (los trozos del map-reduce comparten nodo)
+def merge_timings(left: Dict[str, float], right: Dict[str, float]) -> Dict[str, float]:
+    merged = dict(left)
+    for node, seconds in right.items():
+        merged[node] = merged.get(node, 0.0) + seconds
+    return merged
+
 # Definición del Estado
 class State(TypedDict):
     notes: str
@@ -16,9 +37,37 @@ class State(TypedDict):
     action_items: List[str]
     minutes: str
     summary: str
+    node_timings: Annotated[Dict[str, float], merge_timings]
+    chunks: List[str]
+    chunk_results: Annotated[List[dict], add]
+    digest: str
+
+# Estado de cada rama del map (un trozo de las notas)
+class ChunkState(TypedDict):
+    index: int
+    chunk: str
+
+class ChunkExtraction(BaseModel):
+    """Todo lo que se extrae de un trozo de notas en una sola llamada."""
+    participants: List[str] = Field(description="Nombres de las personas que participan")
+    topics: List[str] = Field(description="Temas discutidos (máximo 3)")
+    action_items: List[str] = Field(description="Acciones acordadas, con responsable si se menciona")
+    summary: str = Field(description="Resumen del trozo en 2-3 frases")
 
 # ============= NODOS DEL WORKFLOW =============
 
+def timed_node(func):
+    """Registra en el estado cuántos segundos tarda el nodo."""
+    @wraps(func)
+    def wrapper(state: State) -> State:
+        start = time.perf_counter()
+        update = func(state)
+        update['node_timings'] = {func.__name__: time.perf_counter() - start}
+        return update
+    return wrapper
+
+
+@timed_node
 def extract_participants(state: State) -> State:
     """Extrae los participantes de la reunión."""
     prompt = f"""
@@ -39,6 +88,7 @@ def extract_participants(state: State) -> State:
         'participants': participants
     }
 
+@timed_node
 def identify_topics(state: State) -> State:
     """Identifica los temas principales discutidos."""
     prompt = f"""
@@ -59,6 +109,7 @@ def identify_topics(state: State) -> State:
         'topics': topics
     }
 
+@timed_node
 def extract_actions(state: State) -> State:
     """Extrae las acciones acordadas y sus responsables."""
     prompt = f"""
@@ -85,12 +136,19 @@ def extract_actions(state: State) -> State:
         'action_items': action_items
     }
 
+@timed_node
 def generate_minutes(state: State) -> State:
     """Genera una minuta formal de la reunión."""
     participants_str = ", ".join(state['participants'])
     topics_str = "\n• ".join(state['topics'])
     actions_str = "\n• ".join(state['action_items']) if state['action_items'] else "No se definieron acciones específicas"
     
+    # En modo map-reduce se usa el digest en lugar de las notas completas
+    if state.get('digest'):
+        notes_label, notes = "RESUMEN DE LAS NOTAS", state['digest']
+    else:
+        notes_label, notes = "NOTAS ORIGINALES", state['notes']
+    
     prompt = f"""
     Genera una minuta formal y profesional basándote en la siguiente información:
     
@@ -102,7 +160,7 @@ def generate_minutes(state: State) -> State:
     ACCIONES ACORDADAS:
     • {actions_str}
     
-    NOTAS ORIGINALES: {state['notes']}
+    {notes_label}: {notes}
     
     Genera una minuta profesional de máximo 150 palabras que incluya:
     1. Encabezado con tipo de reunión
@@ -121,6 +179,7 @@ def generate_minutes(state: State) -> State:
         'minutes': response.content
     }
 
+@timed_node
 def create_summary(state: State) -> State:
     """Crea un resumen ejecutivo ultra-breve."""
     prompt = f"""
@@ -141,10 +200,90 @@ def create_summary(state: State) -> State:
         'summary': response.content
     }
 
+# ============= MAP-REDUCE PARA NOTAS LARGAS =============
+
+def _dedupe(items: List[str]) -> List[str]:
+    """Elimina duplicados ignorando mayúsculas y espacios, conservando el orden."""
+    seen, unique = set(), []
+    for item in items:
+        key = " ".join(item.lower().split())
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(item.strip())
+    return unique
+
+@timed_node
+def split_notes(state: State) -> State:
+    """Trocea las notas una única vez."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = splitter.split_text(state['notes'])
+    
+    print(f"✓ Notas divididas en {len(chunks)} trozos")
+    
+    return {
+        'chunks': chunks
+    }
+
+def route_extraction(state: State):
+    """Notas cortas: las tres extracciones de siempre. Largas: un map por trozo."""
+    if len(state['chunks']) <= 1:
+        return ["extract_participants", "identify_topics", "extract_actions"]
+    return [Send("extract_chunk", {'index': i, 'chunk': chunk}) for i, chunk in enumerate(state['chunks'])]
+
+@timed_node
+def extract_chunk(state: ChunkState) -> State:
+    """Extrae participantes, temas, acciones y un mini-resumen de un trozo."""
+    prompt = f"""
+    Este es el fragmento {state['index'] + 1} de las notas de una reunión.
+    Extrae los participantes, los temas, las acciones acordadas y un resumen breve.
+    
+    Fragmento: {state['chunk']}
+    """
+    
+    extraction = llm.with_structured_output(ChunkExtraction).invoke(prompt)
+    
+    return {
+        'chunk_results': [{'index': state['index'], **extraction.model_dump()}]
+    }
+
+@timed_node
+def merge_chunk_results(state: State) -> State:
+    """Une los resultados de los trozos y construye el digest."""
+    results = sorted(state['chunk_results'], key=lambda r: r['index'])
+    participants = _dedupe([p for r in results for p in r['participants']])
+    topics = _dedupe([t for r in results for t in r['topics']])
+    action_items = _dedupe([a for r in results for a in r['action_items']])
+    
+    # Con muchos trozos salen demasiados temas: se agrupan sobre la lista, no sobre las notas
+    if len(topics) > MAX_TOPICS:
+        response = llm.invoke(f"""
+    Agrupa estos temas de una reunión en los 3-5 temas principales.
+    
+    Temas: {'; '.join(topics)}
+    
+    Responde SOLO con los temas separados por punto y coma (;).
+    """)
+        topics = [t.strip() for t in response.content.split(';') if t.strip()]
+    
+    digest = "\n".join(f"[{r['index'] + 1}] {r['summary']}" for r in results)
+    
+    print(f"✓ {len(results)} trozos combinados: {len(participants)} participantes, "
+          f"{len(topics)} temas, {len(action_items)} acciones")
+    
+    return {
+        'participants': participants,
+        'topics': topics,
+        'action_items': action_items,
+        'digest': digest
+    }
+
 # ============= CONSTRUCCIÓN DEL GRAFO =============
 
-def create_workflow():
-    """Crea y configura el workflow de LangGraph."""
+def create_workflow(map_reduce: bool = True):
+    """Crea y configura el workflow de LangGraph.
+
+    Con `map_reduce` las notas de más de CHUNK_SIZE caracteres se procesan por trozos.
+    """
     workflow = StateGraph(State)
     
     # Agregar todos los nodos
@@ -154,11 +293,23 @@ def create_workflow():
     workflow.add_node("generate_minutes", generate_minutes)
     workflow.add_node("create_summary", create_summary)
     
-    # Configurar flujo secuencial
-    workflow.add_edge(START, "extract_participants")
-    workflow.add_edge("extract_participants", "identify_topics")
-    workflow.add_edge("identify_topics", "extract_actions")
-    workflow.add_edge("extract_actions", "generate_minutes")
+    # Las tres extracciones solo leen las notas: se lanzan en paralelo desde START
+    extraction_nodes = ["extract_participants", "identify_topics", "extract_actions"]
+    if map_reduce:
+        workflow.add_node("split_notes", split_notes)
+        workflow.add_node("extract_chunk", extract_chunk)
+        workflow.add_node("merge_chunk_results", merge_chunk_results)
+        
+        workflow.add_edge(START, "split_notes")
+        workflow.add_conditional_edges("split_notes", route_extraction, extraction_nodes + ["extract_chunk"])
+        workflow.add_edge("extract_chunk", "merge_chunk_results")
+        workflow.add_edge("merge_chunk_results", "generate_minutes")
+    else:
+        for node in extraction_nodes:
+            workflow.add_edge(START, node)
+    
+    # generate_minutes espera a que terminen las tres ramas
+    workflow.add_edge(extraction_nodes, "generate_minutes")
     workflow.add_edge("generate_minutes", "create_summary")
     workflow.add_edge("create_summary", END)
     
@@ -166,29 +317,6 @@ def create_workflow():
 
 # ============= FUNCIONES DE PROCESAMIENTO =============
 
-def transcribe_media_direct(file_path: str) -> str:
-    """Transcribe usando directamente la API de OpenAI Whisper."""
-    try:
-        print("🎙️ Transcribiendo con OpenAI Whisper API directa...")
-        
-        client = openai.OpenAI()  # Usa OPENAI_API_KEY del entorno
-        
-        with open(file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="es",  # Español
-                prompt="Esta es una reunión de trabajo en español con múltiples participantes.",
-                response_format="text"
-            )
-        
-        print(f"✓ Transcripción completada: {len(transcript)} caracteres")
-        return transcript
-        
-    except Exception as e:
-        print(f"❌ Error en transcripción: {e}")
-        return f"Error: {str(e)}"
-
 def process_meeting_notes(notes: str, app):
     """Procesa una nota de reunión individual."""
     initial_state = {
@@ -197,16 +325,44 @@ def process_meeting_notes(notes: str, app):
         'topics': [],
         'action_items': [],
         'minutes': '',
-        'summary': ''
+        'summary': '',
+        'node_timings': {},
+        'chunks': [],
+        'chunk_results': [],
+        'digest': ''
     }
     
     print("\n" + "="*60)
     print("🔄 Procesando nota de reunión...")
     print("="*60)
     
-    result = app.invoke(initial_state)
+    usage = UsageMetadataCallbackHandler()
+    start = time.perf_counter()
+    result = app.invoke(initial_state, config={"callbacks": [usage]})
+    display_timings(result['node_timings'], time.perf_counter() - start)
+    result['token_usage'] = display_token_usage(usage.usage_metadata)
     return result
 
+def display_token_usage(usage_metadata: dict) -> dict:
+    """Muestra y devuelve los tokens consumidos (suma de todos los modelos)."""
+    totals = {
+        'input_tokens': sum(u.get('input_tokens', 0) for u in usage_metadata.values()),
+        'output_tokens': sum(u.get('output_tokens', 0) for u in usage_metadata.values())
+    }
+    totals['total_tokens'] = totals['input_tokens'] + totals['output_tokens']
+    print(f"\n🔢 TOKENS: {totals['input_tokens']} entrada + {totals['output_tokens']} salida = {totals['total_tokens']}")
+    return totals
+
+def display_timings(node_timings: Dict[str, float], wall_clock: float):
+    """Muestra el tiempo de cada nodo frente al tiempo total real."""
+    print(f"\n⏱️ TIEMPOS POR NODO:")
+    for node, seconds in node_timings.items():
+        print(f"   • {node:<22} {seconds:6.2f} s")
+    
+    serial = sum(node_timings.values())
+    print(f"   Suma de nodos (secuencial): {serial:.2f} s")
+    print(f"   Tiempo real (en paralelo):  {wall_clock:.2f} s")
+
 def display_results(result: State, meeting_num: int):
     """Muestra los resultados de forma estructurada."""
     print(f"\n📋 RESULTADOS - REUNIÓN #{meeting_num}")
@@ -260,7 +416,10 @@ if __name__ == "__main__":
     media_exts = {".mp4", ".mov", ".m4a", ".mp3", ".wav", ".mkv", ".webm"}
 
     if ext in media_exts:
-        notes = transcribe_media_direct(file_path) 
+        # Grabaciones largas: segmentos solapados transcritos en paralelo
+        notes = transcribe_media_chunked(file_path)
+        if notes.startswith("Error:"):
+            raise SystemExit(1)
     else:
         with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
             notes = f.read()
@@ -0,0 +1,172 @@
+"""
+Transcripción de grabaciones largas por segmentos solapados y en paralelo.
+
+La API de Whisper rechaza ficheros de más de 25 MB y no devuelve nada hasta
+terminar. Aquí el audio se corta con ffmpeg en segmentos que se solapan unos
+segundos, se transcriben a la vez (con un máximo de peticiones simultáneas) y
+los textos se unen eliminando las palabras repetidas en cada solape.
+
+El backend de transcripción es cualquier función (ruta_del_segmento) -> texto,
+así que se puede sustituir por uno local para pruebas.
+
+Uso:
+    from transcripcion_segmentada import transcribe_media_chunked
+    notes = transcribe_media_chunked("reunion.mp4")
+"""
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from difflib import SequenceMatcher
+from typing import Callable, List, Optional, Tuple
+
+import openai
+
+# Configuración de los segmentos
+SEGMENT_SECONDS = 600       # 10 min de mp3 mono a 64 kbps ≈ 4.8 MB (límite de la API: 25 MB)
+OVERLAP_SECONDS = 8         # solape entre segmentos para no cortar palabras
+MAX_PARALLEL_REQUESTS = 4   # peticiones simultáneas a la API
+MAX_OVERLAP_WORDS = 60      # palabras que se comparan al unir dos segmentos
+MIN_OVERLAP_RUN = 3         # palabras seguidas en común para dar el solape por encontrado
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024  # tamaño máximo de fichero que acepta la API
+
+WHISPER_PROMPT = "Esta es una reunión de trabajo en español con múltiples participantes."
+
+TranscriptionBackend = Callable[[str], str]
+
+
+def whisper_api_backend(segment_path: str) -> str:
+    """Backend por defecto: API de OpenAI Whisper (usa OPENAI_API_KEY del entorno)."""
+    client = openai.OpenAI()
+    with open(segment_path, "rb") as audio_file:
+        return client.audio.transcriptions.create(
+            model="whisper-1",
+            file=audio_file,
+            language="es",
+            prompt=WHISPER_PROMPT,
+            response_format="text"
+        )
+
+
+# ============= SEGMENTACIÓN =============
+
+def media_duration(file_path: str) -> float:
+    """Duración en segundos según ffprobe."""
+    output = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", file_path],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip())
+
+
+def split_audio(file_path: str, out_dir: str, segment_seconds: int = SEGMENT_SECONDS,
+                overlap_seconds: int = OVERLAP_SECONDS) -> List[Tuple[float, str]]:
+    """Corta el audio en segmentos mp3 solapados. Devuelve [(inicio_en_segundos, ruta)]."""
+    duration = media_duration(file_path)
+    step = segment_seconds - overlap_seconds
+    segments = []
+    start = 0.0
+    while start < duration:
+        segment_path = os.path.join(out_dir, f"segmento_{len(segments):04d}.mp3")
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y", "-ss", str(start), "-t", str(segment_seconds),
+             "-i", file_path, "-vn", "-ac", "1", "-ar", "16000", "-b:a", "64k", segment_path],
+            check=True
+        )
+        segments.append((start, segment_path))
+        if start + segment_seconds >= duration:
+            break
+        start += step
+    return segments
+
+
+# ============= UNIÓN DE TEXTOS =============
+
+def _normalize(word: str) -> str:
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def merge_overlap(previous: str, current: str, max_words: int = MAX_OVERLAP_WORDS,
+                  min_run: int = MIN_OVERLAP_RUN) -> str:
+    """Une dos textos consecutivos eliminando lo que repiten en el solape.
+
+    Alinea las últimas `max_words` palabras de `previous` con las primeras de
+    `current` (ignorando mayúsculas y puntuación) y busca la secuencia común
+    más larga. Si tiene al menos `min_run` palabras, se corta ahí: de
+    `previous` se descarta lo que queda tras la secuencia (suele ser una
+    palabra cortada por el borde del segmento) y de `current` lo anterior a
+    ella. Si no hay una secuencia suficiente, se concatenan sin tocar.
+    """
+    previous_split = previous.split()
+    current_split = current.split()
+    tail_start = max(0, len(previous_split) - max_words)
+    tail = [_normalize(w) for w in previous_split[tail_start:]]
+    head = [_normalize(w) for w in current_split[:max_words]]
+
+    match = SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+    if match.size < min_run:
+        return f"{previous} {current}".strip()
+
+    kept_previous = previous_split[:tail_start + match.a + match.size]
+    return " ".join(kept_previous + current_split[match.b + match.size:])
+
+
+def stitch_transcripts(texts: List[str]) -> str:
+    """Une los textos de los segmentos en orden eliminando los solapes."""
+    transcript = ""
+    for text in texts:
+        text = text.strip()
+        transcript = merge_overlap(transcript, text) if transcript else text
+    return transcript
+
+
+# ============= TRANSCRIPCIÓN EN PARALELO =============
+
+def transcribe_segments(segments: List[Tuple[float, str]], backend: TranscriptionBackend = whisper_api_backend,
+                        max_workers: int = MAX_PARALLEL_REQUESTS) -> List[str]:
+    """Transcribe los segmentos a la vez y devuelve los textos en el orden original."""
+    texts: List[Optional[str]] = [None] * len(segments)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(backend, path): index for index, (_, path) in enumerate(segments)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            texts[index] = future.result()
+            start = segments[index][0]
+            print(f"   ✓ Segmento {index + 1}/{len(segments)} ({start / 60:.0f} min) - {done}/{len(segments)} listos")
+    return texts
+
+
+def transcribe_media_chunked(file_path: str, backend: TranscriptionBackend = whisper_api_backend,
+                             segment_seconds: int = SEGMENT_SECONDS, overlap_seconds: int = OVERLAP_SECONDS,
+                             max_workers: int = MAX_PARALLEL_REQUESTS) -> str:
+    """Transcribe una grabación de cualquier duración por segmentos en paralelo."""
+    try:
+        if not shutil.which("ffmpeg"):
+            # Sin ffmpeg no se puede segmentar: solo se envía entero si la API lo acepta
+            size = os.path.getsize(file_path)
+            if size > MAX_UPLOAD_BYTES:
+                raise RuntimeError(
+                    f"ffmpeg no está instalado y el fichero ocupa {size / 2**20:.1f} MB "
+                    f"(la API acepta como mucho {MAX_UPLOAD_BYTES // 2**20} MB). Instala ffmpeg para segmentarlo."
+                )
+            print("⚠️ ffmpeg no está instalado: se envía el fichero completo en una sola petición")
+            return backend(file_path)
+
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="transcripcion_") as tmp:
+            print("✂️ Dividiendo el audio en segmentos...")
+            segments = split_audio(file_path, tmp, segment_seconds, overlap_seconds)
+            print(f"🎙️ Transcribiendo {len(segments)} segmentos ({max_workers} en paralelo)...")
+            texts = transcribe_segments(segments, backend, max_workers)
+
+        transcript = stitch_transcripts(texts)
+        print(f"✓ Transcripción completada: {len(transcript)} caracteres en {time.perf_counter() - start:.1f} s")
+        return transcript
+
+    except Exception as e:
+        print(f"❌ Error en transcripción: {e}")
+        return f"Error: {str(e)}"
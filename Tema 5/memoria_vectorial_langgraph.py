@@ -1,11 +1,13 @@
 from langgraph.graph import MessagesState, StateGraph, START, END
 from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import HumanMessage,AIMessage, SystemMessage
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_openai import ChatOpenAI
 from langchain_chroma import Chroma
 import chromadb
 import uuid
 
+from embedding_cache import get_cached_embeddings
+
 CHROMADB_PATH = "Tema 5\\chromadb"
 
 # Configuración basica del llm
@@ -15,7 +17,7 @@ llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
 
 vectorstore = Chroma(
     collection_name="memoria_chat",
-    embedding_function=OpenAIEmbeddings(model="text-embedding-3-large"),
+    embedding_function=get_cached_embeddings("text-embedding-3-large"),
     persist_directory=CHROMADB_PATH
 )
 
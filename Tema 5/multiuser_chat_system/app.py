@@ -1,7 +1,8 @@
 import streamlit as st
 from datetime import datetime
-from memory_manager import ModernMemoryManager, UserManager
+from memory_manager import UserManager
 from chatbot import ChatbotManager
+from background_tasks import background_queue
 import time, gc
 from utils import (
     format_timestamp,
@@ -9,7 +10,7 @@ from utils import (
     validate_user_id,
     get_memory_category_icon
 )
-from config import PAGE_TITLE, PAGE_ICON
+from config import PAGE_TITLE, PAGE_ICON, CHATS_PAGE_SIZE, MEMORY_BACKEND
 
 # Configuración de la página
 st.set_page_config(
@@ -33,6 +34,8 @@ def init_session_state():
         st.session_state.chat_history = []
     if 'show_memories' not in st.session_state:
         st.session_state.show_memories = False
+    if 'chats_pages' not in st.session_state:
+        st.session_state.chats_pages = 1
 
 def user_selection_sidebar():
     """Sidebar para selección/creación de usuarios"""
@@ -57,9 +60,8 @@ def user_selection_sidebar():
                         time.sleep(0.5)  # Dar tiempo a Windows para liberar archivos
                     
                     # Ahora sí, cambiar al nuevo usuario
+                    # main() pide la instancia del nuevo usuario al pool en el rerun
                     st.session_state.current_user = u_id
-                    st.session_state.chatbot = ChatbotManager.get_chatbot(u_id)
-                    st.session_state.memory_manager = ModernMemoryManager(u_id)
                     st.session_state.current_chat = None
                     st.session_state.chat_history = []
                     st.rerun()
@@ -97,8 +99,6 @@ def user_selection_sidebar():
                 
                 if UserManager.create_user(new_user_id):
                     st.session_state.current_user = new_user_id
-                    st.session_state.chatbot = ChatbotManager.get_chatbot(new_user_id)
-                    st.session_state.memory_manager = ModernMemoryManager(new_user_id)
                     st.session_state.current_chat = None
                     st.session_state.chat_history = []
                     st.success(f"Usuario '{new_user_id}' creado")
@@ -126,25 +126,30 @@ def confirm_delete_dialog(u_to_del):
             # PASO 2: Forzar cierre de TODAS las instancias del usuario
             ChatbotManager.remove_chatbot(u_to_del)
             
-            # PASO 3: Limpieza agresiva de memoria
-            gc.collect()
-            time.sleep(1.0)  # Windows necesita tiempo
-            gc.collect()  # Segunda pasada
-            
-            # PASO 4: Intentar eliminar con más intentos y mejor manejo
-            success = False
-            for intento in range(8):  # Más intentos
-                try:
-                    gc.collect()
-                    time.sleep(0.5 + (intento * 0.3))  # Espera progresiva: 0.5s, 0.8s, 1.1s...
-                    
-                    # Intentar eliminar
-                    if UserManager.delete_user_completely(u_to_del):
-                        success = True
-                        break
-                except Exception as e:
-                    print(f"[!] Intento {intento + 1} falló: {e}")
-                    continue
+            # Con el backend compartido no hay ficheros del usuario que liberar:
+            # el borrado son operaciones de metadatos
+            if MEMORY_BACKEND == "shared":
+                success = UserManager.delete_user_completely(u_to_del)
+            else:
+                # PASO 3: Limpieza agresiva de memoria
+                gc.collect()
+                time.sleep(1.0)  # Windows necesita tiempo
+                gc.collect()  # Segunda pasada
+                
+                # PASO 4: Intentar eliminar con más intentos y mejor manejo
+                success = False
+                for intento in range(8):  # Más intentos
+                    try:
+                        gc.collect()
+                        time.sleep(0.5 + (intento * 0.3))  # Espera progresiva: 0.5s, 0.8s, 1.1s...
+                        
+                        # Intentar eliminar
+                        if UserManager.delete_user_completely(u_to_del):
+                            success = True
+                            break
+                    except Exception as e:
+                        print(f"[!] Intento {intento + 1} falló: {e}")
+                        continue
             
             # PASO 5: Limpiar estado del diálogo
             st.session_state.user_to_delete = None
@@ -190,8 +195,8 @@ def chat_history_sidebar():
     
     st.sidebar.markdown("---")
     
-    # Obtener historial de chats
-    chats = memory_manager.get_user_chats()
+    # Obtener historial de chats (paginado: solo las páginas ya mostradas)
+    chats = memory_manager.get_user_chats(limit=CHATS_PAGE_SIZE * st.session_state.chats_pages)
     if chats:
         st.sidebar.subheader("Historial")
         for chat in chats:
@@ -241,7 +246,12 @@ def chat_history_sidebar():
                             st.rerun()
         
         # Información adicional
-        st.sidebar.markdown(f"**Total de chats:** {len(chats)}")
+        total_chats = memory_manager.count_user_chats()
+        if total_chats > len(chats):
+            if st.sidebar.button("⬇️ Mostrar más chats", use_container_width=True):
+                st.session_state.chats_pages += 1
+                st.rerun()
+        st.sidebar.markdown(f"**Total de chats:** {total_chats}")
     else:
         st.sidebar.info("No hay chats todavía.\nHaz clic en 'Nuevo Chat' para comenzar.")
 
@@ -279,9 +289,9 @@ def main_chat_interface():
         # Input para comenzar nueva conversación
         user_input = st.chat_input("Comienza una nueva conversación...")
         if user_input:
-            # Crear nuevo chat con el primer mensaje
+            # Crear nuevo chat; el título se genera en segundo plano tras la respuesta
             memory_manager = st.session_state.memory_manager
-            new_chat_id = memory_manager.create_new_chat(user_input)
+            new_chat_id = memory_manager.create_new_chat()
             st.session_state.current_chat = new_chat_id
             # Procesar el primer mensaje
             process_user_message(user_input)
@@ -332,21 +342,21 @@ def process_user_message(user_input: str):
         st.write(user_input)
         st.caption(f"📅 {format_timestamp(datetime.now().isoformat())}")
     
-    # Obtener respuesta del chatbot
-    with st.spinner("Pensando..."):
-        response = st.session_state.chatbot.chat(user_input, st.session_state.current_chat)
-    
-    if response['success']:
-        # Mostrar respuesta del asistente
-        with st.chat_message("assistant"):
-            st.write(response['response'])
+    # Mostrar la respuesta del asistente token a token
+    response = {}
+    with st.chat_message("assistant"):
+        st.write_stream(
+            st.session_state.chatbot.chat_stream(user_input, st.session_state.current_chat, response)
+        )
+        if response['success']:
             caption_parts = [f"📅 {format_timestamp(datetime.now().isoformat())}"]
             if response.get('memories_used', 0) > 0:
                 caption_parts.append(f"🧠 {response['memories_used']} memorias")
             if response.get('context_optimized'):
                 caption_parts.append("⚡ Optimizado")
             st.caption(" | ".join(caption_parts))
-        
+    
+    if response['success']:
         # Actualizar metadatos del chat
         st.session_state.memory_manager.update_chat_metadata(
             st.session_state.current_chat,
@@ -361,6 +371,24 @@ def process_user_message(user_input: str):
     else:
         st.error(f"Error: {response['error']}")
 
+@st.fragment(run_every=1)
+def watch_background_events():
+    """Recoge las memorias y títulos generados en segundo plano."""
+    user_id = st.session_state.current_user
+    if not user_id:
+        return
+    
+    events = background_queue.drain_events(user_id)
+    for event in events:
+        if event["type"] == "memory":
+            st.toast(f"🧠 Nueva memoria: {truncate_text(event['result'], 60)}")
+        elif event["type"] == "title":
+            st.toast(f"✏️ Chat renombrado: {event['result']}")
+    
+    # Los títulos cambian la barra lateral y la cabecera: redibujar la app entera
+    if any(event["type"] == "title" for event in events):
+        st.rerun()
+
 def show_memory_interface(container=st):
     """Interfaz moderna para mostrar memorias vectoriales"""
     container.subheader("🧠 Memoria Vectorial")
@@ -441,10 +469,24 @@ def main():
     """Función principal de la aplicación"""
     init_session_state()
     
-    # 1. DISPARADOR DE DIÁLOGO (Si existe la variable, abrimos la función modal)
+    # 1. DISPARADOR DE DIÁLOGO (Si existe la variable, abrimos la función modal).
+    # Va antes del préstamo del chatbot para que el borrado pueda cerrarlo al momento
     if st.session_state.get('user_to_delete'):
         confirm_delete_dialog(st.session_state.user_to_delete)
     
+    if not st.session_state.current_user:
+        render_page()
+        return
+    
+    # Cada rerun trabaja con un préstamo de la instancia del pool: mientras dure,
+    # el pool no la cierra aunque la expulse (st.rerun() también la devuelve)
+    with ChatbotManager.lease(st.session_state.current_user) as chatbot:
+        st.session_state.chatbot = chatbot
+        st.session_state.memory_manager = chatbot.memory_manager
+        render_page()
+
+def render_page():
+    """Barra lateral e interfaz principal del rerun actual"""
     # 2. RENDERIZAR SIDEBAR
     user_selection_sidebar()
     
@@ -452,10 +494,25 @@ def main():
         # Historial de chats estilo ChatGPT
         chat_history_sidebar()
         
+        # Memorias y títulos que terminan en segundo plano
+        watch_background_events()
+        
         # Información del usuario actual
         st.sidebar.markdown("---")
         st.sidebar.info(f"**Usuario:** {st.session_state.current_user}")
         
+        # Métricas del pool de chatbots
+        with st.sidebar.expander("📊 Pool de chatbots"):
+            pool_stats = ChatbotManager.get_pool_stats()
+            st.caption(
+                f"Instancias: {pool_stats['instances']}/{pool_stats['max_instances']} | "
+                f"En uso: {pool_stats['leased']} | Recursos abiertos: {pool_stats['open_handles']}"
+            )
+            st.caption(
+                f"Aciertos: {pool_stats['hits']} | Fallos: {pool_stats['misses']} | "
+                f"Expulsiones: {pool_stats['evictions']} (+{pool_stats['idle_evictions']} por inactividad)"
+            )
+        
         # Botón de memorias globales
         if st.sidebar.button("🧠 Ver Todas las Memorias", use_container_width=True):
             st.session_state.show_memories = True
@@ -0,0 +1,230 @@
+"""
+Cola de tareas en segundo plano para el trabajo que no debe bloquear la respuesta
+(extracción de memorias y generación de títulos)
+"""
+import json
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+from langchain_core.exceptions import OutputParserException
+
+from config import BACKGROUND_WORKERS, BACKGROUND_MAX_ATTEMPTS, CHATS_DB_PATH
+
+# Errores que se repetirían igual en cada intento: se pasa directamente al fallback
+NON_RETRYABLE_ERRORS = (OutputParserException,)
+
+
+@dataclass
+class BackgroundTask:
+    """Tarea pendiente: el handler de `kind` con los argumentos de `payload`."""
+    task_id: int
+    user_id: str
+    kind: str                      # "memory" o "title"
+    payload: dict
+    chat_id: str = None
+    attempts: int = 0
+    created_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class TaskHandler:
+    """`func(user_id, chat_id, **payload)` lanza una excepción para que se reintente;
+    `fallback` (mismos argumentos) es la alternativa degradada cuando se agotan los intentos."""
+    func: Callable[..., Any]
+    fallback: Callable[..., Any] = None
+
+
+class BackgroundTaskQueue:
+    """Cola de tareas persistente, con workers en hilos y entrega al menos una vez.
+
+    Cada tarea se guarda en la tabla background_tasks (en chats.db) al
+    encolarla y solo se borra cuando termina bien o cuando termina su
+    fallback. Si el proceso se reinicia, replay_pending() vuelve a encolar las
+    que quedaron pendientes. Por eso las tareas se describen con datos (tipo +
+    payload JSON) y cada tipo se asocia a su función con register().
+
+    Una tarea que lanza una excepción se reencola (con espera creciente) hasta
+    BACKGROUND_MAX_ATTEMPTS intentos; los errores de NON_RETRYABLE_ERRORS van
+    directos al fallback. Cada resultado se publica como evento en el buzón
+    del usuario para que la interfaz lo recoja con drain_events().
+    """
+
+    def __init__(self, workers: int = BACKGROUND_WORKERS, max_attempts: int = BACKGROUND_MAX_ATTEMPTS,
+                 db_path: str = CHATS_DB_PATH):
+        self.max_attempts = max_attempts
+        self._handlers: Dict[str, TaskHandler] = {}
+        self._queue: "queue.Queue[BackgroundTask]" = queue.Queue()
+        self._events: Dict[str, deque] = defaultdict(lambda: deque(maxlen=100))
+        self._pending: Dict[str, int] = defaultdict(int)
+        self._queued_ids = set()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self.stats = {"completed": 0, "retried": 0, "fallback": 0, "failed": 0, "replayed": 0}
+
+        self._db_lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS background_tasks (
+                task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                chat_id TEXT,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_background_tasks_status ON background_tasks(status, task_id);
+            """
+        )
+        self.conn.commit()
+
+        for index in range(workers):
+            threading.Thread(target=self._worker, daemon=True, name=f"background-{index}").start()
+
+    def register(self, kind: str, func: Callable[..., Any], fallback: Callable[..., Any] = None):
+        """Asocia un tipo de tarea a su función (y a su fallback)."""
+        self._handlers[kind] = TaskHandler(func=func, fallback=fallback)
+
+    def submit(self, user_id: str, kind: str, chat_id: str = None, **payload):
+        """Guarda la tarea y la encola; vuelve inmediatamente."""
+        created_at = time.time()
+        with self._db_lock, self.conn:
+            task_id = self.conn.execute(
+                "INSERT INTO background_tasks (user_id, kind, chat_id, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (user_id, kind, chat_id, json.dumps(payload, ensure_ascii=False), created_at)
+            ).lastrowid
+        self._enqueue(BackgroundTask(task_id=task_id, user_id=user_id, kind=kind, payload=payload,
+                                     chat_id=chat_id, created_at=created_at))
+
+    def replay_pending(self) -> int:
+        """Vuelve a encolar las tareas pendientes de una ejecución anterior (llamar tras register())."""
+        with self._db_lock:
+            rows = self.conn.execute(
+                "SELECT task_id, user_id, kind, chat_id, payload, attempts, created_at "
+                "FROM background_tasks WHERE status = 'pending' ORDER BY task_id"
+            ).fetchall()
+        replayed = 0
+        for task_id, user_id, kind, chat_id, payload, attempts, created_at in rows:
+            with self._lock:
+                if task_id in self._queued_ids:
+                    continue
+            self._enqueue(BackgroundTask(task_id=task_id, user_id=user_id, kind=kind, payload=json.loads(payload),
+                                         chat_id=chat_id, attempts=attempts, created_at=created_at))
+            replayed += 1
+        with self._lock:
+            self.stats["replayed"] += replayed
+        if replayed:
+            print(f"🔁 {replayed} tareas en segundo plano pendientes reencoladas")
+        return replayed
+
+    def _enqueue(self, task: BackgroundTask):
+        with self._lock:
+            self._pending[task.user_id] += 1
+            self._queued_ids.add(task.task_id)
+        self._queue.put(task)
+
+    def _worker(self):
+        while True:
+            task = self._queue.get()
+            handler = self._handlers.get(task.kind)
+            if handler is None:
+                print(f"❌ Tarea '{task.kind}' sin handler registrado")
+                self._finish(task, None, failed=True)
+                continue
+
+            task.attempts += 1
+            with self._db_lock, self.conn:
+                self.conn.execute("UPDATE background_tasks SET attempts = ? WHERE task_id = ?",
+                                  (task.attempts, task.task_id))
+            try:
+                result = handler.func(task.user_id, task.chat_id, **task.payload)
+            except NON_RETRYABLE_ERRORS:
+                print(f"❌ Tarea '{task.kind}' de {task.user_id} falló sin posibilidad de reintento:")
+                traceback.print_exc()
+                self._run_fallback(task, handler)
+            except Exception:
+                if task.attempts < self.max_attempts:
+                    with self._lock:
+                        self.stats["retried"] += 1
+                    # Reintento diferido sin bloquear al worker
+                    threading.Timer(0.5 * 2 ** task.attempts, self._queue.put, args=(task,)).start()
+                    continue
+                print(f"❌ Tarea '{task.kind}' de {task.user_id} falló tras {task.attempts} intentos:")
+                traceback.print_exc()
+                self._run_fallback(task, handler)
+            else:
+                self._finish(task, result)
+
+    def _run_fallback(self, task: BackgroundTask, handler: TaskHandler):
+        if handler.fallback is None:
+            self._finish(task, None, failed=True)
+            return
+        try:
+            result = handler.fallback(task.user_id, task.chat_id, **task.payload)
+        except Exception:
+            traceback.print_exc()
+            self._finish(task, None, failed=True)
+        else:
+            with self._lock:
+                self.stats["fallback"] += 1
+            self._finish(task, result)
+
+    def _finish(self, task: BackgroundTask, result: Any, failed: bool = False):
+        # Hecha: se borra. Fallida del todo: se conserva para revisarla, pero no se reintenta
+        with self._db_lock, self.conn:
+            if failed:
+                self.conn.execute("UPDATE background_tasks SET status = 'failed' WHERE task_id = ?", (task.task_id,))
+            else:
+                self.conn.execute("DELETE FROM background_tasks WHERE task_id = ?", (task.task_id,))
+
+        with self._lock:
+            self.stats["failed" if failed else "completed"] += 1
+            if not failed and result:
+                self._events[task.user_id].append({
+                    "type": task.kind,
+                    "chat_id": task.chat_id,
+                    "result": result,
+                    "timestamp": time.time()
+                })
+            self._queued_ids.discard(task.task_id)
+            self._pending[task.user_id] -= 1
+            if self._pending[task.user_id] <= 0:
+                del self._pending[task.user_id]
+                self._idle.notify_all()
+
+    def drain_events(self, user_id: str) -> List[dict]:
+        """Devuelve (y vacía) los eventos terminados de un usuario."""
+        with self._lock:
+            events = list(self._events.get(user_id, ()))
+            self._events.pop(user_id, None)
+        return events
+
+    def pending(self, user_id: str) -> int:
+        with self._lock:
+            return self._pending.get(user_id, 0)
+
+    def wait_idle(self, user_id: str, timeout: float = 30.0) -> bool:
+        """Espera a que terminen las tareas de un usuario."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._pending.get(user_id, 0) > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+
+# Cola compartida por todos los chatbots del proceso
+background_queue = BackgroundTaskQueue()
@@ -0,0 +1,98 @@
+"""
+Benchmark de escritura de checkpoints por turno de conversación.
+
+Compara la conexión SQLite que abría el chatbot (solo WAL) con la conexión ajustada de
+checkpoint_store (WAL, synchronous=NORMAL...). Usa un grafo de mensajes sin LLM
+para medir solo el coste de persistencia: en cada turno se cronometran las
+llamadas put/put_writes del checkpointer y se reportan p50/p99.
+
+Uso:
+    python benchmark_checkpoints.py --turns 200
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.graph import StateGraph, MessagesState, START, END
+
+from checkpoint_store import create_checkpoint_connection
+
+
+class TimedSqliteSaver(SqliteSaver):
+    """SqliteSaver que acumula el tiempo dedicado a escribir checkpoints."""
+
+    def __init__(self, conn):
+        super().__init__(conn)
+        self.write_seconds = 0.0
+
+    def put(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().put(*args, **kwargs)
+        finally:
+            self.write_seconds += time.perf_counter() - start
+
+    def put_writes(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().put_writes(*args, **kwargs)
+        finally:
+            self.write_seconds += time.perf_counter() - start
+
+
+def build_app(checkpointer):
+    """Grafo de tres nodos como el del chatbot, con respuestas fijas."""
+    workflow = StateGraph(MessagesState)
+    workflow.add_node("memory_retrieval", lambda state: {})
+    workflow.add_node("context_optimization", lambda state: {})
+    workflow.add_node("response_generation", lambda state: {"messages": AIMessage(content="Respuesta " * 40)})
+    workflow.add_edge(START, "memory_retrieval")
+    workflow.add_edge("memory_retrieval", "context_optimization")
+    workflow.add_edge("context_optimization", "response_generation")
+    workflow.add_edge("response_generation", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(label, conn, turns):
+    checkpointer = TimedSqliteSaver(conn)
+    app = build_app(checkpointer)
+    config = {"configurable": {"thread_id": "benchmark"}}
+
+    latencies = []
+    for turn in range(turns):
+        checkpointer.write_seconds = 0.0
+        app.invoke({"messages": [HumanMessage(content=f"Mensaje de prueba número {turn}")]}, config)
+        latencies.append(checkpointer.write_seconds * 1000)
+
+    conn.close()
+    print(f"{label:<24} p50: {percentile(latencies, 50):7.2f} ms | p99: {percentile(latencies, 99):7.2f} ms "
+          f"| total: {sum(latencies) / 1000:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de escritura de checkpoints por turno")
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"📊 Escritura de checkpoints por turno ({args.turns} turnos, 3 nodos por turno)")
+    print("=" * 70)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Conexión tal y como la abría el chatbot (SqliteSaver solo activa WAL)
+        default_conn = sqlite3.connect(os.path.join(tmp, "default.db"), check_same_thread=False)
+        run("SqliteSaver por defecto", default_conn, args.turns)
+
+        run("checkpoint_store", create_checkpoint_connection(os.path.join(tmp, "tuned.db")), args.turns)
+
+
+if __name__ == "__main__":
+    main()
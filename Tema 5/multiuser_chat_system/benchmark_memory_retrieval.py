@@ -0,0 +1,100 @@
+"""
+Benchmark de latencia de la recuperación de memorias vectoriales.
+
+Rellena una colección de Chroma temporal con 1k, 10k y 100k memorias sintéticas
+(vectores aleatorios normalizados con categoría, importancia y fecha) y mide
+la latencia por consulta de:
+  - la búsqueda original (solo similitud, n_results=3)
+  - la búsqueda ponderada (sobre-muestreo + reordenación con NumPy)
+  - la búsqueda ponderada con prefiltro `where` (categorías e importancia)
+No necesita claves de API: las consultas usan embeddings ya calculados.
+
+Uso:
+    python benchmark_memory_retrieval.py --sizes 1000 10000 100000 --queries 50
+"""
+import argparse
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from config import MEMORY_CATEGORIES, MAX_VECTOR_RESULTS
+from memory_manager import build_memory_filter, weighted_memory_query
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def random_vectors(rng, count: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def populate(client, size: int, dim: int, rng):
+    collection = client.create_collection(f"memorias_{size}", embedding_function=None)
+    now = time.time()
+    batch_size = min(client.get_max_batch_size(), 5000)
+    for start in range(0, size, batch_size):
+        count = min(batch_size, size - start)
+        collection.add(
+            ids=[f"m{start + i}" for i in range(count)],
+            embeddings=random_vectors(rng, count, dim).tolist(),
+            documents=[f"Memoria sintética {start + i}" for i in range(count)],
+            metadatas=[{
+                "category": MEMORY_CATEGORIES[int(rng.integers(len(MEMORY_CATEGORIES)))],
+                "importance": int(rng.integers(1, 6)),
+                "created_ts": now - float(rng.uniform(0, 365)) * 86400
+            } for _ in range(count)]
+        )
+    return collection
+
+
+def measure(func, queries) -> list:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de recuperación de memorias por tamaño de colección")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=384, help="Dimensión de los embeddings")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    k = MAX_VECTOR_RESULTS
+    where = build_memory_filter(categories=MEMORY_CATEGORIES[:2], min_importance=3)
+
+    print(f"📊 Recuperación de memorias ({args.queries} consultas, k={k}, dim={args.dim})")
+    print("=" * 78)
+    print(f"{'Memorias':>10} {'Modo':<28}{'p50 (ms)':>12}{'p99 (ms)':>12}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client = chromadb.PersistentClient(path=tmp)
+        for size in args.sizes:
+            start = time.perf_counter()
+            collection = populate(client, size, args.dim, rng)
+            print(f"{size:>10} {'(carga)':<28}{(time.perf_counter() - start) * 1000:>12.0f}")
+
+            queries = random_vectors(rng, args.queries, args.dim)
+            modes = {
+                "similitud (original)": lambda q: collection.query(query_embeddings=[q.tolist()], n_results=k),
+                "ponderada": lambda q: weighted_memory_query(collection, q, k),
+                "ponderada + prefiltro": lambda q: weighted_memory_query(collection, q, k, where),
+            }
+            for name, func in modes.items():
+                func(queries[0])  # calentamiento (carga del índice HNSW)
+                latencies = measure(func, queries)
+                print(f"{size:>10} {name:<28}{percentile(latencies, 50):>12.2f}{percentile(latencies, 99):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
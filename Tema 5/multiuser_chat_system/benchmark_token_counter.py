@@ -0,0 +1,77 @@
+"""
+Micro-benchmark del recorte de contexto (trim_messages) por turno.
+
+Compara el contador original (token_counter=ChatOpenAI, que vuelve a tokenizar
+todo el historial en cada llamada) con CachedTokenCounter, que solo tokeniza
+los mensajes nuevos. Simula hilos de 50, 500 y 5000 mensajes: en cada turno
+se añade un mensaje del usuario y se recorta el historial a 4000 tokens.
+No hace llamadas a la API (tiktoken es local).
+
+Uso:
+    python benchmark_token_counter.py --turns 20
+"""
+import argparse
+import os
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, trim_messages
+from langchain_openai import ChatOpenAI
+
+from config import DEFAULT_MODEL
+from token_counter import CachedTokenCounter
+
+SIZES = [50, 500, 5000]
+
+
+def build_history(size: int):
+    """Historial alternando usuario/asistente con IDs estables, como en el checkpoint."""
+    history = []
+    for i in range(size):
+        if i % 2 == 0:
+            history.append(HumanMessage(content=f"Pregunta {i}: ¿me recuerdas qué hablamos del proyecto? " * 3,
+                                        id=str(uuid.uuid4())))
+        else:
+            history.append(AIMessage(content=f"Respuesta {i}: claro, hablamos de plazos y presupuesto. " * 6,
+                                     id=str(uuid.uuid4())))
+    return history
+
+
+def time_trims(token_counter, size: int, turns: int) -> float:
+    """Milisegundos medios por turno recortando un historial de `size` mensajes."""
+    trimmer = trim_messages(
+        strategy="last",
+        max_tokens=4000,
+        token_counter=token_counter,
+        start_on="human",
+        include_system=True
+    )
+    history = build_history(size)
+    trimmer.invoke(history)  # calentamiento (con caché: tokeniza el historial una vez)
+
+    start = time.perf_counter()
+    for turn in range(turns):
+        history.append(HumanMessage(content=f"Nuevo mensaje {turn}", id=str(uuid.uuid4())))
+        trimmer.invoke(history)
+    return (time.perf_counter() - start) / turns * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de trim_messages por turno")
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    # El contador original: ChatOpenAI.get_num_tokens_from_messages (no llama a la API)
+    llm = ChatOpenAI(model=DEFAULT_MODEL, api_key=os.getenv("OPENAI_API_KEY", "sk-benchmark"))
+
+    print(f"📊 trim_messages por turno ({args.turns} turnos, máx. 4000 tokens)")
+    print("=" * 64)
+    print(f"{'Mensajes':>10}{'ChatOpenAI (ms)':>20}{'Caché local (ms)':>20}{'Mejora':>12}")
+    for size in SIZES:
+        baseline = time_trims(llm, size, args.turns)
+        cached = time_trims(CachedTokenCounter(DEFAULT_MODEL), size, args.turns)
+        print(f"{size:>10}{baseline:>20.2f}{cached:>20.2f}{baseline / cached:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Metadatos de chats (título, fechas, nº de mensajes) y registro de usuarios en SQLite
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from config import CHATS_DB_PATH
+
+
+class ChatMetadataStore:
+    """Tabla de chats con clave (user_id, chat_id) e índice por última actualización.
+
+    Cada operación toca una sola fila dentro de su propia transacción, así que
+    varias pestañas del mismo usuario no se pisan los cambios.
+    """
+
+    def __init__(self, db_path: str = CHATS_DB_PATH):
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chats (
+                user_id TEXT NOT NULL,
+                chat_id TEXT NOT NULL,
+                title TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, chat_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_chats_updated_at ON chats(user_id, updated_at, chat_id);
+            CREATE TABLE IF NOT EXISTS users (
+                user_id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+
+    # === USUARIOS (backend compartido, sin directorio por usuario) ===
+
+    def add_user(self, user_id: str) -> bool:
+        with self._lock, self.conn:
+            return self.conn.execute(
+                "INSERT OR IGNORE INTO users (user_id, created_at) VALUES (?, ?)",
+                (user_id, datetime.now().isoformat())
+            ).rowcount > 0
+
+    def has_user(self, user_id: str) -> bool:
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def list_users(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT user_id FROM users ORDER BY user_id").fetchall()]
+
+    # === CHATS ===
+
+    def create(self, user_id: str, chat_id: str, title: str) -> dict:
+        now = datetime.now().isoformat()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO chats (user_id, chat_id, title, created_at, updated_at, message_count) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (user_id, chat_id, title, now, now)
+            )
+        return {'chat_id': chat_id, 'title': title, 'created_at': now, 'updated_at': now, 'message_count': 0}
+
+    def update(self, user_id: str, chat_id: str, title: str = None, increment_messages: bool = False):
+        """Actualiza (o crea si no existe) un único chat de forma atómica."""
+        now = datetime.now().isoformat()
+        increment = 1 if increment_messages else 0
+        with self._lock, self.conn:
+            self.conn.execute(
+                """INSERT INTO chats (user_id, chat_id, title, created_at, updated_at, message_count)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, chat_id) DO UPDATE SET
+                    title = COALESCE(?, title),
+                    message_count = message_count + ?,
+                    updated_at = excluded.updated_at""",
+                (user_id, chat_id, title or "Chat sin titulo", now, now, increment, title, increment)
+            )
+
+    def delete(self, user_id: str, chat_id: str) -> bool:
+        with self._lock, self.conn:
+            return self.conn.execute(
+                "DELETE FROM chats WHERE user_id = ? AND chat_id = ?", (user_id, chat_id)
+            ).rowcount > 0
+
+    def delete_user(self, user_id: str):
+        """Borra los chats del usuario y su entrada en el registro de usuarios."""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM chats WHERE user_id = ?", (user_id,))
+            self.conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+
+    def get(self, user_id: str, chat_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT chat_id, title, created_at, updated_at, message_count FROM chats "
+                "WHERE user_id = ? AND chat_id = ?",
+                (user_id, chat_id)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list(self, user_id: str, limit: int = None, cursor: str = None) -> Tuple[List[dict], Optional[str]]:
+        """Chats del más reciente al más antiguo, paginados por cursor.
+
+        `cursor` es el `next_cursor` de la página anterior ("updated_at|chat_id").
+        Devuelve (chats, next_cursor).
+        """
+        query = "SELECT chat_id, title, created_at, updated_at, message_count FROM chats WHERE user_id = ?"
+        params = [user_id]
+        if cursor:
+            cursor_updated, cursor_id = self.parse_cursor(cursor)
+            query += " AND (updated_at, chat_id) < (?, ?)"
+            params.extend([cursor_updated, cursor_id])
+        query += " ORDER BY updated_at DESC, chat_id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit + 1)
+
+        with self._lock:
+            rows = [dict(row) for row in self.conn.execute(query, params).fetchall()]
+
+        next_cursor = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1]['updated_at']}|{rows[-1]['chat_id']}"
+        return rows, next_cursor
+
+    @staticmethod
+    def parse_cursor(cursor: str) -> Tuple[str, str]:
+        """Separa un cursor "updated_at|chat_id"; lanza ValueError si no es válido."""
+        cursor_updated, separator, cursor_id = cursor.partition("|")
+        if not separator or not cursor_updated or not cursor_id:
+            raise ValueError(f"Cursor no válido: {cursor!r}")
+        return cursor_updated, cursor_id
+
+    def count(self, user_id: str) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chats WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def import_json(self, user_id: str, json_path: str) -> int:
+        """Migra un chats_meta.json antiguo y lo renombra para no importarlo dos veces."""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            chats_data = json.load(f)
+
+        rows = []
+        for chat in chats_data:
+            created_at = chat.get('created_at') or datetime.now().isoformat()
+            # Los ficheros antiguos podían guardar la fecha como 'update_at'
+            updated_at = chat.get('updated_at') or chat.get('update_at') or created_at
+            rows.append((user_id, chat['chat_id'], chat.get('title', "Chat sin titulo"),
+                         created_at, updated_at, chat.get('message_count', 0)))
+
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO chats (user_id, chat_id, title, created_at, updated_at, message_count) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        os.replace(json_path, json_path + ".migrated")
+        return len(rows)
+
+
+# Almacén compartido por todos los usuarios del proceso
+chat_store = ChatMetadataStore()
@@ -1,14 +1,20 @@
 from langgraph.graph import StateGraph, START, END
-import sqlite3
-from langgraph.checkpoint.sqlite import SqliteSaver
-from langchain_core.messages import HumanMessage, AIMessage, trim_messages
+from langchain_core.messages import HumanMessage, AIMessage, RemoveMessage, trim_messages
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
-from memory_manager import ModernMemoryManager, MemoryState
-from config import DEFAULT_MODEL, DEFAULT_TEMPERATURE
-import os
+from memory_manager import ModernMemoryManager, MemoryState, UserManager
+from checkpoint_store import checkpoint_pool
+from background_tasks import background_queue
+from token_counter import CachedTokenCounter
+from config import (
+    DEFAULT_MODEL, DEFAULT_TEMPERATURE, CHATBOT_POOL_MAX_INSTANCES, CHATBOT_POOL_IDLE_SECONDS,
+    COMPACTION_TRIGGER_MESSAGES, COMPACTION_KEEP_MESSAGES
+)
+from collections import OrderedDict
+from contextlib import contextmanager
 import gc
 import time
+import threading
 
 class ModernChatbot:
 
@@ -36,21 +42,34 @@ Características de tu personalidad:
 
 Usa esta información para personalizar tus respuestas, pero no menciones explícitamente que tienes memoria a menos que sea relevante para la conversación."""
 
-        # Configurar el trimming de mensajes para gestión del contexto
+        # Prompt para plegar los mensajes antiguos en un resumen acumulado
+        self.summary_prompt = ChatPromptTemplate.from_messages([
+            ("system", """Resume la conversación para que el asistente pueda continuarla sin el historial completo.
+
+Conserva los datos concretos (nombres, cifras, decisiones, peticiones pendientes) y omite saludos y relleno.
+Responde solo con el resumen, en un máximo de 250 palabras.
+
+Resumen previo (puede estar vacío):
+{summary}"""),
+            MessagesPlaceholder(variable_name="messages")
+        ])
+
+        # Configurar el trimming de mensajes para gestión del contexto.
+        # Los tokens se cuentan en local y se cachean por ID de mensaje
+        self.token_counter = CachedTokenCounter(DEFAULT_MODEL)
         self.message_trimmer = trim_messages(
             strategy="last",
             max_tokens=4000,
-            token_counter=self.llm,
+            token_counter=self.token_counter,
             start_on="human",
             include_system=True
         )
 
-        # GUARDAR LA CONEXIÓN COMO PROPIEDAD
-        self.db_path = os.path.join(self.memory_manager.user_path, "langgraph_checkpoints.sqlite")
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        
-        # Usar la conexión guardada
-        self.checkpointer = SqliteSaver(self.conn)
+        # Un único checkpointer (y una única conexión) por fichero de usuario:
+        # el grafo, el historial y el borrado de chats usan el mismo
+        self.db_path = self.memory_manager.langgraph_db_path
+        self.checkpointer = checkpoint_pool.acquire(self.db_path)
+        self.conn = self.checkpointer.conn
 
         # Crear aplicacion de LangGraph
         self.app = self._create_app()
@@ -84,13 +103,33 @@ Usa esta información para personalizar tus respuestas, pero no menciones explí
             return {"vector_memories": relevant_memories}
         
         def context_optimization_node(state):
-            """Nodo que optimiza el contexto usando trim_messages."""
+            """Nodo que compacta el historial cuando crece demasiado.
+
+            Los mensajes anteriores a la ventana de COMPACTION_KEEP_MESSAGES se
+            pliegan en el resumen acumulado y se eliminan del estado con
+            RemoveMessage, así los checkpoints no crecen con la conversación.
+            """
             messages = state['messages']
+            if len(messages) <= COMPACTION_TRIGGER_MESSAGES:
+                return {}
+
+            # La ventana que se conserva debe empezar en un mensaje del usuario
+            cut = len(messages) - COMPACTION_KEEP_MESSAGES
+            while cut < len(messages) and not isinstance(messages[cut], HumanMessage):
+                cut += 1
+            old_messages = messages[:cut]
+            if not old_messages:
+                return {}
 
-            # Aplicar trimming inteligente
-            trimmed_messages = self.message_trimmer.invoke(messages)
+            summary = (self.summary_prompt | self.llm).invoke({
+                "summary": state.get('conversation_summary') or "",
+                "messages": old_messages
+            }).content
 
-            return {"messages": trimmed_messages}
+            return {
+                "messages": [RemoveMessage(id=msg.id) for msg in old_messages],
+                "conversation_summary": summary
+            }
         
         def response_generation_node(state):
             """Nodo que genera la respuesta usando el contexto optimizado."""
@@ -109,6 +148,13 @@ Usa esta información para personalizar tus respuestas, pero no menciones explí
             else:
                 context = "No hay information previa relevante disponible."
 
+            # Resumen de la parte ya compactada de la conversación
+            if state.get('conversation_summary'):
+                context += f"\n\nResumen de la conversación anterior:\n{state['conversation_summary']}"
+
+            # Recortar lo que se envía al modelo (el estado no se modifica)
+            messages = self.message_trimmer.invoke(messages)
+
             # Crear el prompt con el contexto dinamico
             prompt = ChatPromptTemplate.from_messages([
                 ("system", self.system_template.format(context=context)),
@@ -121,51 +167,20 @@ Usa esta información para personalizar tus respuestas, pero no menciones explí
 
             return {"messages": response}
 
-        def memory_extraction_node(state):
-            """Nodo que extrae y guarda nuevas memorias vectoriales."""
-            messages = state['messages']
-            last_extraction = state.get('last_memory_extraction')
-
-            # Obtener ultimo mensaje del usuario
-            last_user_message = None
-            for msg in reversed(messages):
-                if isinstance(msg, HumanMessage):
-                    last_user_message = msg
-                    break
-
-            if not last_user_message:
-                return {}
-            
-            # Solo procesar si no hemos extraído memorias de este mensaje
-            if last_extraction != last_user_message.content:
-                self.memory_manager.extract_and_store_memories(last_user_message.content)
-                return {"last_memory_extraction": last_user_message.content}
-            
-            return {}
-        
-        # Configurar el grafo con flujo secuencial
+        # Configurar el grafo con flujo secuencial. La extracción de memorias ya
+        # no es un nodo: se encola en segundo plano tras devolver la respuesta
         workflow.add_node("memory_retrieval", memory_retrieval_node)
         workflow.add_node("context_optimization", context_optimization_node)
         workflow.add_node("response_generation", response_generation_node)
-        workflow.add_node("memory_extraction", memory_extraction_node)
 
         # Definir el flujo del grafo
         workflow.add_edge(START, "memory_retrieval")
         workflow.add_edge("memory_retrieval", "context_optimization")
         workflow.add_edge("context_optimization", "response_generation")
-        workflow.add_edge("response_generation", "memory_extraction")
-        workflow.add_edge("memory_extraction", END)
+        workflow.add_edge("response_generation", END)
 
-        # Configurar persistente con SqliteSaver
-        db_path = os.path.join(
-            self.memory_manager.user_path,
-            "langgraph_memory.db"
-        )
-
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-        checkpointer = SqliteSaver(conn)
-
-        return workflow.compile(checkpointer=checkpointer)
+        # Persistencia con el checkpointer compartido
+        return workflow.compile(checkpointer=self.checkpointer)
     
     def chat(self, message: str, chat_id: str = "default"):
         """Envía un mensaje y obtiene respuesta del chatbot."""
@@ -173,12 +188,6 @@ Usa esta información para personalizar tus respuestas, pero no menciones explí
             # Configuración para el thread especifico del chat
             config = {"configurable": {"thread_id": f"user_{self.user_id}_chat_{chat_id}"}}
 
-            # Actualizamos el titulo del chat si es necesario
-            chat_info = self.memory_manager.get_chat_info(chat_id)
-            if chat_info["title"] == "Nuevo chat":
-                chat_title = self.memory_manager._generate_chat_title(message)
-                self.memory_manager.update_chat_metadata(chat_id, chat_title)
-
             # Invocar el chatbot con el nuevo mensaje
             result = self.app.invoke(
                 {"messages": [HumanMessage(content=message)]},
@@ -188,6 +197,9 @@ Usa esta información para personalizar tus respuestas, pero no menciones explí
             # Extraer respuesta
             assistant_response = result["messages"][-1].content
 
+            # Memorias y título se generan después de responder
+            self._schedule_background_work(message, chat_id)
+
             return {
                 "success": True,
                 "response": assistant_response,
@@ -204,6 +216,48 @@ Usa esta información para personalizar tus respuestas, pero no menciones explí
                 "context_optimized": False
             }
         
+    def chat_stream(self, message: str, chat_id: str = "default", response: dict = None):
+        """Envía un mensaje y va devolviendo los tokens de la respuesta según se generan.
+
+        Usa stream_mode="messages" para reenviar los tokens del LLM del nodo
+        response_generation. Si se pasa `response`, al terminar se rellena con
+        el mismo formato que devuelve chat().
+        """
+        if response is None:
+            response = {}
+        response.update({"success": False, "response": None, "error": None,
+                         "memories_used": 0, "context_optimized": False})
+        config = {"configurable": {"thread_id": f"user_{self.user_id}_chat_{chat_id}"}}
+        tokens = []
+
+        try:
+            for mode, payload in self.app.stream(
+                {"messages": [HumanMessage(content=message)]},
+                config,
+                stream_mode=["messages", "updates"]
+            ):
+                if mode == "messages":
+                    chunk, metadata = payload
+                    if metadata.get("langgraph_node") == "response_generation" and chunk.content:
+                        tokens.append(chunk.content)
+                        yield chunk.content
+                elif "memory_retrieval" in payload:
+                    response["memories_used"] = len(payload["memory_retrieval"].get("vector_memories", []))
+
+            # Memorias y título se generan después de responder
+            self._schedule_background_work(message, chat_id)
+            response.update({"success": True, "response": "".join(tokens), "context_optimized": True})
+        except Exception as e:
+            response["error"] = str(e)
+
+    def _schedule_background_work(self, message: str, chat_id: str):
+        """Encola la extracción de memorias y, si el chat es nuevo, su título."""
+        background_queue.submit(self.user_id, "memory", chat_id=chat_id, message=message)
+
+        chat_info = self.memory_manager.get_chat_info(chat_id)
+        if chat_info and chat_info["title"] == "Nuevo chat":
+            background_queue.submit(self.user_id, "title", chat_id=chat_id, message=message)
+
     def get_conversation_history(self, chat_id: str = "default", limit: int = 50):
         """Obtiene el historial de conversación usando el estado de LangGraph."""
         try:
@@ -246,60 +300,49 @@ Usa esta información para personalizar tus respuestas, pero no menciones explí
             return False
     
     def delete_chat_from_langgraph(self, chat_id: str) -> bool:
-        """Elimina un chat de la base de datos usando la conexión existente."""
+        """Elimina un chat del checkpointer que usa el grafo."""
         try:
             thread_id = f"user_{self.user_id}_chat_{chat_id}"
             
-            # 1. IMPORTANTE: Usamos self.conn que ya está abierta desde el __init__
-            # No creamos una nueva conexión para evitar el bloqueo de Windows
-            cursor = self.conn.cursor()
-            
-            # 2. Eliminar registros de las tablas de LangGraph
-            cursor.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
-            cursor.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
-            
-            self.conn.commit()
+            # Borra checkpoints y writes del thread en la misma base de datos
+            # (y con la misma conexión) que lee el grafo
+            self.checkpointer.delete_thread(thread_id)
             print(f"✅ Registros del chat {chat_id} eliminados de SQLite.")
             return True
         except Exception as e:
             print(f"❌ Error eliminando chat de LangGraph: {e}")
             return False
-        # NOTA: No cerramos la conexión aquí (no hay finally conn.close())
-        # porque la conexión se mantiene viva para el resto del chat.
                 
     def close_all(self):
         """Libera todos los recursos antes de morir."""
         try:
-            # 1. Cerrar conexión SQLite PRIMERO (es crítico)
-            if hasattr(self, 'conn') and self.conn:
+            # Las tareas en segundo plano usan la instancia a través de un préstamo
+            # del pool, así que nunca se cierra mientras una de ellas la usa
+
+            # 1. Liberar el checkpointer compartido PRIMERO (es crítico):
+            # el pool cierra la conexión SQLite al soltar la última referencia
+            if getattr(self, 'checkpointer', None):
                 try:
-                    self.conn.close()
-                    print(f"🔒 Conexión SQLite cerrada para {self.user_id}")
+                    checkpoint_pool.release(self.db_path)
+                    print(f"🔒 Conexión SQLite liberada para {self.user_id}")
                 except Exception as e:
                     print(f"⚠️ Error cerrando SQLite: {e}")
                 finally:
+                    self.checkpointer = None
                     self.conn = None
             
-            # 2. Cerrar checkpointer si existe
-            if hasattr(self, 'checkpointer') and self.checkpointer:
-                try:
-                    if hasattr(self.checkpointer, 'conn'):
-                        self.checkpointer.conn.close()
-                except:
-                    pass
-                self.checkpointer = None
-            
-            # 3. Cerrar memoria vectorial (Chroma)
+            # 2. Cerrar memoria vectorial (Chroma)
             if hasattr(self, 'memory_manager') and self.memory_manager:
                 self.memory_manager.close_connections()
                 self.memory_manager = None
             
-            # 4. Limpiar referencias al LLM y app
+            # 3. Limpiar referencias al LLM y app
             self.llm = None
             self.app = None
             self.message_trimmer = None
+            self.token_counter = None
             
-            # 5. Forzar recolección de basura MÚLTIPLES VECES
+            # 4. Forzar recolección de basura MÚLTIPLES VECES
             gc.collect()
             time.sleep(0.3)  # Dar tiempo a Python
             gc.collect()
@@ -308,37 +351,227 @@ Usa esta información para personalizar tus respuestas, pero no menciones explí
             
         except Exception as e:
             print(f"❌ Error al cerrar recursos: {e}")
+
+    def open_handles(self) -> int:
+        """Número de recursos abiertos (conexiones SQLite y cliente Chroma)."""
+        handles = [getattr(self, 'conn', None)]
+        if getattr(self, 'memory_manager', None):
+            handles.append(self.memory_manager.client)
+        return sum(1 for handle in handles if handle is not None)
+
+
 class ChatbotManager:
+    """Pool acotado de chatbots por usuario.
+
+    Mantiene como mucho CHATBOT_POOL_MAX_INSTANCES instancias en orden LRU y
+    expulsa las que llevan más de CHATBOT_POOL_IDLE_SECONDS sin usarse. Cada
+    instancia expulsada se cierra con close_all() para liberar SQLite y Chroma.
+
+    Las instancias se usan a través de lease(): mientras haya un préstamo
+    abierto, una instancia expulsada no se cierra; close_all() se aplaza hasta
+    que se devuelve el último préstamo.
+    """
+
+    _instances = OrderedDict()   # user_id -> ModernChatbot (el más reciente al final)
+    _last_used = {}              # user_id -> time.monotonic() del último acceso
+    _leases = {}                 # id(chatbot) -> préstamos abiertos
+    _retired = {}                # id(chatbot) -> (user_id, chatbot) expulsados pendientes de cerrar
+    _lock = threading.RLock()
+    max_instances = CHATBOT_POOL_MAX_INSTANCES
+    idle_timeout = CHATBOT_POOL_IDLE_SECONDS
+    _metrics = {"hits": 0, "misses": 0, "evictions": 0, "idle_evictions": 0}
 
-    _instances = {}
+    @classmethod
+    @contextmanager
+    def lease(cls, user_id):
+        """Presta la instancia de un usuario durante el bloque `with`.
+
+            with ChatbotManager.lease(user_id) as chatbot:
+                chatbot.chat(...)
+        """
+        chatbot = cls._acquire(user_id)
+        try:
+            yield chatbot
+        finally:
+            cls._release(chatbot)
 
     @classmethod
-    def get_chatbot(cls, user_id):
-        """Obtiene o crea una instancia de chatbot para un usuario"""
-        if user_id not in cls._instances:
-            cls._instances[user_id] = ModernChatbot(user_id)
+    def _acquire(cls, user_id):
+        """Obtiene o crea la instancia de un usuario y abre un préstamo sobre ella."""
+        with cls._lock:
+            expired = cls._pop_idle()
+            chatbot = cls._instances.get(user_id)
+            if chatbot is not None:
+                cls._metrics["hits"] += 1
+                cls._checkout(user_id, chatbot)
+        cls._close_evicted(expired)
+        if chatbot is not None:
+            return chatbot
+
+        # Crear la instancia fuera del lock: un fallo del pool no bloquea a los demás usuarios
+        created = ModernChatbot(user_id)
+        with cls._lock:
+            chatbot = cls._instances.get(user_id)
+            if chatbot is not None:
+                # Otro hilo la creó mientras tanto: usar la suya y descartar la nuestra
+                cls._metrics["hits"] += 1
+                duplicate = [(user_id, created)]
+            else:
+                cls._metrics["misses"] += 1
+                chatbot = created
+                cls._instances[user_id] = chatbot
+                duplicate = []
+                while len(cls._instances) > cls.max_instances:
+                    lru_user, lru_chatbot = cls._instances.popitem(last=False)
+                    cls._last_used.pop(lru_user, None)
+                    cls._metrics["evictions"] += 1
+                    expired.append((lru_user, lru_chatbot))
+            cls._checkout(user_id, chatbot)
+
+        for _, instance in duplicate:
+            instance.close_all()
+        cls._close_evicted(expired)
+        return chatbot
+
+    @classmethod
+    def _checkout(cls, user_id, chatbot):
+        """Marca la instancia como usada y abre un préstamo (llamar con el lock tomado)."""
+        cls._instances.move_to_end(user_id)
+        cls._last_used[user_id] = time.monotonic()
+        cls._leases[id(chatbot)] = cls._leases.get(id(chatbot), 0) + 1
+
+    @classmethod
+    def _release(cls, chatbot):
+        """Devuelve un préstamo; si la instancia ya fue expulsada y era el último, se cierra."""
+        with cls._lock:
+            key = id(chatbot)
+            cls._leases[key] -= 1
+            if cls._leases[key] > 0:
+                return
+            del cls._leases[key]
+            retired = cls._retired.pop(key, None)
+        if retired is not None:
+            retired[1].close_all()
+            print(f"♻️ Chatbot de {retired[0]} cerrado al devolver el último préstamo")
+
+    @classmethod
+    def _pop_idle(cls):
+        """Saca del pool las instancias inactivas (llamar con el lock tomado)."""
+        now = time.monotonic()
+        expired = []
+        for user_id, chatbot in list(cls._instances.items()):
+            if id(chatbot) in cls._leases:
+                continue  # en uso: no está inactiva
+            if now - cls._last_used.get(user_id, now) > cls.idle_timeout:
+                del cls._instances[user_id]
+                cls._last_used.pop(user_id, None)
+                cls._metrics["idle_evictions"] += 1
+                expired.append((user_id, chatbot))
+        return expired
+
+    @classmethod
+    def _close_evicted(cls, evicted):
+        """Cierra las instancias sacadas del pool, o aplaza el cierre si están prestadas."""
+        for user_id, chatbot in evicted:
+            with cls._lock:
+                if id(chatbot) in cls._leases:
+                    cls._retired[id(chatbot)] = (user_id, chatbot)
+                    continue
+            # Cerrar fuera del lock: close_all() puede tardar (gc + esperas)
+            chatbot.close_all()
+            print(f"♻️ Chatbot de {user_id} expulsado del pool")
+
+    @classmethod
+    def evict_idle(cls) -> int:
+        """Expulsa las instancias inactivas; devuelve cuántas se cerraron."""
+        with cls._lock:
+            expired = cls._pop_idle()
+        cls._close_evicted(expired)
+        return len(expired)
 
-        return cls._instances[user_id]
-    
-    # En chatbot.py
     @classmethod
     def remove_chatbot(cls, user_id):
         """Elimina una instancia de chatbot liberando recursos PRIMERO"""
-        if user_id in cls._instances:
-            # 1. Recuperamos la instancia ANTES de borrarla
-            instancia = cls._instances[user_id]
-            
-            # 2. Llamamos al método que cierra SQLite y Chroma
-            instancia.close_all()
-            
-            # 3. Ahora sí, la borramos del diccionario global
-            del cls._instances[user_id]
-            
-            # 4. Forzamos a Python a limpiar la RAM inmediatamente
+        with cls._lock:
+            instancia = cls._instances.pop(user_id, None)
+            cls._last_used.pop(user_id, None)
+
+        if instancia is not None:
+            # Cerramos SQLite y Chroma antes de soltar la referencia (o al devolver el préstamo)
+            cls._close_evicted([(user_id, instancia)])
             gc.collect()
             print(f"🗑️ Memoria global y archivos liberados para {user_id}")
     
     @classmethod
     def clear_all(cls):
-        """Limpia toas las instancias de chatbot"""
-        cls._instances.clear()
\ No newline at end of file
+        """Cierra y elimina todas las instancias de chatbot"""
+        with cls._lock:
+            instances = list(cls._instances.items())
+            cls._instances.clear()
+            cls._last_used.clear()
+        cls._close_evicted(instances)
+
+    @classmethod
+    def get_pool_stats(cls) -> dict:
+        """Métricas del pool: aciertos, fallos, expulsiones y recursos abiertos."""
+        with cls._lock:
+            total = cls._metrics["hits"] + cls._metrics["misses"]
+            return {
+                **cls._metrics,
+                "hit_rate": round(cls._metrics["hits"] / total, 3) if total else 0.0,
+                "instances": len(cls._instances),
+                "leased": len(cls._leases),
+                "pending_close": len(cls._retired),
+                "max_instances": cls.max_instances,
+                "open_handles": sum(chatbot.open_handles() for chatbot in cls._instances.values())
+            }
+
+
+# ============= TAREAS EN SEGUNDO PLANO =============
+# Se ejecutan con un préstamo del pool: usan la instancia del usuario si está
+# abierta o crean una (p. ej. al reanudar tareas pendientes tras un reinicio).
+
+def _with_memory_manager(user_id, func):
+    if not UserManager.user_exists(user_id):
+        return None  # usuario borrado: no hay nada que actualizar
+    with ChatbotManager.lease(user_id) as chatbot:
+        return func(chatbot.memory_manager)
+
+
+def _extract_memories_task(user_id, chat_id, message):
+    # Los errores del LLM y de escritura se propagan para que la cola reintente;
+    # la tarea solo se da por hecha cuando la memoria está escrita en Chroma
+    def run(memory_manager):
+        memory = memory_manager.extract_and_store_memories(message, raise_errors=True)
+        memory_manager.flush_vector_memories(raise_errors=True)
+        return memory
+    return _with_memory_manager(user_id, run)
+
+
+def _extract_memories_fallback(user_id, chat_id, message):
+    def run(memory_manager):
+        memory = memory_manager._extract_memories_manual(message)
+        memory_manager.flush_vector_memories(raise_errors=True)
+        return memory
+    return _with_memory_manager(user_id, run)
+
+
+def _generate_title_task(user_id, chat_id, message):
+    def run(memory_manager):
+        chat_title = memory_manager._generate_chat_title(message, raise_errors=True)
+        memory_manager.update_chat_metadata(chat_id, chat_title)
+        return chat_title
+    return _with_memory_manager(user_id, run)
+
+
+def _fallback_title_task(user_id, chat_id, message):
+    def run(memory_manager):
+        chat_title = message[:30] + "..." if len(message) > 30 else message
+        memory_manager.update_chat_metadata(chat_id, chat_title)
+        return chat_title
+    return _with_memory_manager(user_id, run)
+
+
+background_queue.register("memory", _extract_memories_task, fallback=_extract_memories_fallback)
+background_queue.register("title", _generate_title_task, fallback=_fallback_title_task)
+background_queue.replay_pending()
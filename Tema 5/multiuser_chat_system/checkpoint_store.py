@@ -0,0 +1,101 @@
+"""
+Conexiones SQLite compartidas para los checkpoints de LangGraph
+"""
+import sqlite3
+import threading
+from typing import Dict
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+# Pragmas para escrituras frecuentes y pequeñas (un checkpoint por paso del grafo)
+CHECKPOINT_PRAGMAS = {
+    "journal_mode": "WAL",       # lectores y escritor no se bloquean entre sí
+    "synchronous": "NORMAL",     # con WAL es seguro y evita un fsync por commit
+    "busy_timeout": 5000,        # esperar en vez de fallar con "database is locked"
+    "cache_size": -16000,        # ~16 MB de caché de páginas
+    "temp_store": "MEMORY",
+    "mmap_size": 134217728       # 128 MB mapeados en memoria para lecturas
+}
+
+
+def create_checkpoint_connection(db_path: str) -> sqlite3.Connection:
+    """Abre una conexión SQLite con los pragmas de CHECKPOINT_PRAGMAS."""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    for pragma, value in CHECKPOINT_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma}={value}")
+    return conn
+
+
+class CheckpointStorePool:
+    """Pool de checkpointers SQLite del proceso, uno por fichero de base de datos.
+
+    Todas las instancias que usan el mismo fichero comparten una única conexión
+    y un único SqliteSaver (que serializa los accesos con su propio lock). La
+    conexión se cierra cuando se libera la última referencia.
+    """
+
+    def __init__(self):
+        self._stores: Dict[str, SqliteSaver] = {}
+        self._refs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, db_path: str) -> SqliteSaver:
+        """Devuelve el checkpointer compartido de `db_path`, creándolo si hace falta."""
+        with self._lock:
+            if db_path not in self._stores:
+                checkpointer = SqliteSaver(create_checkpoint_connection(db_path))
+                checkpointer.setup()
+                self._stores[db_path] = checkpointer
+                self._refs[db_path] = 0
+            self._refs[db_path] += 1
+            return self._stores[db_path]
+
+    def release(self, db_path: str):
+        """Suelta una referencia; cierra la conexión al liberar la última."""
+        with self._lock:
+            if db_path not in self._refs:
+                return
+            self._refs[db_path] -= 1
+            if self._refs[db_path] <= 0:
+                checkpointer = self._stores.pop(db_path)
+                del self._refs[db_path]
+                checkpointer.conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"open_connections": len(self._stores), "references": sum(self._refs.values())}
+
+
+def vacuum_checkpoints(conn: sqlite3.Connection, keep_last: int) -> dict:
+    """Borra los checkpoints antiguos de cada thread y compacta el fichero.
+
+    Conserva los `keep_last` checkpoints más recientes de cada (thread_id,
+    checkpoint_ns); el último contiene el estado completo, así que get_state
+    sigue funcionando. Pensado para ejecutarse con la aplicación parada.
+    """
+    threads = conn.execute("SELECT DISTINCT thread_id, checkpoint_ns FROM checkpoints").fetchall()
+    deleted = 0
+    with conn:
+        for thread_id, checkpoint_ns in threads:
+            # Los checkpoint_id son UUIDv6: ordenarlos equivale a ordenarlos en el tiempo
+            stale = conn.execute(
+                """SELECT checkpoint_id FROM checkpoints
+                WHERE thread_id = ? AND checkpoint_ns = ?
+                ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?""",
+                (thread_id, checkpoint_ns, keep_last)
+            ).fetchall()
+            for (checkpoint_id,) in stale:
+                for table in ("writes", "checkpoints"):
+                    conn.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                        (thread_id, checkpoint_ns, checkpoint_id)
+                    )
+            deleted += len(stale)
+
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    return {"threads": len(threads), "deleted_checkpoints": deleted}
+
+
+# Pool compartido por todos los chatbots del proceso
+checkpoint_pool = CheckpointStorePool()
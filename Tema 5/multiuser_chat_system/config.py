@@ -13,8 +13,50 @@ os.makedirs(USERS_DIR, exist_ok=True)
 DEFAULT_MODEL = "gpt-4o-mini"
 DEFAULT_TEMPERATURE = 0.3
 
+# Caché de recuentos de tokens (mensajes recordados para trim_messages)
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", 50000))
+
+# Compactación de conversaciones largas: al superar COMPACTION_TRIGGER_MESSAGES
+# los mensajes anteriores a los últimos COMPACTION_KEEP_MESSAGES se resumen
+COMPACTION_TRIGGER_MESSAGES = int(os.getenv("COMPACTION_TRIGGER_MESSAGES", 40))
+COMPACTION_KEEP_MESSAGES = int(os.getenv("COMPACTION_KEEP_MESSAGES", 20))
+# Checkpoints que conserva por thread el comando vacuum_checkpoints.py
+CHECKPOINTS_KEEP_PER_THREAD = int(os.getenv("CHECKPOINTS_KEEP_PER_THREAD", 3))
+
+# Pool de instancias de chatbot (una por usuario activo)
+CHATBOT_POOL_MAX_INSTANCES = int(os.getenv("CHATBOT_POOL_MAX_INSTANCES", 20))
+CHATBOT_POOL_IDLE_SECONDS = int(os.getenv("CHATBOT_POOL_IDLE_SECONDS", 1800))
+
+# Tareas en segundo plano (extracción de memorias y títulos)
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", 2))
+BACKGROUND_MAX_ATTEMPTS = int(os.getenv("BACKGROUND_MAX_ATTEMPTS", 3))
+
+# Metadatos de chats (todos los usuarios en una única base de datos)
+CHATS_DB_PATH = os.path.join(DATA_DIR, "chats.db")
+CHATS_PAGE_SIZE = 20
+
 # Configuración de memoria
 MAX_VECTOR_RESULTS = 3
+# Modelo de embeddings de la memoria vectorial (escrituras y consultas)
+MEMORY_EMBEDDING_MODEL = "text-embedding-3-large"
+# Almacenamiento de usuarios:
+#  - "per_user": un directorio por usuario (users/<id>) con su Chroma y sus checkpoints
+#  - "shared": una única colección de Chroma filtrada por user_id y una única base
+#    de checkpoints en DATA_DIR; crear y borrar usuarios son operaciones de metadatos
+MEMORY_BACKEND = os.getenv("MEMORY_BACKEND", "per_user")
+SHARED_CHROMADB_PATH = os.path.join(DATA_DIR, "chromadb")
+SHARED_MEMORY_COLLECTION = "memorias"
+SHARED_CHECKPOINTS_DB_PATH = os.path.join(DATA_DIR, "langgraph_memory.db")
+# Escrituras de memoria vectorial: tamaño del lote y similitud (coseno) a partir
+# de la cual una memoria nueva se considera duplicada de una existente
+MEMORY_WRITE_BATCH_SIZE = int(os.getenv("MEMORY_WRITE_BATCH_SIZE", 8))
+MEMORY_DEDUP_THRESHOLD = float(os.getenv("MEMORY_DEDUP_THRESHOLD", 0.92))
+# Recuperación de memorias: "similarity" (solo vectores) o "weighted"
+# (similitud + importancia + recencia sobre candidatos prefiltrados)
+MEMORY_RETRIEVAL_MODE = os.getenv("MEMORY_RETRIEVAL_MODE", "weighted")
+MEMORY_SCORE_WEIGHTS = {"similarity": 0.6, "importance": 0.25, "recency": 0.15}
+MEMORY_RECENCY_HALF_LIFE_DAYS = 30
+MEMORY_OVERFETCH = 4  # candidatos por resultado que se piden a Chroma antes de reordenar
 MEMORY_CATEGORIES = [
     "personal",
     "profesional",
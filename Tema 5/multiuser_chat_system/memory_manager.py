@@ -1,12 +1,11 @@
 import os
 import uuid
-import json
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from typing_extensions import TypedDict, Annotated
-import chromadb
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+import numpy as np
+import threading
+from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.messages import BaseMessage
@@ -16,7 +15,14 @@ import shutil
 import gc
 import time
 
-from config import USERS_DIR, MAX_VECTOR_RESULTS, DEFAULT_MODEL
+from config import (
+    USERS_DIR, MAX_VECTOR_RESULTS, DEFAULT_MODEL, MEMORY_WRITE_BATCH_SIZE, MEMORY_DEDUP_THRESHOLD,
+    MEMORY_RETRIEVAL_MODE, MEMORY_SCORE_WEIGHTS, MEMORY_RECENCY_HALF_LIFE_DAYS, MEMORY_OVERFETCH,
+    MEMORY_BACKEND, SHARED_CHROMADB_PATH, SHARED_MEMORY_COLLECTION, SHARED_CHECKPOINTS_DB_PATH
+)
+from chat_store import chat_store
+from checkpoint_store import checkpoint_pool
+from vector_store import chroma_clients, get_memory_embedding_function, open_memory_collection
 
 # Estado extendido que combina mensajes con memoria vectorial
 class MemoryState(TypedDict):
@@ -25,6 +31,7 @@ class MemoryState(TypedDict):
     vector_memories: List[str] # IDs de memorias vectoriales activas
     user_profile: Dict[str, Any] # Perfil del usuario
     last_memory_extraction: Optional[str] # Ultimo mensaje procesado para memorias
+    conversation_summary: Optional[str] # Resumen acumulado de los mensajes compactados
 
 class ExtractedMemory(BaseModel):
     """Modelo para memoria extraída estructurada."""
@@ -32,22 +39,106 @@ class ExtractedMemory(BaseModel):
     content: str = Field(description="Contenido de la memoria")
     importance: int = Field(description="Importancia del 1 al 5", ge=1, le=5)
 
+def build_memory_filter(categories: Optional[List[str]] = None, min_importance: Optional[int] = None,
+                        max_age_days: Optional[float] = None, user_id: Optional[str] = None) -> Optional[Dict]:
+    """Construye la cláusula `where` de Chroma para prefiltrar memorias.
+
+    `user_id` solo hace falta con el backend compartido (una colección para todos).
+    """
+    clauses = []
+    if user_id:
+        clauses.append({"user_id": user_id})
+    if categories:
+        clauses.append({"category": {"$in": list(categories)}})
+    if min_importance:
+        clauses.append({"importance": {"$gte": min_importance}})
+    if max_age_days:
+        clauses.append({"created_ts": {"$gte": time.time() - max_age_days * 86400}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def score_memories(similarities: np.ndarray, importances: np.ndarray, ages_days: np.ndarray) -> np.ndarray:
+    """Puntuación combinada (vectorizada) de similitud, importancia y recencia."""
+    recency = np.exp(-np.log(2) * np.maximum(ages_days, 0) / MEMORY_RECENCY_HALF_LIFE_DAYS)
+    return (MEMORY_SCORE_WEIGHTS["similarity"] * similarities
+            + MEMORY_SCORE_WEIGHTS["importance"] * importances / 5
+            + MEMORY_SCORE_WEIGHTS["recency"] * recency)
+
+
+def _memory_created_ts(metadata: Dict, default: float) -> float:
+    """Fecha de creación en epoch (las memorias antiguas solo tienen el ISO timestamp)."""
+    if metadata.get("created_ts"):
+        return metadata["created_ts"]
+    try:
+        return datetime.fromisoformat(metadata["timestamp"]).timestamp()
+    except (KeyError, ValueError):
+        return default
+
+
+def weighted_memory_query(collection, query_embedding, k: int = MAX_VECTOR_RESULTS, where: Optional[Dict] = None,
+                          now: Optional[float] = None):
+    """Consulta Chroma con prefiltro, pide k * MEMORY_OVERFETCH candidatos y los reordena.
+
+    Devuelve (documentos, metadatos, puntuaciones) de los k mejores.
+    """
+    query = np.asarray(query_embedding, dtype=np.float32)
+    results = collection.query(
+        query_embeddings=[query.tolist()],
+        n_results=k * MEMORY_OVERFETCH,
+        where=where,
+        include=["documents", "metadatas", "embeddings"]
+    )
+    documents = results["documents"][0] if results["documents"] else []
+    if not documents:
+        return [], [], []
+    metadatas = [meta or {} for meta in results["metadatas"][0]]
+
+    candidates = np.asarray(results["embeddings"][0], dtype=np.float32)
+    similarities = candidates @ query / (np.linalg.norm(candidates, axis=1) * np.linalg.norm(query) + 1e-12)
+
+    now = now or time.time()
+    importances = np.array([meta.get("importance", 2) for meta in metadatas], dtype=np.float32)
+    created = np.array([_memory_created_ts(meta, now) for meta in metadatas], dtype=np.float64)
+    scores = score_memories(similarities, importances, (now - created) / 86400)
+
+    best = np.argsort(-scores)[:k]
+    return [documents[i] for i in best], [metadatas[i] for i in best], scores[best].tolist()
+
+
 class ModernMemoryManager:
 
     def __init__(self, user_id: str):
         self.user_id = user_id
         self.user_path = os.path.join(USERS_DIR, user_id)
-        os.makedirs(self.user_path, exist_ok=True)
+        self.shared_backend = MEMORY_BACKEND == "shared"
 
-        # Base de datos vectorial chromadb para memoria transversal
-        self.chromadb_path = os.path.join(self.user_path, "chromadb")
+        if self.shared_backend:
+            # Todos los usuarios en la misma colección y en la misma base de checkpoints
+            self.chromadb_path = SHARED_CHROMADB_PATH
+            self.collection_name = SHARED_MEMORY_COLLECTION
+            self.langgraph_db_path = SHARED_CHECKPOINTS_DB_PATH
+        else:
+            os.makedirs(self.user_path, exist_ok=True)
+            self.chromadb_path = os.path.join(self.user_path, "chromadb")
+            self.collection_name = f"memoria_{self.user_id}"
+            self.langgraph_db_path = os.path.join(self.user_path, "langgraph_memory.db")
+
+        # Memorias pendientes de escribir en lote: (id, texto, metadatos)
+        self._pending_memories = []
+        self._pending_lock = threading.Lock()
+        # Un solo flush a la vez: dos flush concurrentes (chat y tarea en segundo
+        # plano) buscarían vecinos por separado y podrían duplicar una memoria
+        self._flush_lock = threading.Lock()
+        self.memory_write_stats = {"added": 0, "merged": 0, "skipped": 0}
         self._init_vector_db()
 
         # Sistema de extracción inteligente de memoria transversal
         self._init_extraction_system()
 
-        # Ruta de la base de datos LangGraph
-        self.langgraph_db_path = os.path.join(self.user_path, "langgraph_memory.db")
+        # Metadatos de chats en SQLite (migrando el JSON antiguo si queda alguno)
+        self._migrate_chats_json()
 
     def _init_vector_db(self):
         """Inicializa la base de datos vectorial chromadb"""
@@ -56,23 +147,18 @@ class ModernMemoryManager:
             if not os.path.exists(self.chromadb_path):
                 os.makedirs(self.chromadb_path, exist_ok=True)
             
-            self.vectorstore = Chroma(
-                collection_name=f"memoria_{self.user_id}",
-                embedding_function=OpenAIEmbeddings(model="text-embedding-3-large"),
-                persist_directory=self.chromadb_path
-            )
-
-            self.client = chromadb.PersistentClient(path=self.chromadb_path)
-            try:
-                self.collection = self.client.get_collection(f"memoria_{self.user_id}")
-            except:
-                self.collection = self.client.create_collection(f"memoria_{self.user_id}")
+            # Una sola función de embeddings (OpenAI cacheada) para escribir y
+            # consultar, y un único cliente de Chroma compartido por directorio
+            self.embedding_function = get_memory_embedding_function()
+            self.client = chroma_clients.acquire(self.chromadb_path)
+            self.collection = open_memory_collection(self.client, self.collection_name, self.embedding_function)
 
         except Exception as e:
             # Solo mostrar error si NO es por archivos eliminados
             if "Could not connect to tenant" not in str(e):
                 print(f"Error inicializando Chromadb: {e}")
-            self.vectorstore = None
+            if getattr(self, 'client', None):
+                chroma_clients.release(self.chromadb_path)
             self.collection = None
             self.client = None
     
@@ -107,37 +193,32 @@ Si no contiene información relevante para recordar, responde con categoría "no
             print(f"Error inicializando el sistema de extracción: {e}")
             self.extraction_chain = None
 
-    # === GESTIÓN DE CHATS (híbridos: JSON ligero + LangGraph para persistencia) ===
+    # === GESTIÓN DE CHATS (híbridos: SQLite ligero + LangGraph para persistencia) ===
 
-    def get_user_chats(self):
-        """Obtiene todos los chats del usuario."""
-        try:
-            # Si no existe archivo de metadatos, retornar vació
-            chats_meta_file = os.path.join(self.user_path, "chats_meta.json")
-            if not os.path.exists(chats_meta_file):
-                return []
-            
-            # Cargar metadatos
-            with open(chats_meta_file, 'r', encoding='utf-8') as f:
-                chats_data = json.load(f)
+    def _migrate_chats_json(self):
+        """Importa el chats_meta.json de versiones anteriores, si existe."""
+        chats_meta_file = os.path.join(self.user_path, "chats_meta.json")
+        if os.path.exists(chats_meta_file):
+            try:
+                imported = chat_store.import_json(self.user_id, chats_meta_file)
+                print(f"📦 {imported} chats migrados a SQLite para {self.user_id}")
+            except Exception as e:
+                print(f"Error migrando chats_meta.json: {e}")
 
-            # Ordenar por ultima actualización
-            chats_data.sort(key=lambda x: x.get('updated_at', ''), reverse=True)
-            return chats_data
-        
+    def get_user_chats(self, limit: int = None, cursor: str = None):
+        """Obtiene los chats del usuario, del más reciente al más antiguo."""
+        return self.get_user_chats_page(limit, cursor)[0]
+
+    def get_user_chats_page(self, limit: int = None, cursor: str = None):
+        """Obtiene una página de chats: (chats, next_cursor)."""
+        try:
+            return chat_store.list(self.user_id, limit=limit, cursor=cursor)
         except Exception as e:
             print(f"Error obteniendo chats: {e}")
-            return []
-        
-    def _save_chats_metadata(self, chats_data):
-        """Guarda metadatos ligeros del chat."""
-        try:
-            chats_meta_file = os.path.join(self.user_path, "chats_meta.json")
-            with open(chats_meta_file, 'w', encoding='utf-8') as f:
-                json.dump(chats_data, f, indent=2, ensure_ascii=False)
+            return [], None
 
-        except Exception as e:
-            print(f"Error guardando metadatos de chats {e}")
+    def count_user_chats(self) -> int:
+        return chat_store.count(self.user_id)
         
     def create_new_chat(self, first_message: str = ""):
         """Crea un nuevo chat y actualiza metadatos."""
@@ -146,55 +227,22 @@ Si no contiene información relevante para recordar, responde con categoría "no
         # Generar un titulo basado en el primer mensaje
         title = self._generate_chat_title(first_message) if first_message else "Nuevo chat"
 
-        # Crear metadatos del chat
-        new_chat = {
-            'chat_id': chat_id,
-            'title': title,
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat(),
-            'message_count': 0
-        }
-
-        # Cargar chats existentes y agregar el nuevo
-        chats_data = self.get_user_chats()
-        chats_data.append(new_chat)
-        self._save_chats_metadata(chats_data)
-
+        chat_store.create(self.user_id, chat_id, title)
         return chat_id
 
     def update_chat_metadata(self, chat_id, title: str = None, increment_messages: bool = False):
-        """Actualiza metadatos de un chat."""
-        chats_data = self.get_user_chats()
-
-        for chat in chats_data:
-            if chat['chat_id'] == chat_id:
-                if title:
-                    chat['title'] = title
-                if increment_messages:
-                    chat['message_count'] = chat.get('message_count', 0) + 1
-                chat['update_at'] = datetime.now().isoformat()
-                break
-        else:
-            # Si no existe chat, crear entrada
-            if chat_id:
-                new_chat = {
-                    'chat_id': chat_id,
-                    'title': title or "Chat sin titulo",
-                    'created_at': datetime.now().isoformat(),
-                    'updated_at': datetime.now().isoformat(),
-                    'message_count': 1 if increment_messages else 0
-                }
-                chats_data.append(new_chat)
-
-        self._save_chats_metadata(chats_data)
+        """Actualiza metadatos de un chat (si no existe, lo crea)."""
+        if not chat_id:
+            return
+        try:
+            chat_store.update(self.user_id, chat_id, title=title, increment_messages=increment_messages)
+        except Exception as e:
+            print(f"Error guardando metadatos de chats {e}")
 
     def delete_chat(self, chat_id):
         """Elimina un chat de los metadatos."""
         try:
-            # Eliminar metadatos del chat
-            chats_data = self.get_user_chats()
-            chats_data = [chat for chat in chats_data if chat["chat_id"] != chat_id]
-            self._save_chats_metadata(chats_data)
+            chat_store.delete(self.user_id, chat_id)
             return True
         except Exception as e:
             print(f"Error eliminando chat: {e}")
@@ -202,13 +250,9 @@ Si no contiene información relevante para recordar, responde con categoría "no
         
     def get_chat_info(self, chat_id):
         """Obtiene los metadatos de un chat especifico."""
-        chats = self.get_user_chats()
-        for chat in chats:
-            if chat['chat_id'] == chat_id:
-                return chat
-        return None
+        return chat_store.get(self.user_id, chat_id)
     
-    def _generate_chat_title(self, first_message):
+    def _generate_chat_title(self, first_message, raise_errors: bool = False):
         """Genera un titulo para el chat basado en el primer mensaje."""
         try:
             if not self.extraction_llm:
@@ -237,48 +281,149 @@ Título:""",
             return title if len(title) <= 50 else title[:47] + "..."
         
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error generando titulo: {e}")
             return first_message[:30] + "..." if len(first_message) > 30 else first_message
 
 
     # === MEMORIA VECTORIAL ===
 
+    def _memory_filter(self, **filters) -> Optional[Dict]:
+        """Cláusula `where` de las consultas, limitada al usuario en el backend compartido."""
+        return build_memory_filter(user_id=self.user_id if self.shared_backend else None, **filters)
+
     def save_vector_memory(self, text: str, metadata: Optional[Dict] = None):
-        """Guarda información en la memoria vectorial."""
+        """Encola una memoria para guardarla en la memoria vectorial.
+
+        Las memorias se escriben en lotes de MEMORY_WRITE_BATCH_SIZE (o antes de
+        cualquier lectura) con flush_vector_memories().
+        """
         if not self.collection:
             return ""
         
+        memory_id = str(uuid.uuid4())
+        doc_metadata = metadata or {}
+        doc_metadata.update({
+            "user_id": self.user_id,
+            "timestamp": datetime.now().isoformat(),
+            "created_ts": time.time(),  # numérico para poder filtrar por antigüedad
+            "memory_id": memory_id
+        })
+
+        with self._pending_lock:
+            self._pending_memories.append((memory_id, text, doc_metadata))
+            batch_full = len(self._pending_memories) >= MEMORY_WRITE_BATCH_SIZE
+        if batch_full:
+            self.flush_vector_memories()
+
+        return memory_id
+
+    def flush_vector_memories(self, raise_errors: bool = False) -> Dict[str, int]:
+        """Escribe las memorias pendientes suprimiendo duplicados semánticos.
+
+        Calcula los embeddings del lote en una sola llamada. Si una memoria se
+        parece (coseno >= MEMORY_DEDUP_THRESHOLD) a otra del lote o de la
+        colección, no se añade: se fusiona con la existente conservando la
+        importancia más alta. Con `raise_errors` un fallo de escritura se
+        propaga (la cola en segundo plano reintenta la tarea).
+        """
+        with self._flush_lock:
+            return self._flush_pending(raise_errors)
+
+    def _flush_pending(self, raise_errors: bool) -> Dict[str, int]:
+        with self._pending_lock:
+            batch, self._pending_memories = self._pending_memories, []
+        result = {"added": 0, "merged": 0, "skipped": 0}
+        if not batch or not self.collection:
+            return result
+
         try:
-            memory_id = str(uuid.uuid4())
-            doc_metadata = metadata or {}
-            doc_metadata.update({
-                "user_id": self.user_id,
-                "timestamp": datetime.now().isoformat(),
-                "memory_id": memory_id
-            })
+            ids, texts, metadatas = (list(column) for column in zip(*batch))
+            vectors = np.asarray(self.embedding_function(texts), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+
+            # 1. Duplicados dentro del propio lote: gana la de mayor importancia
+            kept = []
+            for i in sorted(range(len(ids)), key=lambda i: -metadatas[i].get("importance", 0)):
+                if kept and float(np.max(vectors[kept] @ vectors[i])) >= MEMORY_DEDUP_THRESHOLD:
+                    result["skipped"] += 1
+                    continue
+                kept.append(i)
+
+            # 2. Duplicados frente a lo que ya hay en la colección
+            new_indices, updates = kept, {}
+            if self.collection.count() > 0:
+                neighbours = self.collection.query(
+                    query_embeddings=vectors[kept].tolist(),
+                    n_results=1,
+                    where=self._memory_filter(),
+                    include=["embeddings", "metadatas"]
+                )
+                new_indices = []
+                for position, i in enumerate(kept):
+                    if not neighbours["ids"][position]:
+                        new_indices.append(i)
+                        continue
+                    existing_vector = np.asarray(neighbours["embeddings"][position][0], dtype=np.float32)
+                    similarity = float(existing_vector @ vectors[i] / (np.linalg.norm(existing_vector) + 1e-12))
+                    if similarity < MEMORY_DEDUP_THRESHOLD:
+                        new_indices.append(i)
+                        continue
+
+                    existing_id = neighbours["ids"][position][0]
+                    existing_meta = updates.get(existing_id) or dict(neighbours["metadatas"][position][0] or {})
+                    existing_meta["importance"] = max(existing_meta.get("importance", 0), metadatas[i].get("importance", 0))
+                    existing_meta["mentions"] = existing_meta.get("mentions", 1) + 1
+                    existing_meta["last_seen"] = metadatas[i]["timestamp"]
+                    updates[existing_id] = existing_meta
+
+            if new_indices:
+                self.collection.add(
+                    ids=[ids[i] for i in new_indices],
+                    documents=[texts[i] for i in new_indices],
+                    embeddings=vectors[new_indices].tolist(),
+                    metadatas=[metadatas[i] for i in new_indices]
+                )
+            if updates:
+                self.collection.update(ids=list(updates), metadatas=list(updates.values()))
 
-            self.collection.add(
-                documents=[text],
-                ids=[memory_id],
-                metadatas=[doc_metadata]
-            )
+            result["added"] = len(new_indices)
+            result["merged"] = len(kept) - len(new_indices)
+            for key, value in result.items():
+                self.memory_write_stats[key] += value
+            return result
 
-            return memory_id
-        
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error guardando memoria vectorial {e}")
-            return ''
+            return result
         
     
-    def search_vector_memory(self, query: str, k: int = MAX_VECTOR_RESULTS):
-        """Busca información relevante en la memoria vectorial."""
+    def search_vector_memory(self, query: str, k: int = MAX_VECTOR_RESULTS, categories: Optional[List[str]] = None,
+                             min_importance: Optional[int] = None, max_age_days: Optional[float] = None):
+        """Busca información relevante en la memoria vectorial.
+
+        En modo "weighted" (MEMORY_RETRIEVAL_MODE) prefiltra por metadatos y
+        ordena por similitud, importancia y recencia.
+        """
         if not self.collection:
             return []
         
+        self.flush_vector_memories()
         try:
+            if MEMORY_RETRIEVAL_MODE == "weighted":
+                query_embedding = self.embedding_function.embed_query([query])[0]
+                where = self._memory_filter(categories=categories, min_importance=min_importance,
+                                            max_age_days=max_age_days)
+                documents, _, _ = weighted_memory_query(self.collection, query_embedding, k, where)
+                return documents
+
             results = self.collection.query(
                 query_texts=[query],
-                n_results=k
+                n_results=k,
+                where=self._memory_filter()
             )
             return results['documents'][0] if results['documents'] else []
         
@@ -292,8 +437,9 @@ Título:""",
         if not self.collection:
             return []
         
+        self.flush_vector_memories()
         try:
-            results = self.collection.get()
+            results = self.collection.get(where=self._memory_filter())
             memories = []
 
             if results['documents']:
@@ -313,8 +459,12 @@ Título:""",
         
     # === EXTRACCIÓN INTELIGENTE ===
 
-    def extract_and_store_memories(self, user_message: str):
-        """Extrae y almacena memorias usando LLM"""
+    def extract_and_store_memories(self, user_message: str, raise_errors: bool = False):
+        """Extrae y almacena memorias usando LLM. Devuelve el texto guardado ("" si ninguno).
+
+        Con `raise_errors` un fallo del LLM se propaga en vez de usar la extracción
+        manual, para que la cola en segundo plano pueda reintentarlo.
+        """
         if not self.extraction_chain:
             return self._extract_memories_manual(user_message)
         
@@ -332,14 +482,16 @@ Título:""",
                         'original_message': user_message[:200]
                     }
                 )
-                return bool(memory_id)
-            return False
+                return extracted_memory.content if memory_id else ""
+            return ""
         
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error en extraccion automatica: {e}")
             return self._extract_memories_manual(user_message)
 
-    def _extract_memories_manual(self, user_message: str) -> bool:
+    def _extract_memories_manual(self, user_message: str) -> str:
         """Método manual de extracción (fallback)"""
         message_lower = user_message.lower()
         
@@ -352,38 +504,29 @@ Título:""",
         
         for phrases, category, memory_text in memory_rules:
             if any(phrase in message_lower for phrase in phrases):
-                memory_id = self.save_vector_memory(memory_text, {'category': category})
-                return bool(memory_id)
+                memory_id = self.save_vector_memory(memory_text, {'category': category, 'importance': 2})
+                return memory_text if memory_id else ""
         
-        return False
+        return ""
     
     # === CERRAR CONEXIONES BORRAR USUARIO ===
     def close_connections(self):
         """Cierra explícitamente TODO para liberar archivos en Windows."""
         try:
-            # 1. Cerrar VECTORSTORE (LangChain wrapper)
-            if hasattr(self, 'vectorstore') and self.vectorstore:
-                # LangChain Chroma no permite modificar _collection, solo limpiamos la referencia
-                self.vectorstore = None
+            # 0. Escribir las memorias que queden en el buffer
+            if getattr(self, 'collection', None):
+                self.flush_vector_memories()
             
-            # 2. Cerrar COLLECTION (ChromaDB nativo)
+            # 1. Cerrar COLLECTION (ChromaDB nativo)
             if hasattr(self, 'collection') and self.collection:
                 self.collection = None
             
-            # 3. Cerrar CLIENT (ChromaDB PersistentClient) - MUY IMPORTANTE
+            # 2. Soltar el CLIENT compartido: se detiene al liberar la última referencia
             if hasattr(self, 'client') and self.client:
-                try:
-                    # ChromaDB 0.4.x+ tiene _system.stop()
-                    if hasattr(self.client, '_system'):
-                        if hasattr(self.client._system, 'stop'):
-                            self.client._system.stop()
-                except Exception as e:
-                    # Silenciar errores de cierre (ya no importan)
-                    pass
-                finally:
-                    self.client = None
+                self.client = None
+                chroma_clients.release(self.chromadb_path)
             
-            # 4. Limpiar embeddings y extraction chain
+            # 3. Limpiar embeddings y extraction chain
             if hasattr(self, 'embeddings'):
                 self.embeddings = None
             if hasattr(self, 'extraction_chain'):
@@ -393,7 +536,7 @@ Título:""",
             if hasattr(self, 'memory_parser'):
                 self.memory_parser = None
             
-            # 5. Forzar limpieza AGRESIVA
+            # 4. Forzar limpieza AGRESIVA
             gc.collect()
             time.sleep(0.2)
             gc.collect()
@@ -403,7 +546,6 @@ Título:""",
         except Exception as e:
             print(f"⚠️ Error en close_connections: {e}")
             # Aunque haya error, intentar limpiar referencias
-            self.vectorstore = None
             self.collection = None
             self.client = None
             gc.collect()
@@ -414,6 +556,9 @@ class UserManager:
     @staticmethod
     def get_users():
         """Obtiene un listado de usuarios existentes."""
+        if MEMORY_BACKEND == "shared":
+            return chat_store.list_users()
+
         if not os.path.exists(USERS_DIR):
             return []
         
@@ -428,6 +573,9 @@ class UserManager:
     @staticmethod
     def user_exists(user_id):
         """Verifica si un usuario existe."""
+        if MEMORY_BACKEND == "shared":
+            return chat_store.has_user(user_id)
+
         user_path = os.path.join(USERS_DIR, user_id)
         return os.path.exists(user_path)
     
@@ -435,6 +583,10 @@ class UserManager:
     def create_user(user_id):
         """Crea un nuevo usuario"""
         try:
+            if MEMORY_BACKEND == "shared":
+                chat_store.add_user(user_id)
+                return True
+
             user_path = os.path.join(USERS_DIR, user_id)
             os.makedirs(user_path, exist_ok=True)
             return True
@@ -444,11 +596,46 @@ class UserManager:
             return False
 
    
+    @staticmethod
+    def _delete_shared_user(user_id):
+        """Borra un usuario del backend compartido: solo filas, sin tocar ficheros."""
+        chats, _ = chat_store.list(user_id)
+
+        # Checkpoints de sus chats (mismo thread_id que usa ModernChatbot)
+        checkpointer = checkpoint_pool.acquire(SHARED_CHECKPOINTS_DB_PATH)
+        try:
+            for chat in chats:
+                checkpointer.delete_thread(f"user_{user_id}_chat_{chat['chat_id']}")
+        finally:
+            checkpoint_pool.release(SHARED_CHECKPOINTS_DB_PATH)
+
+        # Memorias vectoriales
+        client = chroma_clients.acquire(SHARED_CHROMADB_PATH)
+        try:
+            collection = open_memory_collection(client, SHARED_MEMORY_COLLECTION, get_memory_embedding_function())
+            collection.delete(where={"user_id": user_id})
+        finally:
+            chroma_clients.release(SHARED_CHROMADB_PATH)
+
+        chat_store.delete_user(user_id)
+        print(f"✅ Usuario {user_id} eliminado ({len(chats)} chats)")
+        return True
+
     @staticmethod
     def delete_user_completely(user_id):
+        if MEMORY_BACKEND == "shared":
+            try:
+                return UserManager._delete_shared_user(user_id)
+            except Exception as e:
+                print(f"❌ Error eliminando usuario {user_id}: {e}")
+                return False
+
         from config import USERS_DIR
         user_path = os.path.join(USERS_DIR, user_id)
         
+        # Los metadatos de chats viven en la base de datos compartida
+        chat_store.delete_user(user_id)
+        
         if not os.path.exists(user_path):
             return True
 
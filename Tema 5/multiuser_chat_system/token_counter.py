@@ -0,0 +1,111 @@
+"""
+Contador de tokens local (tiktoken) con caché por mensaje para trim_messages
+"""
+import threading
+from typing import Dict, Sequence
+
+import tiktoken
+from langchain_core.messages import BaseMessage
+
+from config import DEFAULT_MODEL, TOKEN_CACHE_MAX_ENTRIES
+
+# Mismo cálculo aproximado que usa OpenAI para los mensajes de chat:
+# cada mensaje añade unos tokens fijos por el rol y los separadores
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+TOKENS_REPLY_PRIMING = 3
+
+
+def _message_text(message: BaseMessage) -> str:
+    """Texto de un mensaje, incluyendo contenido multimodal y llamadas a herramientas."""
+    content = message.content
+    if isinstance(content, list):
+        content = "".join(
+            part if isinstance(part, str) else str(part.get("text", ""))
+            for part in content
+        )
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        content += "".join(f"{call['name']}{call['args']}" for call in tool_calls)
+    return content
+
+
+class CachedTokenCounter:
+    """Cuenta tokens con tiktoken y recuerda el resultado de cada mensaje.
+
+    Los mensajes del historial tienen un ID estable (lo asigna add_messages),
+    así que en cada turno solo se tokenizan los mensajes nuevos. La clave
+    incluye la longitud del contenido por si un mensaje se reemplaza con el
+    mismo ID. Se usa directamente como `token_counter` de trim_messages.
+    Los mensajes sin ID se cuentan siempre (no se cachean).
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL, max_entries: int = TOKEN_CACHE_MAX_ENTRIES, encoding=None):
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+        self.encoding = encoding
+        self.max_entries = max_entries
+        self._cache: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _cache_key(message: BaseMessage):
+        if not message.id:
+            return None
+        content = message.content
+        size = len(content) if isinstance(content, str) else len(_message_text(message))
+        return (message.id, size)
+
+    def _tokenize(self, message: BaseMessage) -> int:
+        tokens = TOKENS_PER_MESSAGE + len(self.encoding.encode(_message_text(message), disallowed_special=()))
+        if getattr(message, "name", None):
+            tokens += TOKENS_PER_NAME
+        return tokens
+
+    def count_message(self, message: BaseMessage) -> int:
+        return self([message]) - TOKENS_REPLY_PRIMING
+
+    def __call__(self, messages: Sequence[BaseMessage]) -> int:
+        total = TOKENS_REPLY_PRIMING
+        pending = []
+
+        # Una sola pasada con el lock: los mensajes ya vistos son una consulta al dict
+        with self._lock:
+            cache = self._cache
+            for message in messages:
+                key = self._cache_key(message)
+                cached = cache.get(key) if key is not None else None
+                if cached is None:
+                    pending.append((key, message))
+                else:
+                    total += cached
+            self.hits += len(messages) - len(pending)
+
+        # Tokenizar fuera del lock solo los mensajes nuevos
+        counted = [(key, self._tokenize(message)) for key, message in pending]
+        total += sum(tokens for _, tokens in counted)
+
+        with self._lock:
+            self.misses += len(counted)
+            for key, tokens in counted:
+                if key is not None:
+                    self._cache[key] = tokens
+            # Expulsión FIFO: los mensajes más antiguos son los primeros en salir del contexto
+            while len(self._cache) > self.max_entries:
+                self._cache.pop(next(iter(self._cache)))
+        return total
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": len(self._cache)
+            }
@@ -0,0 +1,57 @@
+"""
+Limpieza offline de los checkpoints de LangGraph de cada usuario.
+
+Conserva solo los últimos checkpoints de cada thread y ejecuta VACUUM para
+devolver el espacio al sistema. Ejecutar con la aplicación de Streamlit parada.
+
+Uso:
+    python vacuum_checkpoints.py                 # todos los usuarios
+    python vacuum_checkpoints.py --user ana      # un único usuario
+    python vacuum_checkpoints.py --keep 1
+
+Con MEMORY_BACKEND="shared" todos los usuarios comparten una base de datos y
+se compacta entera (--user no aplica).
+"""
+import argparse
+import os
+
+from checkpoint_store import create_checkpoint_connection, vacuum_checkpoints
+from config import USERS_DIR, CHECKPOINTS_KEEP_PER_THREAD, MEMORY_BACKEND, SHARED_CHECKPOINTS_DB_PATH
+
+
+def database_size(db_path: str) -> int:
+    """Tamaño del fichero más su WAL, en bytes."""
+    return sum(os.path.getsize(path) for path in (db_path, db_path + "-wal") if os.path.exists(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compacta los checkpoints de LangGraph por thread")
+    parser.add_argument("--user", help="Solo este usuario (por defecto, todos)")
+    parser.add_argument("--keep", type=int, default=CHECKPOINTS_KEEP_PER_THREAD,
+                        help="Checkpoints a conservar por thread")
+    args = parser.parse_args()
+
+    if MEMORY_BACKEND == "shared":
+        databases = [("todos los usuarios", SHARED_CHECKPOINTS_DB_PATH)]
+    else:
+        users = [args.user] if args.user else sorted(os.listdir(USERS_DIR))
+        databases = [(user_id, os.path.join(USERS_DIR, user_id, "langgraph_memory.db")) for user_id in users]
+
+    for user_id, db_path in databases:
+        if not os.path.exists(db_path):
+            continue
+
+        before = database_size(db_path)
+        conn = create_checkpoint_connection(db_path)
+        try:
+            result = vacuum_checkpoints(conn, args.keep)
+        finally:
+            conn.close()
+        after = database_size(db_path)
+
+        print(f"🧹 {user_id}: {result['threads']} threads, {result['deleted_checkpoints']} checkpoints borrados, "
+              f"{before / 1024:.0f} KB → {after / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
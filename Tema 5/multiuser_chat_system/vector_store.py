@@ -0,0 +1,146 @@
+"""
+Cliente de Chroma y función de embeddings compartidos por todos los usuarios
+"""
+import threading
+from typing import Dict
+
+import chromadb
+import numpy as np
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import register_embedding_function
+
+from config import MEMORY_EMBEDDING_MODEL
+
+from embedding_cache import get_cached_embeddings
+
+
+@register_embedding_function
+class CachedOpenAIEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Función de embeddings de Chroma sobre los OpenAIEmbeddings cacheados del curso.
+
+    Se usa tanto para escribir como para consultar, así todos los vectores de
+    la memoria vienen del mismo modelo.
+    """
+
+    def __init__(self, model: str = MEMORY_EMBEDDING_MODEL):
+        self.model = model
+        self.embeddings = get_cached_embeddings(model)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return [np.asarray(vector, dtype=np.float32) for vector in self.embeddings.embed_documents(list(input))]
+
+    def embed_query(self, input: Documents) -> Embeddings:
+        return [np.asarray(self.embeddings.embed_query(text), dtype=np.float32) for text in input]
+
+    @staticmethod
+    def name() -> str:
+        return "cached_openai"
+
+    def get_config(self) -> Dict:
+        return {"model": self.model}
+
+    @staticmethod
+    def build_from_config(config: Dict) -> "CachedOpenAIEmbeddingFunction":
+        return CachedOpenAIEmbeddingFunction(config.get("model", MEMORY_EMBEDDING_MODEL))
+
+
+_embedding_function = None
+_embedding_lock = threading.Lock()
+
+
+def get_memory_embedding_function() -> CachedOpenAIEmbeddingFunction:
+    """Única función de embeddings del proceso."""
+    global _embedding_function
+    with _embedding_lock:
+        if _embedding_function is None:
+            _embedding_function = CachedOpenAIEmbeddingFunction()
+        return _embedding_function
+
+
+class ChromaClientRegistry:
+    """Un único PersistentClient por directorio para todo el proceso.
+
+    Todos los gestores de memoria que usan el mismo directorio comparten el
+    cliente; al soltar la última referencia se detiene para liberar los ficheros.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, chromadb.ClientAPI] = {}
+        self._refs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, path: str):
+        with self._lock:
+            if path not in self._clients:
+                self._clients[path] = chromadb.PersistentClient(path=path)
+                self._refs[path] = 0
+            self._refs[path] += 1
+            return self._clients[path]
+
+    def release(self, path: str):
+        with self._lock:
+            if path not in self._refs:
+                return
+            self._refs[path] -= 1
+            if self._refs[path] > 0:
+                return
+            client = self._clients.pop(path)
+            del self._refs[path]
+        try:
+            # close() detiene el sistema y lo saca de la caché de Chroma, así un
+            # acquire posterior del mismo directorio abre uno nuevo
+            if hasattr(client, 'close'):
+                client.close()
+            elif hasattr(client, '_system') and hasattr(client._system, 'stop'):
+                client._system.stop()
+        except Exception:
+            # Silenciar errores de cierre (ya no importan)
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"clients": len(self._clients), "references": sum(self._refs.values())}
+
+
+def _collection_names(client) -> set:
+    return {c if isinstance(c, str) else c.name for c in client.list_collections()}
+
+
+def open_memory_collection(client, name: str, embedding_function: EmbeddingFunction):
+    """Abre (o crea) una colección de memorias con la función de embeddings indicada.
+
+    Las colecciones creadas por versiones anteriores usaban el modelo local por
+    defecto de Chroma; se migran una vez re-embebiendo sus documentos en una
+    colección temporal. La original solo se borra cuando la copia está completa,
+    así un fallo al embeber (sin API key, red, límites) no pierde memorias.
+    """
+    temp_name = f"{name}_migracion"
+    names = _collection_names(client)
+    # Una migración anterior se cortó entre el borrado y el renombrado: terminarla
+    if temp_name in names and name not in names:
+        client.get_collection(temp_name, embedding_function=embedding_function).modify(name=name)
+
+    try:
+        return client.get_or_create_collection(name, embedding_function=embedding_function)
+    except ValueError:
+        old = client.get_collection(name)
+        data = old.get(include=["documents", "metadatas"])
+
+        if temp_name in names:
+            client.delete_collection(temp_name)  # copia incompleta de un intento fallido
+        migrated = client.create_collection(temp_name, embedding_function=embedding_function)
+        try:
+            if data["ids"]:
+                migrated.add(ids=data["ids"], documents=data["documents"], metadatas=data["metadatas"])
+        except Exception:
+            client.delete_collection(temp_name)
+            raise
+
+        client.delete_collection(name)
+        migrated.modify(name=name)
+        print(f"📦 Colección {name} migrada a {embedding_function.name()} ({len(data['ids'])} memorias)")
+        return migrated
+
+
+# Registro compartido de clientes de Chroma
+chroma_clients = ChromaClientRegistry()
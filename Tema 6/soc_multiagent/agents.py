@@ -1,6 +1,6 @@
 from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
-from tools import search_tool, virustotal_checker, gmail_tools, threat_intel_lookup
+from tools import search_tool, virustotal_checker, gmail_tools, threat_intel_lookup, batch_ioc_reputation
 from config import config
 
 # Inicializar LLM
@@ -13,18 +13,20 @@ llm = ChatOpenAI(
 # Agente 1: Analisis de Alertas 
 alert_analyzer = create_react_agent(
     model=llm,
-    tools=[search_tool, virustotal_checker, threat_intel_lookup],
+    tools=[search_tool, virustotal_checker, threat_intel_lookup, batch_ioc_reputation],
     prompt="""Eres un analista de seguridad SOC especializado en análisis inicial de alertas.
     
     HERRAMIENTAS DISPONIBLES:
     - tavily_search_results_json: Búsqueda web en tiempo real para contexto de amenazas
     - virustotal_checker: Análisis de IOCs (IPs, URLs, hashes) usando VirusTotal API REAL
     - threat_intel_lookup: Consulta multifuente (AbuseIPDB, Reputación de Dominio y OSINT).
+    - batch_ioc_reputation: Analiza en paralelo una lista de IOCs con VirusTotal + threat intel (con caché)
     
     PROCESO DE ANÁLISIS OBLIGATORIO:
     1. Extraer TODOS los IOCs (IPs, URLs, hashes, dominios) de la alerta
-    2. ANALIZAR CADA IOC usando 'threat_intel_lookup' (especialmente para IPs y dominios).
-    3. REFORZAR con 'virustotal_checker' para obtener detecciones de motores de antivirus.
+    2. Si hay varios IOCs, ANALIZARLOS TODOS A LA VEZ con 'batch_ioc_reputation'; si solo hay uno,
+       usar 'threat_intel_lookup' (especialmente para IPs y dominios).
+    3. REFORZAR con 'virustotal_checker' para obtener detecciones de motores de antivirus (si no se usó el lote).
     4. Usar 'tavily_search_results_json' si los IOCs son nuevos o desconocidos.
     5. Determinar: VERDADERO POSITIVO o FALSO POSITIVO con evidencia cruzada de ambas APIs.
     
@@ -0,0 +1,88 @@
+"""Compara el modo supervisor con el pipeline determinista alerta por alerta.
+
+Procesa las mismas alertas de ejemplo con ambos modos y muestra los tokens
+consumidos (entrada/salida) y la latencia de cada una. Usa los agentes reales,
+así que necesita las claves de OpenAI y de las APIs de threat intel en el .env.
+
+Uso (desde esta carpeta):
+    python benchmark_pipeline.py --repeat 2
+"""
+import argparse
+import statistics
+
+from config import config
+from supervisor import process_security_alert
+
+SAMPLE_ALERTS = [
+    {
+        "source": "benchmark",
+        "alert_type": "Malware Detection",
+        "severity": "High",
+        "message": "Ejecutable sospechoso descargado desde un dominio recién registrado",
+        "source_ip": "185.220.101.45",
+        "file_hash": "44d88612fea8a8f36de82e1278abb02f",
+        "url": "http://malware-download.example/payload.exe"
+    },
+    {
+        "source": "benchmark",
+        "alert_type": "Port Scan",
+        "severity": "Low",
+        "message": "Escaneo de puertos desde un servidor interno de monitorización",
+        "source_ip": "8.8.8.8"
+    },
+]
+
+
+def run_mode(mode: str, alert: dict, run_id: str) -> dict:
+    context = {"pipeline_mode": mode, "email_recipient": config.SOC_EMAIL_RECIPIENT}
+    result = process_security_alert(dict(alert), f"BENCH-{mode}-{run_id}", context)
+    usage = result.get("token_usage", {})
+    return {
+        "status": result["status"],
+        "verdict": result.get("verdict"),
+        "seconds": result.get("processing_seconds", 0.0),
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "total_tokens": usage.get("total_tokens", 0)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark supervisor vs pipeline determinista")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones por alerta y modo")
+    args = parser.parse_args()
+
+    results = {"supervisor": [], "pipeline": []}
+    for index, alert in enumerate(SAMPLE_ALERTS):
+        for attempt in range(args.repeat):
+            for mode in results:
+                measurement = run_mode(mode, alert, f"{index}-{attempt}")
+                results[mode].append(measurement)
+                print(f"  [{mode:<10}] alerta {index} #{attempt}: {measurement['status']} "
+                      f"({measurement['verdict']}) {measurement['seconds']:.1f}s, "
+                      f"{measurement['total_tokens']} tokens")
+
+    print("\n📊 RESULTADOS POR ALERTA (media)")
+    print("=" * 70)
+    print(f"{'Modo':<12}{'Latencia (s)':>14}{'Tokens entrada':>16}{'Tokens salida':>15}{'Total':>10}")
+    for mode, measurements in results.items():
+        ok = [m for m in measurements if m["status"] == "completed"] or measurements
+        print(f"{mode:<12}"
+              f"{statistics.mean(m['seconds'] for m in ok):>14.1f}"
+              f"{statistics.mean(m['input_tokens'] for m in ok):>16.0f}"
+              f"{statistics.mean(m['output_tokens'] for m in ok):>15.0f}"
+              f"{statistics.mean(m['total_tokens'] for m in ok):>10.0f}")
+
+    supervisor_tokens = statistics.mean(m["total_tokens"] for m in results["supervisor"])
+    pipeline_tokens = statistics.mean(m["total_tokens"] for m in results["pipeline"])
+    if supervisor_tokens:
+        print(f"\nAhorro de tokens del pipeline: {(1 - pipeline_tokens / supervisor_tokens) * 100:.1f}%")
+
+    verdicts_match = sum(
+        s["verdict"] == p["verdict"] for s, p in zip(results["supervisor"], results["pipeline"])
+    )
+    print(f"Veredictos coincidentes: {verdicts_match}/{len(results['pipeline'])}")
+
+
+if __name__ == "__main__":
+    main()
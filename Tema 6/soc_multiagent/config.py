@@ -24,6 +24,32 @@ class Config:
     # Configuración del SOC
     WEBHOOK_PORT = 8000
     DASHBOARD_PORT = 8501
+    
+    # Cola de ingesta de alertas (procesamiento en segundo plano)
+    ALERT_WORKERS = int(os.getenv("SOC_ALERT_WORKERS", 4))
+    ALERT_QUEUE_MAXSIZE = int(os.getenv("SOC_ALERT_QUEUE_MAXSIZE", 100))
+    
+    # Modo de orquestación: "supervisor" (LLM supervisor) o "pipeline" (StateGraph determinista)
+    PIPELINE_MODES = ("supervisor", "pipeline")
+    SOC_PIPELINE_MODE = os.getenv("SOC_PIPELINE_MODE", "supervisor")
+    
+    # Base de datos de incidentes
+    INCIDENTS_DB_PATH = os.getenv("SOC_INCIDENTS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "incidents.db"))
+    
+    # Caché de reputación de IOCs (TTL en segundos por fuente)
+    IOC_CACHE_PATH = os.getenv("SOC_IOC_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ioc_cache.sqlite"))
+    IOC_CACHE_TTL = {
+        "virustotal": 24 * 3600,
+        "abuseipdb": 6 * 3600
+    }
+    IOC_CACHE_DEFAULT_TTL = 3600
+    
+    # Límites de peticiones por proveedor: (peticiones, segundos)
+    IOC_RATE_LIMITS = {
+        "virustotal": (4, 60),       # Tier gratuito: 4 requests/min
+        "abuseipdb": (60, 60)
+    }
+    IOC_BATCH_WORKERS = 8
 
     # Validación de configuración crítica
     @classmethod
@@ -39,6 +65,11 @@ class Config:
         if missing_keys:
             raise ValueError(f"Faltan las siguientes variables de entorno: {', '.join(missing_keys)}")
         
+        if cls.SOC_PIPELINE_MODE not in cls.PIPELINE_MODES:
+            raise ValueError(
+                f"SOC_PIPELINE_MODE no válido: '{cls.SOC_PIPELINE_MODE}' (usa {' o '.join(cls.PIPELINE_MODES)})"
+            )
+        
         return True
     
 config = Config()
\ No newline at end of file
@@ -1,7 +1,9 @@
 import streamlit as st
 import requests
-import time
 from datetime import datetime, timedelta
+from incident_events import IncidentEventListener
+
+SERVER_URL = "http://localhost:8000"
 
 st.set_page_config(
     page_title="SOC Multi-Agent Dashboard",
@@ -16,30 +18,36 @@ if 'last_refresh' not in st.session_state:
     st.session_state.last_refresh = datetime.now()
 if 'auto_refresh' not in st.session_state:
     st.session_state.auto_refresh = True
+if 'events_version' not in st.session_state:
+    st.session_state.events_version = 0
+
+@st.cache_resource
+def get_event_listener():
+    """Caché local de incidentes compartida, actualizada por eventos SSE del servidor."""
+    listener = IncidentEventListener(SERVER_URL)
+    listener.start()
+    return listener
+
+event_listener = get_event_listener()
 
 # Funciones auxiliares
 def get_server_status():
     try:
-        response = requests.get("http://localhost:8000/health", timeout=5)
+        response = requests.get(f"{SERVER_URL}/health", timeout=5)
         return response.status_code == 200, response.json() if response.status_code == 200 else None
     except:
         return False, None
 
 def get_incidents():
-    try:
-        response = requests.get("http://localhost:8000/incidents", timeout=10)
-        if response.status_code == 200:
-            return response.json().get("incidents", [])
-    except:
-        pass
-    return []
+    """Incidentes de la caché local (sin peticiones al servidor) y contadores por estado."""
+    incidents = event_listener.snapshot()
+    status_counts = {}
+    for incident in incidents:
+        status_counts[incident.get('status')] = status_counts.get(incident.get('status'), 0) + 1
+    return incidents, len(incidents), status_counts
 
 def check_alert_status(incident_id):
-    incidents = get_incidents()
-    for incident in incidents:
-        if incident.get('incident_id') == incident_id:
-            return incident
-    return None
+    return event_listener.get(incident_id)
 
 def format_timestamp(ts_string):
     try:
@@ -69,8 +77,8 @@ st.markdown("---")
 st.subheader("🌐 Estado del Sistema")
 
 server_online, health_data = get_server_status()
-incidents = get_incidents()
-processing_count = len([i for i in incidents if i.get('status') == 'processing'])
+incidents, total_incidents, status_counts = get_incidents()
+processing_count = status_counts.get('pending', 0) + status_counts.get('running', 0)
 
 col1, col2, col3, col4, col5 = st.columns(5)
 
@@ -81,17 +89,17 @@ with col1:
         st.metric("🖥️ Servidor", "OFFLINE", delta="❌", delta_color="inverse")
 
 with col2:
-    st.metric("📊 Total Incidentes", f"{len(incidents)}", delta=f"+{len([i for i in incidents if (datetime.now() - datetime.fromisoformat(i.get('timestamp', '2000-01-01T00:00:00'))).seconds < 3600])}")
+    st.metric("📊 Total Incidentes", f"{total_incidents}", delta=f"+{len([i for i in incidents if (datetime.now() - datetime.fromisoformat(i.get('timestamp', '2000-01-01T00:00:00'))).seconds < 3600])}")
 
 with col3:
-    completed = len([i for i in incidents if i.get('status') == 'completed'])
-    st.metric("✅ Completados", f"{completed}", delta=f"{completed}/{len(incidents) if incidents else 0}")
+    completed = status_counts.get('completed', 0)
+    st.metric("✅ Completados", f"{completed}", delta=f"{completed}/{total_incidents}")
 
 with col4:
     st.metric("⚙️ Procesando", f"{processing_count}", delta="🔄" if processing_count > 0 else "")
 
 with col5:
-    errors = len([i for i in incidents if i.get('status') == 'error'])
+    errors = status_counts.get('error', 0)
     st.metric("❌ Errores", f"{errors}", delta="⚠️" if errors > 0 else "")
 
 if health_data:
@@ -106,6 +114,7 @@ if health_data:
             st.write("**Estadísticas:**")
             st.write(f"- Incidentes procesados: {health_data.get('total_incidents_processed', 0)}")
             st.write(f"- Estado general: {health_data.get('status', 'unknown').upper()}")
+            st.write(f"- Eventos en tiempo real: {'🟢 Conectado' if event_listener.connected else '🔴 Desconectado'}")
 
 st.markdown("---")
 
@@ -174,12 +183,12 @@ with st.form("alert_form", clear_on_submit=True):
             with st.spinner("🚀 Enviando alerta al sistema de análisis..."):
                 try:
                     response = requests.post(
-                        "http://localhost:8000/webhook/alert",
+                        f"{SERVER_URL}/webhook/alert",
                         json=alert_payload,
                         timeout=15
                     )
                     
-                    if response.status_code == 200:
+                    if response.status_code in (200, 202):
                         result = response.json()
                         incident_id = result['incident_id']
                         
@@ -207,6 +216,8 @@ with st.form("alert_form", clear_on_submit=True):
                         
                         st.info("🔄 **El análisis está en progreso.** Los resultados aparecerán automáticamente en el panel inferior en 45-90 segundos.")
                         
+                    elif response.status_code == 429:
+                        st.warning("🚦 **Cola de análisis llena.** Espera unos segundos y vuelve a enviar la alerta.")
                     else:
                         st.error(f"❌ Error del servidor: {response.text}")
                         
@@ -310,7 +321,7 @@ st.subheader("📈 Historial de Incidentes")
 # Filtros
 col1, col2, col3, col4 = st.columns(4)
 with col1:
-    status_filter = st.selectbox("Estado", ["Todos", "completed", "error", "processing"])
+    status_filter = st.selectbox("Estado", ["Todos", "completed", "error", "running", "pending"])
 with col2:
     time_filter = st.selectbox("Período", ["Última hora", "Últimas 24h", "Última semana", "Todo"])
 with col3:
@@ -416,15 +427,25 @@ if filtered_incidents:
             col1, col2 = st.columns([1, 3])
             with col1:
                 if st.button("📋 Ver JSON Completo", key=f"json_{incident_id}"):
+                    # La conversación completa solo se descarga al pedirla
                     st.json(incident)
+                    conversation = requests.get(f"{SERVER_URL}/incidents/{incident_id}/conversation", timeout=10)
+                    if conversation.status_code == 200:
+                        st.json(conversation.json().get("messages", []))
 
 else:
     st.info("📭 No hay incidentes que coincidan con los filtros seleccionados")
 
-# Auto-refresh
-if st.session_state.auto_refresh and server_online:
-    time.sleep(5)
-    st.rerun()
+# Auto-refresh: un fragmento ligero vigila la caché local y solo relanza la
+# página cuando llega algún evento nuevo del servidor
+@st.fragment(run_every=0.5 if st.session_state.auto_refresh else None)
+def watch_incident_events():
+    if event_listener.version != st.session_state.events_version:
+        st.session_state.events_version = event_listener.version
+        st.session_state.last_refresh = datetime.now()
+        st.rerun()
+
+watch_incident_events()
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+import requests
+
+
+class IncidentEventBroker:
+    """Difunde los eventos del ciclo de vida de los incidentes a los suscriptores SSE.
+
+    Vive en el event loop del servidor: cada suscriptor tiene su propia cola
+    acotada; si un cliente lento la llena se le desconecta y, al reconectar,
+    se resincroniza con /incidents?since=.
+    """
+
+    def __init__(self, max_pending: int = 1000):
+        self.max_pending = max_pending
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.sequence = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event_type: str, incident: dict):
+        """Publica un evento (created, running, completed, error)."""
+        self.sequence += 1
+        event = {"id": self.sequence, "type": event_type, "incident": incident}
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Cliente demasiado lento: se le corta y tendrá que resincronizar
+                self.subscribers.discard(queue)
+
+    def is_subscribed(self, queue: asyncio.Queue) -> bool:
+        return queue in self.subscribers
+
+    @staticmethod
+    def format_sse(event: dict) -> str:
+        data = json.dumps(event["incident"], ensure_ascii=False, default=str)
+        return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+class IncidentEventListener:
+    """Caché local de incidentes para el dashboard, alimentada por SSE.
+
+    Al conectar descarga solo los cambios desde la última actualización vista
+    (la primera vez, todo el historial paginado) y después aplica cada evento
+    como un delta sobre el diccionario local.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.incidents: Dict[str, dict] = {}
+        self.version = 0
+        self.connected = False
+        self.last_update: Optional[str] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="incident-events")
+            self._thread.start()
+
+    def _apply(self, incident: dict):
+        incident_id = incident.get("incident_id")
+        if not incident_id:
+            return
+        with self._lock:
+            current = self.incidents.get(incident_id)
+            if current and current.get("updated_at", "") > incident.get("updated_at", ""):
+                return
+            self.incidents[incident_id] = {**(current or {}), **incident}
+            updated_at = incident.get("updated_at")
+            if updated_at and (self.last_update is None or updated_at > self.last_update):
+                self.last_update = updated_at
+            self.version += 1
+
+    def _sync(self):
+        """Descarga los incidentes modificados desde la última actualización conocida."""
+        cursor = None
+        since = self.last_update
+        while True:
+            params = {"limit": 500}
+            if since:
+                params["since"] = since
+            if cursor:
+                params["cursor"] = cursor
+            response = requests.get(f"{self.base_url}/incidents", params=params, timeout=10)
+            response.raise_for_status()
+            data = response.json()
+            for incident in data.get("incidents", []):
+                self._apply(incident)
+            cursor = data.get("next_cursor")
+            if not cursor:
+                break
+
+    def _run(self):
+        while True:
+            try:
+                with requests.get(f"{self.base_url}/events", stream=True, timeout=(5, 60)) as response:
+                    response.raise_for_status()
+                    # Ya suscritos: cualquier cambio posterior llegará por el stream
+                    self._sync()
+                    self.connected = True
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line and line.startswith("data:"):
+                            self._apply(json.loads(line[5:].strip()))
+            except Exception:
+                pass
+            self.connected = False
+            time.sleep(2)
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return list(self.incidents.values())
+
+    def get(self, incident_id: str) -> Optional[dict]:
+        with self._lock:
+            return self.incidents.get(incident_id)
@@ -0,0 +1,195 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, message_to_dict
+
+from config import config
+
+
+def _serialize_message(message) -> dict:
+    """Convierte un mensaje de LangChain (o dict) a algo serializable en JSON."""
+    if isinstance(message, BaseMessage):
+        return message_to_dict(message)
+    if isinstance(message, dict):
+        return message
+    return {"type": "unknown", "data": {"content": str(message)}}
+
+
+class IncidentStore:
+    """Repositorio de incidentes persistido en SQLite.
+
+    Los campos de consulta (estado, timestamp, última actualización) tienen su
+    propia columna indexada; el resto del registro va en un JSON. La conversación
+    completa de los agentes se guarda aparte y solo se carga bajo demanda.
+    """
+
+    def __init__(self, db_path: str = config.INCIDENTS_DB_PATH):
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS incidents (
+                incident_id TEXT PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                status TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_incidents_timestamp ON incidents(timestamp, incident_id);
+            CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents(status, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_incidents_updated_at ON incidents(updated_at);
+
+            CREATE TABLE IF NOT EXISTS incident_conversations (
+                incident_id TEXT PRIMARY KEY REFERENCES incidents(incident_id) ON DELETE CASCADE,
+                messages TEXT NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def _row_to_incident(row) -> dict:
+        incident_id, timestamp, status, updated_at, data = row
+        incident = json.loads(data)
+        incident.update({
+            "incident_id": incident_id,
+            "timestamp": timestamp,
+            "status": status,
+            "updated_at": updated_at
+        })
+        return incident
+
+    def create(self, incident: dict) -> dict:
+        """Inserta un incidente nuevo."""
+        now = datetime.now().isoformat()
+        data = {k: v for k, v in incident.items() if k not in ("incident_id", "timestamp", "status", "updated_at")}
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO incidents (incident_id, timestamp, status, updated_at, data) VALUES (?, ?, ?, ?, ?)",
+                (incident["incident_id"], incident.get("timestamp") or now, incident.get("status", "pending"), now,
+                 json.dumps(data, ensure_ascii=False, default=str))
+            )
+            self.conn.commit()
+        return {**incident, "updated_at": now}
+
+    def update(self, incident_id: str, fields: dict) -> Optional[dict]:
+        """Actualiza un incidente fusionando `fields`; `full_conversation` va a su propia tabla.
+
+        El `timestamp` (hora de la alerta) no se modifica: es la clave de orden de
+        la paginación y el resultado del procesamiento trae su propia hora.
+        """
+        fields = dict(fields)
+        fields.pop("timestamp", None)
+        conversation = fields.pop("full_conversation", None)
+        now = datetime.now().isoformat()
+
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT incident_id, timestamp, status, updated_at, data FROM incidents WHERE incident_id = ?",
+                (incident_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            incident = self._row_to_incident(row)
+            incident.update(fields)
+            status = incident.pop("status")
+            timestamp = incident.pop("timestamp")
+            incident.pop("incident_id")
+            incident.pop("updated_at")
+
+            self.conn.execute(
+                "UPDATE incidents SET status = ?, timestamp = ?, updated_at = ?, data = ? WHERE incident_id = ?",
+                (status, timestamp, now, json.dumps(incident, ensure_ascii=False, default=str), incident_id)
+            )
+            if conversation is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO incident_conversations (incident_id, messages) VALUES (?, ?)",
+                    (incident_id, json.dumps([_serialize_message(m) for m in conversation], ensure_ascii=False, default=str))
+                )
+            self.conn.commit()
+
+        return {**incident, "incident_id": incident_id, "timestamp": timestamp, "status": status, "updated_at": now}
+
+    def get(self, incident_id: str, include_conversation: bool = False) -> Optional[dict]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT incident_id, timestamp, status, updated_at, data FROM incidents WHERE incident_id = ?",
+                (incident_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        incident = self._row_to_incident(row)
+        if include_conversation:
+            incident["full_conversation"] = self.get_conversation(incident_id)
+        return incident
+
+    def get_conversation(self, incident_id: str) -> List[dict]:
+        """Carga (bajo demanda) la conversación completa de los agentes."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT messages FROM incident_conversations WHERE incident_id = ?", (incident_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def list(
+        self,
+        status: Optional[str] = None,
+        since: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Lista incidentes del más reciente al más antiguo con paginación por cursor.
+
+        - status: filtra por estado
+        - since: solo incidentes actualizados después de este ISO timestamp
+        - cursor: valor `next_cursor` de la página anterior
+        Devuelve (incidentes, next_cursor).
+        """
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if since:
+            clauses.append("updated_at > ?")
+            params.append(since)
+        if cursor:
+            cursor_ts, cursor_id = self.parse_cursor(cursor)
+            clauses.append("(timestamp, incident_id) < (?, ?)")
+            params.extend([cursor_ts, cursor_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (
+            f"SELECT incident_id, timestamp, status, updated_at, data FROM incidents {where} "
+            "ORDER BY timestamp DESC, incident_id DESC LIMIT ?"
+        )
+        with self._lock:
+            rows = self.conn.execute(query, (*params, limit + 1)).fetchall()
+
+        incidents = [self._row_to_incident(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = incidents[-1]
+            next_cursor = f"{last['timestamp']}|{last['incident_id']}"
+        return incidents, next_cursor
+
+    @staticmethod
+    def parse_cursor(cursor: str) -> Tuple[str, str]:
+        """Separa un cursor `timestamp|incident_id`; lanza ValueError si no es válido."""
+        cursor_ts, separator, cursor_id = cursor.partition("|")
+        if not separator or not cursor_ts or not cursor_id:
+            raise ValueError(f"Cursor no válido: {cursor!r}")
+        return cursor_ts, cursor_id
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM incidents").fetchone()[0]
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM incidents GROUP BY status").fetchall()
+        return dict(rows)
@@ -0,0 +1,121 @@
+import sqlite3
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import config
+
+
+def normalize_indicator(indicator: str, indicator_type: str) -> str:
+    """Forma canónica de un IOC para usarlo como clave.
+
+    Hashes, dominios e IPs no distinguen mayúsculas; en una URL solo el
+    esquema y el host, la ruta y la query se conservan tal cual.
+    """
+    indicator = indicator.strip()
+    if indicator_type != "url":
+        return indicator.lower()
+    parts = urlsplit(indicator)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, parts.fragment))
+
+
+class IOCReputationCache:
+    """Caché persistente de reputación de IOCs con TTL por fuente.
+
+    La clave es (indicador, tipo, fuente); cada fuente tiene su propio TTL
+    (VirusTotal cambia poco en horas, AbuseIPDB algo más a menudo).
+    """
+
+    def __init__(self, db_path: str = config.IOC_CACHE_PATH):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS ioc_reputation (
+                indicator TEXT NOT NULL,
+                indicator_type TEXT NOT NULL,
+                source TEXT NOT NULL,
+                result TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (indicator, indicator_type, source)
+            )"""
+        )
+        self.conn.commit()
+
+    def get(self, indicator: str, indicator_type: str, source: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT result, expires_at FROM ioc_reputation WHERE indicator = ? AND indicator_type = ? AND source = ?",
+                (normalize_indicator(indicator, indicator_type), indicator_type, source)
+            ).fetchone()
+            if row and row[1] > time.time():
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def set(self, indicator: str, indicator_type: str, source: str, result: str):
+        ttl = config.IOC_CACHE_TTL.get(source, config.IOC_CACHE_DEFAULT_TTL)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO ioc_reputation VALUES (?, ?, ?, ?, ?)",
+                (normalize_indicator(indicator, indicator_type), indicator_type, source, result, time.time() + ttl)
+            )
+            self.conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            deleted = self.conn.execute("DELETE FROM ioc_reputation WHERE expires_at <= ?", (time.time(),)).rowcount
+            self.conn.commit()
+            return deleted
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else 0.0}
+
+
+class RateLimiter:
+    """Token bucket bloqueante: como mucho `rate` peticiones cada `per` segundos."""
+
+    def __init__(self, rate: int, per: float):
+        self.capacity = rate
+        self.tokens = float(rate)
+        self.fill_rate = rate / per
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.fill_rate
+            time.sleep(wait)
+
+
+def create_http_session() -> requests.Session:
+    """Sesión HTTP con pool de conexiones reutilizables (keep-alive)."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=config.IOC_BATCH_WORKERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Instancias compartidas por todas las herramientas
+ioc_cache = IOCReputationCache()
+http_session = create_http_session()
+rate_limiters = {
+    source: RateLimiter(rate, per)
+    for source, (rate, per) in config.IOC_RATE_LIMITS.items()
+}
@@ -0,0 +1,151 @@
+"""Prueba de carga de la ingesta de alertas con agentes simulados.
+
+Sustituye `supervisor.process_security_alert` por un stub que solo duerme (no
+llama a OpenAI ni a las APIs de threat intel), levanta el servidor webhook en un
+puerto local y dispara alertas concurrentes para medir alertas/segundo y la
+latencia de ingesta (p50/p99), además de la latencia de /health bajo carga.
+
+Uso (desde esta carpeta):
+    python load_test.py --alerts 200 --concurrency 50 --agent-seconds 2
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime
+
+import httpx
+import uvicorn
+
+
+def install_stub_supervisor(agent_seconds: float):
+    """Registra un módulo `supervisor` falso antes de importar el servidor."""
+    stub = types.ModuleType("supervisor")
+
+    def process_security_alert(alert_data, incident_id, processing_context=None):
+        time.sleep(agent_seconds)
+        return {
+            "incident_id": incident_id,
+            "status": "completed",
+            "analysis_result": "⚖️ CONCLUSIÓN FINAL: FALSO POSITIVO (stub)",
+            "threat_assessment": "No threat assessment performed",
+            "notification_sent": "No notification sent",
+            "timestamp": datetime.now().isoformat(),
+            "tools_used": ["stub"],
+            "processing_context": processing_context or {},
+            "full_conversation": []
+        }
+
+    stub.process_security_alert = process_security_alert
+    sys.modules["supervisor"] = stub
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_load(base_url: str, total_alerts: int, concurrency: int):
+    payload = {
+        "source": "load_test",
+        "alert_type": "Port Scan",
+        "severity": "Low",
+        "message": "Alerta sintética de prueba de carga",
+        "source_ip": "192.0.2.10",
+        "real_apis": False
+    }
+    latencies, health_latencies, statuses = [], [], {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        async def send_one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/webhook/alert", json=payload)
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                return response
+
+        async def probe_health():
+            while len(latencies) < total_alerts:
+                start = time.perf_counter()
+                await client.get("/health")
+                health_latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.05)
+
+        start = time.perf_counter()
+        probe = asyncio.create_task(probe_health())
+        responses = await asyncio.gather(*(send_one() for _ in range(total_alerts)))
+        elapsed = time.perf_counter() - start
+        await probe
+
+        # Esperar a que terminen los incidentes aceptados
+        accepted = [r.json()["incident_id"] for r in responses if r.status_code == 202]
+        drain_start = time.perf_counter()
+        pending = set(accepted)
+        while pending:
+            for incident_id in list(pending):
+                status = (await client.get(f"/incidents/{incident_id}")).json()["status"]
+                if status in ("completed", "error"):
+                    pending.discard(incident_id)
+            await asyncio.sleep(0.2)
+        drain = time.perf_counter() - drain_start
+
+    return latencies, health_latencies, statuses, elapsed, drain
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del webhook SOC")
+    parser.add_argument("--alerts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--agent-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    install_stub_supervisor(args.agent_seconds)
+    # Los incidentes sintéticos van a una base temporal, no a incidents.db
+    tmp_dir = tempfile.TemporaryDirectory(prefix="soc_load_test_")
+    os.environ["SOC_INCIDENTS_DB_PATH"] = os.path.join(tmp_dir.name, "incidents.db")
+    import webhook_server
+    from config import config
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(webhook_server.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    latencies, health, statuses, elapsed, drain = asyncio.run(
+        run_load(f"http://127.0.0.1:{port}", args.alerts, args.concurrency)
+    )
+    server.should_exit = True
+    thread.join()
+    webhook_server.incident_store.conn.close()
+    tmp_dir.cleanup()
+
+    print("\n📊 RESULTADOS DE LA PRUEBA DE CARGA")
+    print("=" * 50)
+    print(f"Workers: {config.ALERT_WORKERS} | Cola máx.: {config.ALERT_QUEUE_MAXSIZE} | Agente simulado: {args.agent_seconds}s")
+    print(f"Alertas enviadas: {args.alerts} (concurrencia {args.concurrency})")
+    print(f"Respuestas por código: {statuses}")
+    print(f"Ingesta: {args.alerts / elapsed:.1f} alertas/s")
+    print(f"Latencia ingesta p50: {percentile(latencies, 50):.1f} ms | p99: {percentile(latencies, 99):.1f} ms")
+    if health:
+        print(f"Latencia /health p50: {percentile(health, 50):.1f} ms | p99: {percentile(health, 99):.1f} ms")
+    print(f"Tiempo hasta vaciar la cola: {drain:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,17 @@
 from langchain_openai import ChatOpenAI
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_core.messages import BaseMessage, HumanMessage
 from langgraph_supervisor import create_supervisor
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
+from pydantic import BaseModel, Field
+from typing import Annotated, List, Literal, Optional, TypedDict
 from agents import alert_analyzer, threat_analyzer, notification_agent
 from config import config
 from datetime import datetime
 import json
+import re
+import time
 
 # Inicializar el modelo para el supervisor
 supervisor_model = ChatOpenAI(
@@ -51,13 +59,119 @@ Si un agente ya fue ejecutado, NO volver a ejecutarlo.""",
 
     return supervisor.compile()
 
-# Instancia global del workflow del supervisor
-soc_workflow = build_soc_workflow()
+# Estado del pipeline determinista
+class SOCPipelineState(TypedDict):
+    messages: Annotated[List[BaseMessage], add_messages]
+    alert_context: str
+    verdict: Optional[Literal["true_positive", "false_positive"]]
+    analysis_result: str
+    threat_result: str
+    notification_result: str
 
-def process_security_alert(alert_data: dict, incident_id: str, processing_context: dict = None) -> dict:
-    if processing_context is None:
-        processing_context = {}
+class AlertVerdict(BaseModel):
+    """Veredicto estructurado del análisis inicial."""
+    verdict: Literal["true_positive", "false_positive"] = Field(
+        description="true_positive si la alerta es un VERDADERO POSITIVO, false_positive si es FALSO POSITIVO"
+    )
+
+verdict_extractor = supervisor_model.with_structured_output(AlertVerdict)
+
+def _extract_verdict(analysis: str, use_llm: bool = True) -> Optional[str]:
+    """Obtiene el veredicto de la conclusión del analista.
+
+    Primero busca la conclusión explícita en el texto; solo si es ambigua se
+    recurre a una llamada de salida estructurada.
+    """
+    conclusion = re.search(r"CONCLUSI[OÓ]N FINAL:?\s*\**\s*\[?\s*(VERDADERO|FALSO) POSITIVO", analysis, re.IGNORECASE)
+    if conclusion:
+        return "true_positive" if conclusion.group(1).upper() == "VERDADERO" else "false_positive"
+    
+    mentions_true = "VERDADERO POSITIVO" in analysis.upper()
+    mentions_false = "FALSO POSITIVO" in analysis.upper()
+    if mentions_true != mentions_false:
+        return "true_positive" if mentions_true else "false_positive"
+    
+    if not use_llm:
+        return None
+    try:
+        return verdict_extractor.invoke(
+            f"Indica el veredicto final de este análisis de alerta SOC:\n\n{analysis}"
+        ).verdict
+    except Exception:
+        # Ante la duda, tratarlo como amenaza real para no saltarse la evaluación
+        return "true_positive"
+
+def _last_message_content(agent_result: dict) -> str:
+    messages = agent_result.get("messages", [])
+    return messages[-1].content if messages else ""
+
+def analyze_alert_node(state: SOCPipelineState):
+    """Paso 1: alert_analyzer analiza los IOCs y emite el veredicto."""
+    request = HumanMessage(content=f"{state['alert_context']}\n\nAnaliza los IOCs de esta alerta y determina VERDADERO/FALSO POSITIVO.")
+    result = alert_analyzer.invoke({"messages": [request]})
+    analysis = _last_message_content(result)
+    return {
+        "messages": result["messages"],
+        "analysis_result": analysis,
+        "verdict": _extract_verdict(analysis)
+    }
 
+def assess_threat_node(state: SOCPipelineState):
+    """Paso 2 (solo verdaderos positivos): threat_analyzer evalúa severidad y mitigación."""
+    request = HumanMessage(content=f"""{state['alert_context']}
+
+RESULTADO DEL ANÁLISIS INICIAL (VERDADERO POSITIVO):
+{state['analysis_result']}
+
+Evalúa la severidad de la amenaza y propone la mitigación.""")
+    result = threat_analyzer.invoke({"messages": [request]})
+    return {"messages": result["messages"], "threat_result": _last_message_content(result)}
+
+def notify_node(state: SOCPipelineState):
+    """Paso 3: notification_agent envía el email final."""
+    threat = state.get("threat_result") or "No aplica: la alerta es un FALSO POSITIVO."
+    request = HumanMessage(content=f"""{state['alert_context']}
+
+VEREDICTO: {"VERDADERO POSITIVO" if state['verdict'] == "true_positive" else "FALSO POSITIVO"}
+
+ANÁLISIS DE LA ALERTA:
+{state['analysis_result']}
+
+EVALUACIÓN DE LA AMENAZA:
+{threat}
+
+Envía la notificación final por email.""")
+    result = notification_agent.invoke({"messages": [request]})
+    return {"messages": result["messages"], "notification_result": _last_message_content(result)}
+
+def route_after_analysis(state: SOCPipelineState) -> str:
+    return "assess_threat" if state["verdict"] == "true_positive" else "notify"
+
+def build_soc_pipeline():
+    """Pipeline determinista: mismos tres agentes sin saltos por el supervisor LLM."""
+    workflow = StateGraph(SOCPipelineState)
+    
+    workflow.add_node("analyze_alert", analyze_alert_node)
+    workflow.add_node("assess_threat", assess_threat_node)
+    workflow.add_node("notify", notify_node)
+    
+    workflow.add_edge(START, "analyze_alert")
+    workflow.add_conditional_edges(
+        "analyze_alert",
+        route_after_analysis,
+        {"assess_threat": "assess_threat", "notify": "notify"}
+    )
+    workflow.add_edge("assess_threat", "notify")
+    workflow.add_edge("notify", END)
+    
+    return workflow.compile()
+
+# Instancias globales de los dos modos de orquestación
+soc_workflow = build_soc_workflow()
+soc_pipeline = build_soc_pipeline()
+
+def _run_supervisor(alert_data: dict, incident_id: str, processing_context: dict, callbacks: list):
+    """Ejecuta el workflow del supervisor y extrae los resultados de cada agente."""
     # Preparar el mensaje inicial/usuario para el supervisor
     initial_message = f"""ALERTA SOC PARA PROCESAMIENTO SECUENCIAL:
 
@@ -76,19 +190,63 @@ TERMINAR después del paso 3. NO continuar."""
     print("🤖 Supervisor coordinará: alert_analyzer → threat_analyzer → notification_agent")
     print("🌐 Usando APIs reales: VirusTotal, Gmail, TavilySearch, AbuseIPDB/ThreatIntel")
 
-    try:
-        # Ejecutar el workflow del supervisor
-        result = soc_workflow.invoke({
-            "messages": [{"role": "user", "content": initial_message}]
-        })
+    # Ejecutar el workflow del supervisor
+    result = soc_workflow.invoke(
+        {"messages": [{"role": "user", "content": initial_message}]},
+        config={"callbacks": callbacks}
+    )
+
+    # Extraer los resultados de cada agente del historial de mensajes
+    analysis_result = _extract_agent_result(result, "alert_analyzer")
+    threat_result = _extract_agent_result(result, "threat_analyzer")
+    notification_result = _extract_agent_result(result, "notification_agent")
+    verdict = _extract_verdict(analysis_result, use_llm=False) if analysis_result else None
+
+    return analysis_result, threat_result, notification_result, verdict, result.get("messages", [])
+
+def _run_pipeline(alert_data: dict, incident_id: str, processing_context: dict, callbacks: list):
+    """Ejecuta el pipeline determinista (StateGraph con aristas condicionales)."""
+    alert_context = f"""ALERTA SOC:
+
+ID: {incident_id}
+DATOS: {json.dumps(alert_data, indent=2)}
+EMAIL: {processing_context.get('email_recipient', config.SOC_EMAIL_RECIPIENT)}"""
 
-        # Extraer los resultados de cada agente del historial de mensajes
-        analysis_result = _extract_agent_result(result, "alert_analyzer")
-        threat_result = _extract_agent_result(result, "threat_analyzer")
-        notification_result = _extract_agent_result(result, "notification_agent")
+    print(f"🚀 Iniciando pipeline determinista para {incident_id}")
+    print("🧭 Flujo fijo: alert_analyzer → (threat_analyzer si verdadero positivo) → notification_agent")
+
+    result = soc_pipeline.invoke(
+        {"messages": [], "alert_context": alert_context, "verdict": None,
+         "analysis_result": "", "threat_result": "", "notification_result": ""},
+        config={"callbacks": callbacks}
+    )
+    return (
+        result["analysis_result"],
+        result["threat_result"],
+        result["notification_result"],
+        result["verdict"],
+        result.get("messages", [])
+    )
+
+def process_security_alert(alert_data: dict, incident_id: str, processing_context: dict = None) -> dict:
+    """Procesa una alerta con el modo configurado (`pipeline_mode` en el contexto o SOC_PIPELINE_MODE)."""
+    if processing_context is None:
+        processing_context = {}
+
+    mode = processing_context.get("pipeline_mode") or config.SOC_PIPELINE_MODE
+    if mode not in config.PIPELINE_MODES:
+        raise ValueError(f"pipeline_mode no válido: '{mode}' (usa {' o '.join(config.PIPELINE_MODES)})")
+    usage = UsageMetadataCallbackHandler()
+    start = time.perf_counter()
+
+    try:
+        runner = _run_pipeline if mode == "pipeline" else _run_supervisor
+        analysis_result, threat_result, notification_result, verdict, messages = runner(
+            alert_data, incident_id, processing_context, [usage]
+        )
 
         # Determinar las herramientas utilizadas para los resultados
-        tools_used = ["langgraph-supervisor", "create_supervisor"]
+        tools_used = ["langgraph-supervisor", "create_supervisor"] if mode != "pipeline" else ["langgraph-stategraph"]
 
         if analysis_result and any(x in analysis_result.upper() for x in ["VIRUSTOTAL", "VT"]):
             tools_used.append("VirusTotal API")
@@ -107,32 +265,46 @@ TERMINAR después del paso 3. NO continuar."""
             "notification_sent": notification_result or "No notification sent",
             "timestamp": datetime.now().isoformat(),
             "tools_used": tools_used,
-            "supervisor_architecture": True,
+            "supervisor_architecture": mode != "pipeline",
+            "pipeline_mode": mode,
+            "verdict": verdict,
+            "token_usage": _total_tokens(usage),
+            "processing_seconds": round(time.perf_counter() - start, 2),
             "apis_real": True,
             "processing_context": processing_context,
-            "full_conversation": result.get("messages", [])
+            "full_conversation": messages
         }
         
-        print(f"✅ Arquitectura supervisor completada para {incident_id}")
+        print(f"✅ Procesamiento ({mode}) completado para {incident_id}")
         print(f"🛠️ Herramientas utilizadas: {', '.join(tools_used)}")
         
         return final_result
         
     except Exception as e:
-        print(f"❌ Error en arquitectura supervisor: {str(e)}")
+        print(f"❌ Error en procesamiento ({mode}): {str(e)}")
         
         error_result = {
             "incident_id": incident_id,
             "status": "error",
             "error": str(e),
             "timestamp": datetime.now().isoformat(),
-            "supervisor_architecture": True,
+            "supervisor_architecture": mode != "pipeline",
+            "pipeline_mode": mode,
             "apis_real": True
         }
         
         return error_result
 
 
+def _total_tokens(usage: UsageMetadataCallbackHandler) -> dict:
+    """Suma los tokens de todos los modelos usados durante el procesamiento."""
+    totals = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    for model_usage in usage.usage_metadata.values():
+        for key in totals:
+            totals[key] += model_usage.get(key, 0)
+    return totals
+
+
 def _extract_agent_result(workflow_result: dict, agent_name: str) -> str:
     try:
         messages = workflow_result.get("messages", [])
@@ -4,8 +4,11 @@ from langchain_community.agent_toolkits import GmailToolkit
 from langchain_community.tools.gmail.utils import get_gmail_credentials, build_resource_service
 from langchain.tools import tool
 from config import config
+from ioc_cache import ioc_cache, http_session, rate_limiters
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import requests
+from typing import Dict, List
+import atexit
 import ipaddress
 from urllib.parse import urlparse
 
@@ -29,6 +32,76 @@ gmail_toolkit = GmailToolkit(api_resource=build_resource_service(credentials=cre
 gmail_tools = gmail_toolkit.get_tools()
 
 # 3. Virustotal Tool
+# Un único cliente de VirusTotal (sesión aiohttp) que vive en su propio hilo:
+# todas las consultas pasan por ese hilo, así el cliente se reutiliza entre
+# lotes y se cierra al apagar. El límite de 4 req/min hace innecesario más de uno.
+_vt_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="virustotal")
+_vt_client = None
+
+def _vt_get_object(path: str):
+    """Se ejecuta en el hilo de VirusTotal."""
+    global _vt_client
+    if _vt_client is None:
+        _vt_client = vt.Client(config.VIRUSTOTAL_API_KEY)
+    try:
+        return _vt_client.get_object(path)
+    except Exception:
+        # Si el cliente quedó en mal estado, se recrea en la siguiente llamada
+        _close_vt_client()
+        raise
+
+def _close_vt_client():
+    """Se ejecuta en el hilo de VirusTotal."""
+    global _vt_client
+    if _vt_client is not None:
+        try:
+            _vt_client.close()
+        except Exception:
+            pass
+        _vt_client = None
+
+def _virustotal_lookup(indicator: str, indicator_type: str) -> str:
+    """Consulta VirusTotal usando la caché de reputación y el límite de 4 req/min."""
+    if indicator_type not in ("url", "ip", "hash"):
+        return f"Tipo no soportado: {indicator_type}"
+    
+    cached = ioc_cache.get(indicator, indicator_type, "virustotal")
+    if cached is not None:
+        return cached
+    
+    try:
+        if indicator_type == "url":
+            path = f"/urls/{vt.url_id(indicator)}"
+        elif indicator_type == "ip":
+            path = f"/ip-addresses/{indicator}"
+        else:
+            path = f"/files/{indicator}"
+        rate_limiters["virustotal"].acquire()
+        analysis = _vt_executor.submit(_vt_get_object, path).result()
+        
+        stats = analysis.last_analysis_stats
+        malicious = stats.get("malicious", 0)
+        suspicious = stats.get("suspicious", 0)
+        total = sum(stats.values())
+
+        if malicious > 5:
+            threat_level = "MALICIOSO"
+        elif malicious > 0 or suspicious > 3:
+            threat_level = "SOSPECHOSO"
+        else:
+            threat_level = "LIMPIO"
+
+        result = f"""ANALISIS VIRUSTOTAL:
+Indicador: {indicator}
+Detecciones: {malicious}/{total} maliciosas, {suspicious}/{total} sospechosas
+Clasificacion: {threat_level}
+Análisis: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
+        ioc_cache.set(indicator, indicator_type, "virustotal", result)
+        return result
+    
+    except Exception as e:
+        return f"Error VirusTotal: {str(e)}"
+
 @tool
 def virustotal_checker(indicator: str, indicator_type: str) -> str:
     """Analiza URLs, IPs y hashes usando la API de VirusTotal.
@@ -40,38 +113,7 @@ def virustotal_checker(indicator: str, indicator_type: str) -> str:
     Returns:
         Resultado del analisis de VirusTotal
     """
-    try:
-        with vt.Client(config.VIRUSTOTAL_API_KEY) as client:
-            if indicator_type == "url":
-                url_id = vt.url_id(indicator)
-                analysis = client.get_object(f"/urls/{url_id}")
-            elif indicator_type == "ip":
-                analysis = client.get_object(f"/ip-addresses/{indicator}")
-            elif indicator_type == "hash":
-                analysis = client.get_object(f"/files/{indicator}")
-            else:
-                return f"Tipo no soportado: {indicator_type}"
-            
-            stats = analysis.last_analysis_stats
-            malicious = stats.get("malicious", 0)
-            suspicious = stats.get("suspicious", 0)
-            total = sum(stats.values())
-
-            if malicious > 5:
-                threat_level = "MALICIOSO"
-            elif malicious > 0 or suspicious > 3:
-                threat_level = "SOSPECHOSO"
-            else:
-                threat_level = "LIMPIO"
-
-            return f"""ANALISIS VIRUSTOTAL:
-Indicador: {indicator}
-Detecciones: {malicious}/{total} maliciosas, {suspicious}/{total} sospechosas
-Clasificacion: {threat_level}
-Análisis: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
-    
-    except Exception as e:
-        return f"Error VirusTotal: {str(e)}"
+    return _virustotal_lookup(indicator, indicator_type)
 
 
 # 4. Threat Intelligence
@@ -87,33 +129,88 @@ def threat_intel_lookup(indicator: str, intel_type: str = "auto") -> str:
         Información de threat intelligence
     """
     try:
-        if intel_type == "auto":
-            intel_type = _detect_indicator_type(indicator)
-        
-        results = []
-        
-        # AbuseIPDB para IPs
-        if intel_type == "ip" and config.ABUSEIPDB_API_KEY:
-            abuse_result = _check_abuseipdb(indicator)
-            results.append(f"🛡️ AbuseIPDB: {abuse_result}")
-        
-        # Análisis básico de URLs/dominios
-        if intel_type in ["url", "domain"]:
-            url_result = _analyze_url_reputation(indicator)
-            results.append(f"🌐 URL Analysis: {url_result}")
-        
-        # OSINT básico
-        osint_result = _basic_osint(indicator)
-        results.append(f"🔍 OSINT: {osint_result}")
-        
-        return f"""🔍 THREAT INTELLIGENCE:
+        return _threat_intel_report(indicator, intel_type)
+    except Exception as e:
+        return f"❌ Error threat intel: {str(e)}"
+
+def _threat_intel_report(indicator: str, intel_type: str = "auto") -> str:
+    """Informe multifuente (AbuseIPDB, reputación de dominio y OSINT) de un IOC."""
+    if intel_type == "auto":
+        intel_type = _detect_indicator_type(indicator)
+    
+    results = []
+    
+    # AbuseIPDB para IPs
+    if intel_type == "ip" and config.ABUSEIPDB_API_KEY:
+        abuse_result = _check_abuseipdb(indicator)
+        results.append(f"🛡️ AbuseIPDB: {abuse_result}")
+    
+    # Análisis básico de URLs/dominios
+    if intel_type in ["url", "domain"]:
+        url_result = _analyze_url_reputation(indicator)
+        results.append(f"🌐 URL Analysis: {url_result}")
+    
+    # OSINT básico
+    osint_result = _basic_osint(indicator)
+    results.append(f"🔍 OSINT: {osint_result}")
+    
+    return f"""🔍 THREAT INTELLIGENCE:
 🎯 Indicador: {indicator} ({intel_type.upper()})
 📅 Análisis: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
  
 {chr(10).join(results)}"""
-        
+
+
+# 5. Consulta en lote de IOCs
+def batch_ioc_lookup(indicators: List[str]) -> Dict[str, str]:
+    """Consulta muchos IOCs de una alerta de forma concurrente.
+    
+    Cada indicador se resuelve con VirusTotal y threat intel; las respuestas se
+    sirven desde la caché cuando es posible y los límites por proveedor se
+    respetan a través de sus rate limiters compartidos.
+    """
+    unique = list(dict.fromkeys(i.strip() for i in indicators if i and i.strip()))
+    
+    def lookup(indicator: str) -> str:
+        indicator_type = _detect_indicator_type(indicator)
+        parts = []
+        if indicator_type in ("url", "ip", "hash"):
+            parts.append(_virustotal_lookup(indicator, indicator_type))
+        parts.append(_threat_intel_report(indicator, indicator_type))
+        return "\n\n".join(parts)
+    
+    return dict(zip(unique, _ioc_executor.map(lookup, unique)))
+
+# Pool compartido por todos los lotes (no se crea uno por alerta)
+_ioc_executor = ThreadPoolExecutor(max_workers=config.IOC_BATCH_WORKERS, thread_name_prefix="ioc")
+
+def shutdown_ioc_workers():
+    """Cierra el cliente de VirusTotal y los pools de consulta de IOCs."""
+    _ioc_executor.shutdown(wait=False, cancel_futures=True)
+    try:
+        _vt_executor.submit(_close_vt_client)
+    except RuntimeError:
+        pass  # el intérprete ya está cerrando los hilos
+    _vt_executor.shutdown(wait=True)
+    http_session.close()
+
+atexit.register(shutdown_ioc_workers)
+
+@tool
+def batch_ioc_reputation(indicators: List[str]) -> str:
+    """Analiza en paralelo todos los IOCs de una alerta (VirusTotal + threat intel).
+
+    Args:
+        indicators: Lista de IPs, URLs, dominios o hashes a investigar.
+
+    Returns:
+        Informe de reputación de cada indicador
+    """
+    try:
+        results = batch_ioc_lookup(indicators)
+        return "\n\n".join(f"===== {indicator} =====\n{report}" for indicator, report in results.items())
     except Exception as e:
-        return f"❌ Error threat intel: {str(e)}"
+        return f"❌ Error en consulta en lote: {str(e)}"
  
 def _detect_indicator_type(indicator: str) -> str:
     """Detecta automáticamente el tipo de indicador"""
@@ -133,11 +230,16 @@ def _detect_indicator_type(indicator: str) -> str:
  
 def _check_abuseipdb(ip: str) -> str:
     """Consulta AbuseIPDB API"""
+    cached = ioc_cache.get(ip, "ip", "abuseipdb")
+    if cached is not None:
+        return cached
+    
     try:
         headers = {'Key': config.ABUSEIPDB_API_KEY, 'Accept': 'application/json'}
         params = {'ipAddress': ip, 'maxAgeInDays': 90}
         
-        response = requests.get(
+        rate_limiters["abuseipdb"].acquire()
+        response = http_session.get(
             'https://api.abuseipdb.com/api/v2/check', 
             headers=headers, params=params, timeout=10
         )
@@ -148,7 +250,9 @@ def _check_abuseipdb(ip: str) -> str:
             country = data.get('countryCode', 'Unknown')
             
             level = "🔴 MALICIOSO" if confidence > 50 else "🟡 SOSPECHOSO" if confidence > 25 else "🟢 LIMPIO"
-            return f"{level} - Confianza: {confidence}% - País: {country}"
+            result = f"{level} - Confianza: {confidence}% - País: {country}"
+            ioc_cache.set(ip, "ip", "abuseipdb", result)
+            return result
         else:
             return f"Error {response.status_code}"
             
@@ -184,4 +288,4 @@ def _basic_osint(indicator: str) -> str:
 
 
 # Lista de herramientas para importacion
-all_tools = [search_tool, virustotal_checker, threat_intel_lookup] + gmail_tools
\ No newline at end of file
+all_tools = [search_tool, virustotal_checker, threat_intel_lookup, batch_ioc_reputation] + gmail_tools
\ No newline at end of file
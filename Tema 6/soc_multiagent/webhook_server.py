@@ -1,10 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import uvicorn
 import uuid
 from datetime import datetime
 from supervisor import process_security_alert
+from incident_store import IncidentStore
+from incident_events import IncidentEventBroker
 from config import config
 
 # Validar configuración al iniciar
@@ -15,8 +21,6 @@ except ValueError as e:
     print(f"❌ Error de configuración: {e}")
     print("💡 Revisa tu archivo .env y asegúrate de tener todas las API keys requeridas")
 
-app = FastAPI(title="SOC Webhook Server - PRODUCCIÓN", version="1.0.0")
-
 class SecurityAlert(BaseModel):
     source: str
     alert_type: str
@@ -29,96 +33,216 @@ class SecurityAlert(BaseModel):
     timestamp: Optional[str] = None
     email_recipient: Optional[str] = None  # Email específico para notificación
     real_apis: Optional[bool] = True  # Flag para indicar uso de APIs reales
+    pipeline_mode: Optional[Literal["supervisor", "pipeline"]] = None  # por defecto, SOC_PIPELINE_MODE
+
+# Repositorio persistente de incidentes (SQLite)
+incident_store = IncidentStore()
+
+# Eventos del ciclo de vida de los incidentes (SSE para el dashboard)
+event_broker = IncidentEventBroker()
+
+# Cola acotada de alertas pendientes y pool de hilos donde corren los agentes
+alert_queue: Optional[asyncio.Queue] = None
+processing_pool: Optional[ThreadPoolExecutor] = None
+
 
-# Storage simple para el demo
-incidents_db = []
+def _classify_error(error_message: str) -> dict:
+    """Determina el tipo de error para dar una sugerencia útil."""
+    if "API" in error_message:
+        error_type = "api_error"
+        suggestion = "Verifica que todas las API keys estén configuradas correctamente"
+    elif "timeout" in error_message.lower():
+        error_type = "timeout_error"  
+        suggestion = "Las APIs externas están tardando más de lo esperado. Intenta de nuevo."
+    elif "gmail" in error_message.lower():
+        error_type = "gmail_error"
+        suggestion = "Gmail no está configurado. Consulta el README para setup de Google Console."
+    else:
+        error_type = "unknown_error"
+        suggestion = "Error inesperado en el procesamiento"
+    return {"error_type": error_type, "suggestion": suggestion}
 
-@app.post("/webhook/alert")
+
+async def alert_worker(worker_id: int):
+    """Consume alertas de la cola y las procesa con los agentes en un hilo aparte."""
+    loop = asyncio.get_running_loop()
+    while True:
+        incident_id, alert_data, processing_context = await alert_queue.get()
+        try:
+            event_broker.publish("running", incident_store.update(incident_id, {
+                "status": "running",
+                "started_at": datetime.now().isoformat()
+            }))
+            print(f"🤖 [worker {worker_id}] Iniciando procesamiento de {incident_id}...")
+            
+            # Procesar con agentes sin bloquear el event loop - esto usará APIs REALES
+            result = await loop.run_in_executor(
+                processing_pool, process_security_alert, alert_data, incident_id, processing_context
+            )
+            
+            incident = incident_store.update(incident_id, {**result, "finished_at": datetime.now().isoformat()})
+            event_broker.publish(incident["status"], incident)
+            
+            print(f"✅ Alerta procesada: {incident_id} ({result.get('status')})")
+            print(f"📊 Herramientas utilizadas: {result.get('tools_used', [])}")
+            
+        except Exception as e:
+            print(f"❌ Error procesando alerta {incident_id}: {str(e)}")
+            
+            # Log detallado del error para debugging
+            import traceback
+            print("🔍 Traceback completo:")
+            print(traceback.format_exc())
+            
+            event_broker.publish("error", incident_store.update(incident_id, {
+                "status": "error",
+                "error": str(e),
+                **_classify_error(str(e)),
+                "finished_at": datetime.now().isoformat()
+            }))
+        finally:
+            alert_queue.task_done()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranca la cola de alertas y los workers; los detiene al cerrar."""
+    global alert_queue, processing_pool
+    alert_queue = asyncio.Queue(maxsize=config.ALERT_QUEUE_MAXSIZE)
+    processing_pool = ThreadPoolExecutor(max_workers=config.ALERT_WORKERS, thread_name_prefix="soc-agent")
+    workers = [asyncio.create_task(alert_worker(i)) for i in range(config.ALERT_WORKERS)]
+    print(f"⚙️ {config.ALERT_WORKERS} workers de alertas activos (cola máx. {config.ALERT_QUEUE_MAXSIZE})")
+    try:
+        yield
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        processing_pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="SOC Webhook Server - PRODUCCIÓN", version="1.0.0", lifespan=lifespan)
+
+
+@app.post("/webhook/alert", status_code=202)
 async def receive_alert(alert: SecurityAlert):
-    """Recibe alertas de seguridad y las procesa con agentes REALES usando APIs externas"""
+    """Recibe alertas de seguridad y las encola para los agentes REALES (respuesta inmediata)"""
+    # Generar ID de incidente único
+    incident_id = f"INC-{datetime.now().strftime('%Y%m%d%H%M%S')}-{str(uuid.uuid4())[:6]}"
+    
+    # Convertir a dict y agregar metadatos
+    alert_data = alert.model_dump()
+    alert_data["timestamp"] = alert_data.get("timestamp") or datetime.now().isoformat()
+    alert_data["incident_id"] = incident_id
+    
+    # Agregar información de destinatario de email si se especifica
+    processing_context = {
+        "email_recipient": alert_data.get("email_recipient"),
+        "use_real_apis": alert_data.get("real_apis", True),
+        "pipeline_mode": alert_data.get("pipeline_mode")
+    }
+    
     try:
-        # Generar ID de incidente único
-        incident_id = f"INC-{datetime.now().strftime('%Y%m%d%H%M%S')}-{str(uuid.uuid4())[:6]}"
-        
-        # Convertir a dict y agregar metadatos
-        alert_data = alert.model_dump()
-        alert_data["timestamp"] = alert_data.get("timestamp") or datetime.now().isoformat()
-        alert_data["incident_id"] = incident_id
-        
-        print(f"🚨 Procesando alerta REAL: {incident_id}")
-        print(f"📊 Datos: {alert_data}")
-        print(f"🌐 APIs reales: {alert_data.get('real_apis', True)}")
-        
-        # Agregar información de destinatario de email si se especifica
-        processing_context = {
-            "email_recipient": alert_data.get("email_recipient"),
-            "use_real_apis": alert_data.get("real_apis", True)
-        }
-        
-        print("🤖 Iniciando procesamiento con agentes multiagente...")
-        print("⏱️  Tiempo estimado: 45-90 segundos (APIs reales)")
-        
-        # Procesar con agentes - esto usará APIs REALES
-        result = process_security_alert(alert_data, incident_id, processing_context)
-        
-        # Guardar en "base de datos"
-        incidents_db.append(result)
-        
-        print(f"✅ Alerta procesada exitosamente: {incident_id}")
-        print(f"📊 Herramientas utilizadas: {result.get('tools_used', [])}")
-        
-        return {
-            "status": "success",
-            "incident_id": incident_id,
-            "message": "Alerta procesada por agentes SOC con APIs reales",
-            "processing_time": "45-90 segundos",
-            "apis_used": result.get('tools_used', []),
-            "result": result
-        }
-        
-    except Exception as e:
-        print(f"❌ Error procesando alerta: {str(e)}")
-        
-        # Log detallado del error para debugging
-        import traceback
-        print("🔍 Traceback completo:")
-        print(traceback.format_exc())
-        
-        # Determinar tipo de error para mejor respuesta
-        error_message = str(e)
-        if "API" in error_message:
-            error_type = "api_error"
-            suggestion = "Verifica que todas las API keys estén configuradas correctamente"
-        elif "timeout" in error_message.lower():
-            error_type = "timeout_error"  
-            suggestion = "Las APIs externas están tardando más de lo esperado. Intenta de nuevo."
-        elif "gmail" in error_message.lower():
-            error_type = "gmail_error"
-            suggestion = "Gmail no está configurado. Consulta el README para setup de Google Console."
-        else:
-            error_type = "unknown_error"
-            suggestion = "Error inesperado en el procesamiento"
-        
-        raise HTTPException(
-            status_code=500, 
-            detail={
-                "error": error_message,
-                "error_type": error_type,
-                "suggestion": suggestion,
-                "timestamp": datetime.now().isoformat()
-            }
+        alert_queue.put_nowait((incident_id, alert_data, processing_context))
+    except asyncio.QueueFull:
+        # Backpressure: la cola está llena, el cliente debe reintentar más tarde
+        return JSONResponse(
+            status_code=429,
+            content={
+                "status": "rejected",
+                "error": "Cola de alertas llena",
+                "queue_size": alert_queue.qsize(),
+                "suggestion": "Reintenta en unos segundos"
+            },
+            headers={"Retry-After": "5"}
         )
+    
+    event_broker.publish("created", incident_store.create({
+        "incident_id": incident_id,
+        "status": "pending",
+        "timestamp": alert_data["timestamp"],
+        "queued_at": datetime.now().isoformat(),
+        "alert": alert_data
+    }))
+    
+    print(f"🚨 Alerta encolada: {incident_id} (en cola: {alert_queue.qsize()})")
+    
+    return {
+        "status": "pending",
+        "incident_id": incident_id,
+        "message": "Alerta encolada para los agentes SOC con APIs reales",
+        "processing_time": "45-90 segundos",
+        "status_url": f"/incidents/{incident_id}"
+    }
 
 @app.get("/incidents")
-async def get_incidents():
-    """Obtiene lista de incidentes procesados con información de APIs reales"""
+async def get_incidents(
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Lista paginada de incidentes (sin la conversación completa de los agentes).
+
+    Filtros: `status`, `since` (incidentes actualizados después de ese ISO
+    timestamp) y `cursor` (valor `next_cursor` de la página anterior).
+    """
+    try:
+        incidents, next_cursor = incident_store.list(status=status, since=since, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
-        "incidents": incidents_db,
-        "total_incidents": len(incidents_db),
+        "incidents": incidents,
+        "next_cursor": next_cursor,
+        "total_incidents": incident_store.count(),
+        "status_counts": incident_store.count_by_status(),
         "real_apis_used": True,
         "last_updated": datetime.now().isoformat()
     }
 
+@app.get("/incidents/{incident_id}")
+async def get_incident(incident_id: str, include_conversation: bool = False):
+    """Estado de un incidente concreto: pending, running, completed o error"""
+    incident = incident_store.get(incident_id, include_conversation=include_conversation)
+    if incident is None:
+        raise HTTPException(status_code=404, detail=f"Incidente {incident_id} no encontrado")
+    return incident
+
+@app.get("/incidents/{incident_id}/conversation")
+async def get_incident_conversation(incident_id: str):
+    """Conversación completa de los agentes para un incidente (carga bajo demanda)"""
+    if incident_store.get(incident_id) is None:
+        raise HTTPException(status_code=404, detail=f"Incidente {incident_id} no encontrado")
+    return {"incident_id": incident_id, "messages": incident_store.get_conversation(incident_id)}
+
+@app.get("/events")
+async def incident_events(request: Request):
+    """Stream SSE con los eventos del ciclo de vida de los incidentes.
+
+    Eventos: created, running, completed, error. El campo `data` es el registro
+    del incidente (sin conversación). Tras reconectar, el cliente debe pedir
+    /incidents?since=<último updated_at> para recuperar lo que se haya perdido.
+    """
+    queue = event_broker.subscribe()
+    
+    async def stream():
+        try:
+            yield "retry: 2000\n\n"
+            while event_broker.is_subscribed(queue) and not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                    yield IncidentEventBroker.format_sse(event)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            event_broker.unsubscribe(queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/health")
 async def health_check():
     """Health check del sistema con estado de APIs"""
@@ -127,7 +251,12 @@ async def health_check():
     health_status = {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "total_incidents_processed": len(incidents_db),
+        "total_incidents_processed": incident_store.count(),
+        "alert_queue": {
+            "pending": alert_queue.qsize() if alert_queue else 0,
+            "max_size": config.ALERT_QUEUE_MAXSIZE,
+            "workers": config.ALERT_WORKERS
+        },
         "api_configuration": {
             "openai": "✅ Configurada" if config.OPENAI_API_KEY else "❌ Falta",
             "tavily": "✅ Configurada" if config.TAVILY_API_KEY else "❌ Falta", 
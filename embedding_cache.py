@@ -0,0 +1,163 @@
+"""Caché persistente de embeddings compartida por todos los vector stores del curso.
+
+Los vectores se guardan en un fichero SQLite local, direccionados por contenido:
+la clave es el modelo (namespace) más el hash SHA-256 del texto. Así, volver a
+ingerir un corpus sin cambios no vuelve a pagar la latencia ni el coste de la API.
+
+Uso:
+    from embedding_cache import get_cached_embeddings
+    embeddings = get_cached_embeddings("text-embedding-3-large")
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.stores import ByteStore
+from langchain_classic.embeddings import CacheBackedEmbeddings
+from langchain_openai import OpenAIEmbeddings
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EMBEDDING_CACHE_PATH = os.environ.get(
+    "EMBEDDING_CACHE_PATH", os.path.join(BASE_DIR, "embeddings_cache.sqlite")
+)
+# Número máximo de vectores guardados antes de expulsar los menos usados
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", 200_000))
+
+
+class SQLiteByteStore(ByteStore):
+    """ByteStore sobre SQLite con expulsión LRU acotada por número de entradas."""
+
+    def __init__(self, db_path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self.conn.commit()
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            # SQLite limita el número de parámetros por consulta
+            for start in range(0, len(keys), 500):
+                batch = list(keys[start:start + 500])
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT key, value FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self.conn.commit()
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return [found.get(key) for key in keys]
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, bytes]]) -> None:
+        if not key_value_pairs:
+            return
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, value, last_access) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in key_value_pairs]
+            )
+            self._evict()
+            self.conn.commit()
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        with self._lock:
+            self.conn.executemany("DELETE FROM embeddings WHERE key = ?", [(key,) for key in keys])
+            self.conn.commit()
+
+    def yield_keys(self, *, prefix: Optional[str] = None) -> Iterator[str]:
+        with self._lock:
+            if prefix:
+                # Comparación exacta: LIKE interpreta % y _ e ignora mayúsculas
+                rows = self.conn.execute(
+                    "SELECT key FROM embeddings WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+                ).fetchall()
+            else:
+                rows = self.conn.execute("SELECT key FROM embeddings").fetchall()
+        for (key,) in rows:
+            yield key
+
+    def _evict(self):
+        """Expulsa las entradas menos usadas recientemente si se supera el límite."""
+        (total,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = total - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+
+    def stats(self) -> Dict[str, float]:
+        """Devuelve los contadores de aciertos y fallos de la caché."""
+        with self._lock:
+            (entries,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+            }
+
+
+_stores: Dict[str, SQLiteByteStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(db_path: str = EMBEDDING_CACHE_PATH) -> SQLiteByteStore:
+    """Devuelve la caché compartida del proceso para `db_path`."""
+    with _stores_lock:
+        if db_path not in _stores:
+            _stores[db_path] = SQLiteByteStore(db_path)
+        return _stores[db_path]
+
+
+def get_cached_embeddings(model: str = "text-embedding-3-large", db_path: str = EMBEDDING_CACHE_PATH) -> CacheBackedEmbeddings:
+    """Crea unos OpenAIEmbeddings respaldados por la caché persistente.
+
+    Tanto los documentos como las consultas se cachean; el modelo actúa como
+    namespace para que vectores de modelos distintos nunca se mezclen.
+    """
+    store = get_embedding_store(db_path)
+    return CacheBackedEmbeddings.from_bytes_store(
+        OpenAIEmbeddings(model=model),
+        store,
+        namespace=model,
+        query_embedding_cache=True,
+        key_encoder="sha256"
+    )
+
+
+def embedding_cache_stats(db_path: str = EMBEDDING_CACHE_PATH) -> Dict[str, float]:
+    """Contadores de aciertos/fallos de la caché compartida."""
+    return get_embedding_store(db_path).stats()